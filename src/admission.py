@@ -0,0 +1,347 @@
+import glob
+import json
+import os
+import statistics
+import threading
+import time
+from collections import namedtuple
+
+from placement import CORES_PER_WEIGHT, PRESET_COST, REFERENCE_PIXELS, get_available_cores
+from renditions import normalize_rendition, get_rendition_size
+
+BENCH_RESULTS_DIR = os.path.join(".bench", "results")
+CALIBRATION_PATH = os.path.join(".cache", "admission", "calibration.json")
+
+# Share of the host's cores never committed to encodes, kept for decode spikes, the UI and the OS
+DEFAULT_HEADROOM = 0.2
+
+# What happens to a stream that does not fit: refused, started once capacity frees up,
+# or started at the most expensive cheaper preset that fits
+ADMISSION_POLICIES = {
+    "downgrade": "Offer a cheaper preset",
+    "queue": "Wait for capacity",
+    "reject": "Reject"
+}
+DEFAULT_POLICY = "downgrade"
+
+# Presets from most to least expensive, the order a downgrade walks through
+PRESET_ORDER = sorted(PRESET_COST, key=PRESET_COST.get, reverse=True)
+
+# Frame rate assumed for unknown sources; placement weights are defined at this rate
+DEFAULT_FPS = 30
+
+# Cores per megapixel per second when no benchmark covers a preset, derived from the
+# placement model where a 1080p30 "fast" encode needs CORES_PER_WEIGHT cores
+DEFAULT_CORES_PER_MEGAPIXEL = {
+    preset: CORES_PER_WEIGHT * cost / (REFERENCE_PIXELS * DEFAULT_FPS / 1e6)
+    for preset, cost in PRESET_COST.items()
+}
+
+# Weight of the newest session in a preset's correction factor
+CALIBRATION_ALPHA = 0.3
+
+# Sessions with fewer encoder CPU samples than this are too short to calibrate from
+CALIBRATION_MIN_SAMPLES = 10
+
+# Predicted/actual pairs kept for the capacity planner
+MAX_HISTORY = 50
+
+# How often a queued stream re-checks for capacity besides being woken by a release
+QUEUE_POLL_INTERVAL = 1.0
+
+AdmissionDecision = namedtuple(
+    'AdmissionDecision', ['action', 'preset', 'predicted_cores', 'available_cores', 'reason']
+)
+
+
+def describe_outputs(source_info, config):
+    """Return (width, height, fps, preset) for every output a stream config encodes"""
+    fps = source_info.get('fps') or DEFAULT_FPS
+    if config.get('max_fps'):
+        fps = min(fps, config['max_fps'])
+
+    primary = {
+        'format': "shorts" if config.get('is_shorts') else "source",
+        'preset': config.get('quality_preset', "veryfast")
+    }
+    defaults = dict(primary, format="source")
+    outputs = [primary] + [normalize_rendition(r, defaults) for r in config.get('renditions', [])]
+    return [get_rendition_size(output, source_info) + (fps, output['preset']) for output in outputs]
+
+
+def load_benchmark_rates(results_dir=BENCH_RESULTS_DIR):
+    """Median cores per megapixel per second of each preset in single-stream benchmark runs"""
+    samples = {}
+    for path in glob.glob(os.path.join(results_dir, "*.json")):
+        try:
+            with open(path) as f:
+                report = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for run in report.get('runs', []):
+            if run.get('concurrency') != 1 or not run.get('streams'):
+                continue
+            cpu_percent = run['streams'][0].get('cpu_percent')
+            config = run.get('config', {})
+            if not cpu_percent or config.get('renditions'):
+                continue
+            source = run.get('source', {})
+            outputs = describe_outputs(source, config)
+            width, height, fps, preset = outputs[0]
+            megapixels_per_second = (width or 0) * (height or 0) * fps / 1e6
+            if megapixels_per_second:
+                samples.setdefault(preset, []).append(cpu_percent / 100 / megapixels_per_second)
+    return {preset: statistics.median(values) for preset, values in samples.items()}
+
+
+class CostModel:
+    """Predicts the CPU cores a stream needs and learns from what sessions actually used
+
+    The base prediction scales cores per megapixel per second (from benchmark results,
+    or the placement model for presets no benchmark covers) by every output's pixel
+    rate. A per-preset correction factor, updated from each finished session's measured
+    CPU, absorbs what the benchmarks miss, such as real content and decode cost.
+    """
+
+    def __init__(self, results_dir=BENCH_RESULTS_DIR, calibration_path=CALIBRATION_PATH):
+        self.calibration_path = calibration_path
+        self.lock = threading.Lock()
+        self.rates = dict(DEFAULT_CORES_PER_MEGAPIXEL)
+        self.rates.update(load_benchmark_rates(results_dir))
+        self.factors = {}
+        self.history = []
+        self._load()
+
+    def _load(self):
+        """Load saved correction factors and history"""
+        try:
+            with open(self.calibration_path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.factors = saved.get('factors', {})
+        self.history = saved.get('history', [])
+
+    def _save(self):
+        """Write calibration atomically (caller holds the lock)"""
+        os.makedirs(os.path.dirname(self.calibration_path), exist_ok=True)
+        temporary = self.calibration_path + ".tmp"
+        with open(temporary, "w") as f:
+            json.dump({'factors': self.factors, 'history': self.history}, f, indent=2)
+        os.replace(temporary, self.calibration_path)
+
+    def predict_base(self, outputs):
+        """Uncorrected core estimate for a list of (width, height, fps, preset) outputs"""
+        cores = 0.0
+        for width, height, fps, preset in outputs:
+            rate = self.rates.get(preset, DEFAULT_CORES_PER_MEGAPIXEL["fast"])
+            cores += (width or 1280) * (height or 720) * fps / 1e6 * rate
+        return cores
+
+    def get_factor(self, preset):
+        """Correction factor learned for a preset"""
+        with self.lock:
+            return self.factors.get(preset, {}).get('factor', 1.0)
+
+    def predict(self, outputs):
+        """Return (corrected, base) core estimates; the primary output's preset picks the factor"""
+        base = self.predict_base(outputs)
+        return base * self.get_factor(outputs[0][3]), base
+
+    def record(self, name, preset, predicted, base, actual):
+        """Fold a finished session's measured cores into the preset's correction factor"""
+        if not base or actual is None:
+            return
+        with self.lock:
+            entry = self.factors.setdefault(preset, {'factor': 1.0, 'samples': 0})
+            ratio = actual / base
+            if entry['samples'] == 0:
+                entry['factor'] = ratio
+            else:
+                entry['factor'] = (1 - CALIBRATION_ALPHA) * entry['factor'] + CALIBRATION_ALPHA * ratio
+            entry['samples'] += 1
+            self.history.append({
+                'timestamp': time.time(),
+                'name': name,
+                'preset': preset,
+                'predicted_cores': round(predicted, 3),
+                'actual_cores': round(actual, 3)
+            })
+            self.history = self.history[-MAX_HISTORY:]
+            self._save()
+
+    def get_history(self):
+        """Predicted versus actual cores of recent sessions"""
+        with self.lock:
+            return list(self.history)
+
+
+def measure_actual_cores(resources):
+    """Mean steady-state CPU of a session's processes in cores, or None if it ran too briefly"""
+    by_label = {}
+    for sample in resources:
+        if 'cpu_percent' in sample:
+            by_label.setdefault(sample['label'], []).append(sample['cpu_percent'])
+    if len(by_label.get('encoder', [])) < CALIBRATION_MIN_SAMPLES:
+        return None
+
+    # Skip the first third of each process's samples so startup does not skew the mean
+    cores = 0.0
+    for values in by_label.values():
+        steady = values[len(values) // 3:]
+        cores += sum(steady) / len(steady) / 100
+    return cores
+
+
+class AdmissionController:
+    """Admits streams only while their predicted cost fits the host's capacity
+
+    Capacity is the host's cores minus the configured headroom. Admitted streams hold
+    their predicted cost until released, so concurrent requests cannot overcommit the
+    host. Queued streams are admitted first come, first served as capacity frees up;
+    a stream that could never fit is rejected or downgraded instead of being queued.
+    """
+
+    def __init__(self, model=None, cores=None, headroom=DEFAULT_HEADROOM):
+        self.model = model or CostModel()
+        self.cores = len(cores or get_available_cores())
+        self.headroom = headroom
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.admitted = {}
+        self.queue = []
+
+    def get_capacity_cores(self):
+        """Cores streams may be committed to"""
+        return self.cores * (1 - self.headroom)
+
+    def _available(self):
+        """Uncommitted cores (caller holds the lock)"""
+        committed = sum(entry['predicted'] for entry in self.admitted.values())
+        return self.get_capacity_cores() - committed
+
+    def _first_in_line(self, ticket=None):
+        """Whether no stream queued ahead of ``ticket`` (or at all) could ever fit (caller holds the lock)
+
+        A queued stream predicted above the whole capacity, which happens when headroom
+        is raised while it waits, would never be admitted and must not hold up the rest.
+        """
+        capacity = self.get_capacity_cores()
+        for entry in self.queue:
+            if entry['ticket'] == ticket:
+                return True
+            if entry['predicted'] <= capacity:
+                return False
+        return True
+
+    def _cheapest_fit(self, source_info, config, preset, budget):
+        """The first preset from ``preset`` down whose predicted cost fits ``budget``, with its cost"""
+        if preset not in PRESET_ORDER:
+            return None, None
+        for candidate in PRESET_ORDER[PRESET_ORDER.index(preset):]:
+            cost, _ = self.model.predict(describe_outputs(source_info, dict(config, quality_preset=candidate)))
+            if cost <= budget:
+                return candidate, cost
+        return None, None
+
+    def _evaluate(self, source_info, config, policy):
+        """Decide on a request without reserving anything (caller holds the lock)"""
+        outputs = describe_outputs(source_info, config)
+        preset = outputs[0][3]
+        predicted, _ = self.model.predict(outputs)
+        available = self._available()
+        first = self._first_in_line()
+
+        if predicted <= available and first:
+            return AdmissionDecision("admit", preset, predicted, available, None)
+
+        capacity = self.get_capacity_cores()
+        reason = f"needs {predicted:.1f} cores, {max(0.0, available):.1f} of {capacity:.1f} free"
+        if policy == "queue":
+            # Only queue what could run once the host is free, downgraded if that is what it takes
+            cheaper, cost = self._cheapest_fit(source_info, config, preset, capacity)
+            if cheaper:
+                return AdmissionDecision("queue", cheaper, cost, available, reason)
+            return AdmissionDecision("reject", preset, predicted, available, f"{reason}; exceeds total capacity")
+        if policy == "downgrade" and first:
+            cheaper, cost = self._cheapest_fit(source_info, config, preset, available)
+            if cheaper:
+                return AdmissionDecision("downgrade", cheaper, cost, available, f"{preset} {reason}")
+        return AdmissionDecision("reject", preset, predicted, available, reason)
+
+    def _reserve(self, ticket, source_info, config, preset, name):
+        """Hold a stream's predicted cost (caller holds the lock)"""
+        outputs = describe_outputs(source_info, dict(config, quality_preset=preset))
+        predicted, base = self.model.predict(outputs)
+        self.admitted[ticket] = {'name': name, 'preset': preset, 'predicted': predicted, 'base': base}
+
+    def request(self, ticket, source_info, config, policy=DEFAULT_POLICY, name=None):
+        """Decide on a stream and reserve its capacity when it is admitted or downgraded"""
+        with self.lock:
+            decision = self._evaluate(source_info, config, policy)
+            if decision.action in ("admit", "downgrade"):
+                self._reserve(ticket, source_info, config, decision.preset, name)
+            return decision
+
+    def wait_for_capacity(self, ticket, source_info, config, cancel_event, name=None):
+        """Queue a stream until nothing ahead of it could fit and it fits itself
+
+        Returns None if canceled, or a rejection if the capacity shrank below the
+        stream's predicted cost while it waited.
+        """
+        outputs = describe_outputs(source_info, config)
+        with self.lock:
+            entry = {'ticket': ticket, 'predicted': self.model.predict(outputs)[0]}
+            self.queue.append(entry)
+            try:
+                while not cancel_event.is_set():
+                    entry['predicted'] = predicted = self.model.predict(outputs)[0]
+                    available = self._available()
+                    capacity = self.get_capacity_cores()
+                    if predicted > capacity:
+                        return AdmissionDecision(
+                            "reject", outputs[0][3], predicted, available,
+                            f"needs {predicted:.1f} cores, more than the {capacity:.1f} core capacity"
+                        )
+                    if predicted <= available and self._first_in_line(ticket):
+                        self._reserve(ticket, source_info, config, outputs[0][3], name)
+                        return AdmissionDecision("admit", outputs[0][3], predicted, available, None)
+                    self.changed.wait(QUEUE_POLL_INTERVAL)
+                return None
+            finally:
+                self.queue.remove(entry)
+                self.changed.notify_all()
+
+    def release(self, ticket, resources=None):
+        """Free a stream's capacity, calibrating the model from its resource samples"""
+        with self.lock:
+            entry = self.admitted.pop(ticket, None)
+            self.changed.notify_all()
+        if entry and resources:
+            actual = measure_actual_cores(resources)
+            self.model.record(entry['name'], entry['preset'], entry['predicted'], entry['base'], actual)
+
+    def get_status(self):
+        """Capacity, commitments and queue length for the capacity planner"""
+        with self.lock:
+            return {
+                'cores': self.cores,
+                'headroom': self.headroom,
+                'capacity_cores': self.get_capacity_cores(),
+                'committed_cores': sum(entry['predicted'] for entry in self.admitted.values()),
+                'streams': [dict(entry) for entry in self.admitted.values()],
+                'queued': len(self.queue)
+            }
+
+
+_controller = None
+_controller_lock = threading.Lock()
+
+
+def get_admission_controller():
+    """Return the process-wide admission controller"""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = AdmissionController()
+        return _controller
@@ -0,0 +1,103 @@
+import pandas as pd
+
+from telemetry import TELEMETRY_DIR, list_session_dirs, load_session, read_series
+
+# Encoder speed percentiles reported per session and across sessions
+SPEED_QUANTILES = (0.5, 0.95, 0.99)
+
+# Columns read for analysis; everything else in the series stays on disk
+ENCODER_COLUMNS = ['stream_id', 'timestamp', 'speed', 'frame', 'drop', 'bitrate_kbps']
+RESOURCE_COLUMNS = ['stream_id', 'timestamp', 'label', 'cpu_seconds']
+
+
+def load_sessions(start_date=None, end_date=None, directory=TELEMETRY_DIR):
+    """One row of metadata and headline figures per exported session, without reading any series"""
+    sessions = [load_session(d) for d in list_session_dirs(directory, start_date, end_date)]
+    sessions = [s for s in sessions if s]
+    if not sessions:
+        return pd.DataFrame(columns=['stream_id', 'date', 'started_at', 'duration_seconds', 'path'])
+
+    df = pd.json_normalize(sessions)
+    df['started_at'] = pd.to_datetime(df['started_at'])
+    df['stream_hours'] = df['duration_seconds'] / 3600
+    return df.sort_values('started_at', ascending=False).reset_index(drop=True)
+
+
+def load_series(sessions, kind, columns=None):
+    """Concatenate one series of the given sessions, reading only ``columns``"""
+    frames = [read_series(path, kind, columns) for path in sessions['path']]
+    frames = [df for df in frames if not df.empty]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
+
+
+def speed_percentiles(encoder):
+    """Encoder speed percentiles per session"""
+    speeds = encoder.dropna(subset=['speed']).groupby('stream_id')['speed']
+    df = speeds.quantile(list(SPEED_QUANTILES)).unstack()
+    df.columns = [f"speed_p{int(q * 100)}" for q in df.columns]
+    return df
+
+
+def drop_rates(encoder):
+    """Share of frames dropped per session; ffmpeg's frame and drop counters are cumulative"""
+    totals = encoder.groupby('stream_id')[['frame', 'drop']].max().fillna(0)
+    totals['drop_rate'] = totals['drop'] / (totals['frame'] + totals['drop']).where(lambda s: s > 0)
+    return totals.rename(columns={'frame': 'frames', 'drop': 'dropped_frames'})
+
+
+def cpu_costs(resources):
+    """CPU seconds per session and the cores it kept busy per hour its samples cover
+
+    The rate is taken over the span of the resource samples, the same window the CPU
+    seconds come from, so a session whose series misses part of its run is not understated.
+    """
+    spent = resources.groupby(['stream_id', 'label'])['cpu_seconds'].agg(['min', 'max'])
+    df = (spent['max'] - spent['min']).groupby(level='stream_id').sum().rename('cpu_seconds').to_frame()
+    span = resources.groupby('stream_id')['timestamp'].agg(lambda s: s.max() - s.min())
+    df['sampled_hours'] = span / 3600
+    df['core_hours_per_stream_hour'] = df['cpu_seconds'] / 3600 / df['sampled_hours'].where(lambda s: s > 0)
+    return df
+
+
+def egress_rates(encoder):
+    """Mean output bitrate per session and the gigabytes it sends per hour"""
+    bitrate = encoder.groupby('stream_id')['bitrate_kbps'].mean().rename('mean_bitrate_kbps')
+    df = bitrate.to_frame()
+    df['gb_per_stream_hour'] = df['mean_bitrate_kbps'] * 3600 / 8 / 1e6
+    return df
+
+
+def analyze_sessions(sessions):
+    """Per-session speed percentiles, drop rate and cost for the given sessions"""
+    encoder = load_series(sessions, "encoder", ENCODER_COLUMNS)
+    resources = load_series(sessions, "resources", RESOURCE_COLUMNS)
+
+    stats = sessions.set_index('stream_id')[['started_at', 'stream_hours']]
+    if not encoder.empty:
+        stats = stats.join([speed_percentiles(encoder), drop_rates(encoder), egress_rates(encoder)])
+    if not resources.empty:
+        stats = stats.join(cpu_costs(resources))
+    return stats, encoder
+
+
+def summarize_sessions(stats, encoder):
+    """Fleet-wide figures: speed percentiles over every sample, drop rate and cost per stream-hour"""
+    summary = {
+        'sessions': len(stats),
+        'stream_hours': float(stats['stream_hours'].sum())
+    }
+    speeds = encoder['speed'].dropna() if 'speed' in encoder else pd.Series(dtype=float)
+    for q in SPEED_QUANTILES:
+        summary[f"speed_p{int(q * 100)}"] = float(speeds.quantile(q)) if not speeds.empty else None
+
+    if 'frames' in stats:
+        total = stats['frames'].sum() + stats['dropped_frames'].sum()
+        summary['drop_rate'] = float(stats['dropped_frames'].sum() / total) if total else None
+    if 'cpu_seconds' in stats and stats['sampled_hours'].sum():
+        summary['core_hours_per_stream_hour'] = float(stats['cpu_seconds'].sum() / 3600 / stats['sampled_hours'].sum())
+    if 'gb_per_stream_hour' in stats and stats['gb_per_stream_hour'].notna().any():
+        weighted = (stats['gb_per_stream_hour'] * stats['stream_hours']).sum()
+        summary['gb_per_stream_hour'] = float(weighted / summary['stream_hours']) if summary['stream_hours'] else None
+    return summary
@@ -9,17 +9,17 @@ from utils import check_dependencies, install_missing_dependencies
 from components import (
     render_header, render_sidebar, render_footer,
     render_upload_section, render_stream_config, 
-    render_analytics_dashboard, render_stream_logs
+    render_analytics_dashboard, render_stream_logs, render_log_archive
 )
+from profiler import get_render_profiler
 from streaming import StreamingManager
 from styles import apply_custom_styles
+import components as ui_components
 
 def initialize_session_state():
     """Initialize session state variables"""
     if 'theme' not in st.session_state:
         st.session_state.theme = "dark"
-    if 'streaming' not in st.session_state:
-        st.session_state.streaming = False
     if 'logs' not in st.session_state:
         st.session_state.logs = []
     if 'stream_manager' not in st.session_state:
@@ -34,6 +34,19 @@ def initialize_session_state():
         }
 
 def main():
+    # Time render functions when the profiler is on; a requested capture profiles this rerun
+    profiler = get_render_profiler()
+    profiler.apply(globals(), vars(ui_components))
+    profiler.begin_rerun(capture=st.session_state.pop('profile_next_rerun', False))
+    try:
+        run_app()
+    finally:
+        capture = profiler.end_rerun()
+        if capture:
+            st.session_state.profile_capture = capture
+
+def run_app():
+    """Check dependencies, then render the page for the selected tab"""
     # Ensure dependencies are installed
     required_packages = [
         "streamlit", "streamlit-extras", "plotly", 
@@ -48,9 +61,6 @@ def main():
     # Initialize session state
     initialize_session_state()
     
-    # Apply custom CSS styles
-    apply_custom_styles()
-    
     # Configure page settings
     st.set_page_config(
         page_title="StreamHub Pro - YouTube Streaming",
@@ -59,6 +69,9 @@ def main():
         initial_sidebar_state="expanded"
     )
     
+    # Inline the minified CSS (built once per process) on every rerun
+    apply_custom_styles()
+    
     # Render header with logo and title
     render_header()
     
@@ -79,6 +92,9 @@ def main():
         with col2:
             # Stream logs section
             render_stream_logs()
+            
+            # Search logs of past and current streams
+            render_log_archive()
     
     elif st.session_state.selected_tab == "Analytics":
         render_analytics_dashboard()
@@ -0,0 +1,359 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import itertools
+import threading
+import subprocess
+from datetime import datetime
+
+from filtergraph import build_video_filter, SHORTS_SIZE, FIT_MODES
+from latency import IngestReceiver, compute_latency_report, TRANSCODE_START_MARKER
+from metrics import parse_progress_line
+from placement import get_cpu_placer
+from procstats import read_proc_stats
+from streaming import StreamingManager
+
+DEFAULT_SOURCE_DIR = os.path.join(".bench", "sources")
+DEFAULT_RESULTS_DIR = os.path.join(".bench", "results")
+
+# Base port for the local RTMP stand-in, one port per concurrent stream
+RTMP_BASE_PORT = 19350
+
+
+def generate_synthetic_source(width, height, fps, duration=10, source_dir=DEFAULT_SOURCE_DIR):
+    """Generate (or reuse) a synthetic test clip with ffmpeg's testsrc2 and sine sources"""
+    os.makedirs(source_dir, exist_ok=True)
+    path = os.path.join(source_dir, f"testsrc_{width}x{height}_{fps}fps_{duration}s.mp4")
+    if os.path.exists(path):
+        return path
+
+    cmd = [
+        "ffmpeg", "-y", "-v", "error",
+        "-f", "lavfi", "-i", f"testsrc2=size={width}x{height}:rate={fps}",
+        "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000",
+        "-t", str(duration),
+        "-c:v", "libx264", "-preset", "ultrafast", "-pix_fmt", "yuv420p",
+        "-g", str(fps), "-c:a", "aac", "-shortest", path
+    ]
+    subprocess.run(cmd, check=True)
+    return path
+
+
+def sink_target(sink, index, results_dir=DEFAULT_RESULTS_DIR):
+    """Return (output_url, output_format) for a local sink"""
+    if sink == "null":
+        return "-", "null"
+    if sink == "latency":
+        return None, "flv"
+    if sink == "file":
+        os.makedirs(results_dir, exist_ok=True)
+        return os.path.join(results_dir, f"sink_{index}.flv"), "flv"
+    return f"rtmp://127.0.0.1:{RTMP_BASE_PORT + index}/live2/bench", "flv"
+
+
+def start_rtmp_listener(index):
+    """Start an ffmpeg RTMP server that accepts one publisher and discards the data"""
+    cmd = [
+        "ffmpeg", "-v", "error", "-listen", "1",
+        "-i", f"rtmp://127.0.0.1:{RTMP_BASE_PORT + index}/live2/bench",
+        "-c", "copy", "-f", "null", "-"
+    ]
+    listener = subprocess.Popen(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    # Give the listener a moment to bind before the encoder connects
+    time.sleep(0.5)
+    return listener
+
+
+class BenchStream:
+    """One encoder process under measurement"""
+
+    def __init__(self, manager, cmd):
+        self.manager = manager
+        self.cmd = cmd
+        self.process = None
+        self.start = None
+        self.first_frame_at = None
+        self.progress = []
+        self.peak_rss = 0
+        self.reader = None
+        self.receiver = None
+        self.marks = {}
+
+    def launch(self):
+        """Spawn the encoder with the same placement the streaming engine would use"""
+        placer = get_cpu_placer()
+        self.start = time.monotonic()
+        self.marks['click'] = self.start
+        self.process = subprocess.Popen(
+            self.cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            bufsize=1,
+            universal_newlines=True
+        )
+        self.marks['spawn'] = time.monotonic()
+        placer.attach(self.manager.stream_id, self.process.pid)
+        self.reader = threading.Thread(target=self._read_output, daemon=True)
+        self.reader.start()
+
+    def _read_output(self):
+        """Collect progress stats and the time of the first encoded frame"""
+        for line in self.process.stdout:
+            if TRANSCODE_START_MARKER in line:
+                self.marks['transcode_start'] = time.monotonic()
+            if "frame=" not in line:
+                continue
+            self.marks.setdefault('transcode_start', time.monotonic())
+            stats = parse_progress_line(line)
+            stats['elapsed'] = time.monotonic() - self.start
+            self.progress.append(stats)
+            if self.first_frame_at is None and stats.get('frame', 0) > 0:
+                self.first_frame_at = stats['elapsed']
+
+    def sample(self):
+        """Track peak memory and return the latest /proc stats"""
+        stats = read_proc_stats(self.process.pid)
+        if stats:
+            self.peak_rss = max(self.peak_rss, stats['rss_bytes'])
+        return stats
+
+    def stop(self):
+        """Terminate the encoder and return its final /proc stats"""
+        final = self.sample()
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=5)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        get_cpu_placer().release(self.manager.stream_id)
+        if self.manager.log_store:
+            self.manager.log_store.close()
+            self.manager.log_store = None
+        if self.receiver:
+            self.receiver.stop()
+        return final
+
+    def summary(self, wall_seconds, final_stats):
+        """Summarise the measurements for this stream"""
+        # Ignore the first half of the run so startup does not skew sustained speed
+        steady = [p['speed'] for p in self.progress if 'speed' in p and p['elapsed'] >= wall_seconds / 2]
+        cpu_seconds = final_stats['cpu_seconds'] if final_stats else None
+        dropped = self.progress[-1].get('drop', 0) if self.progress else 0
+        summary = {
+            'time_to_first_frame': self.first_frame_at,
+            'sustained_speed': sum(steady) / len(steady) if steady else None,
+            'cpu_seconds': cpu_seconds,
+            'cpu_percent': 100 * cpu_seconds / wall_seconds if cpu_seconds is not None else None,
+            'peak_rss_bytes': self.peak_rss,
+            'frames': self.progress[-1].get('frame', 0) if self.progress else 0,
+            'dropped_frames': dropped,
+            'threads': self.manager.placement['threads'],
+            'cores': self.manager.placement['cores']
+        }
+        if self.receiver:
+            summary['latency'] = compute_latency_report(self.marks, self.receiver)
+        return summary
+
+
+def run_case(source, config, concurrency, duration, sink):
+    """Run one preset/bitrate/shorts combination with N concurrent streams"""
+    streams = []
+    listeners = []
+
+    for index in range(concurrency):
+        manager = StreamingManager()
+        # Only the command is needed; the engine's logs, queues and cache warming would skew the run
+        manager.prepare_session(source, "bench", config, side_effects=False)
+        output_url, output_format = sink_target(sink, index)
+        receiver = None
+        if sink == "rtmp":
+            listeners.append(start_rtmp_listener(index))
+        elif sink == "latency":
+            # Local ingest stand-in that timestamps each received packet
+            receiver = IngestReceiver(stream_key=manager.stream_id)
+            receiver.start()
+            output_url = receiver.url
+        stream = BenchStream(manager, manager.build_ffmpeg_command(output_url, output_format))
+        stream.receiver = receiver
+        streams.append(stream)
+
+    for stream in streams:
+        stream.launch()
+
+    started = time.monotonic()
+    while time.monotonic() - started < duration:
+        time.sleep(1)
+        for stream in streams:
+            stream.sample()
+
+    wall_seconds = time.monotonic() - started
+    results = [stream.summary(wall_seconds, stream.stop()) for stream in streams]
+
+    for listener in listeners:
+        listener.terminate()
+        listener.wait()
+
+    return {
+        'config': config,
+        'concurrency': concurrency,
+        'duration': wall_seconds,
+        'command': streams[0].cmd if streams else [],
+        'streams': results
+    }
+
+
+def measure_filter_cost(source, video_filter, frames=300):
+    """Measure CPU seconds per frame of decoding plus an optional filter graph"""
+    # The bench: line is logged at info level; -nostats keeps progress lines out of the output
+    cmd = ["ffmpeg", "-hide_banner", "-nostats", "-loglevel", "info", "-benchmark",
+           "-i", source, "-frames:v", str(frames), "-an"]
+    if video_filter:
+        cmd += ["-vf", video_filter]
+    cmd += ["-f", "null", "-"]
+
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+    # -benchmark prints "bench: utime=1.234s stime=0.012s rtime=0.456s"
+    for line in result.stdout.splitlines():
+        if line.startswith("bench:") and "utime=" in line:
+            fields = dict(part.split("=") for part in line.split()[1:] if "=" in part)
+            cpu = float(fields['utime'].rstrip("s")) + float(fields.get('stime', '0s').rstrip("s"))
+            return cpu / frames
+    return None
+
+
+def run_filter_costs(resolutions, frame_rates, presets):
+    """Measure the per-frame cost of each Shorts filter graph over the decode baseline"""
+    costs = []
+    for (width, height), fps in itertools.product(resolutions, frame_rates):
+        source = generate_synthetic_source(width, height, fps)
+        baseline = measure_filter_cost(source, None)
+        for preset, fit_mode in itertools.product(presets, FIT_MODES):
+            video_filter = build_video_filter(width, height, *SHORTS_SIZE, fit_mode, preset)
+            total = measure_filter_cost(source, video_filter) if video_filter else baseline
+            costs.append({
+                'source': {'width': width, 'height': height, 'fps': fps},
+                'preset': preset,
+                'fit_mode': fit_mode,
+                'filter': video_filter,
+                'decode_seconds_per_frame': baseline,
+                'filter_seconds_per_frame': total - baseline if total is not None and baseline is not None else None
+            })
+            print(f"{width}x{height}@{fps} {preset} {fit_mode}: {video_filter}")
+    return costs
+
+
+def get_environment():
+    """Describe the host and ffmpeg build so runs can be compared"""
+    try:
+        ffmpeg_version = subprocess.run(
+            ["ffmpeg", "-version"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        ).stdout.split("\n")[0]
+    except OSError:
+        ffmpeg_version = None
+
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+        ).stdout.strip() or None
+    except OSError:
+        commit = None
+
+    return {
+        'timestamp': datetime.now().isoformat(),
+        'host': platform.node(),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'cpu_count': len(get_cpu_placer().cores),
+        'ffmpeg': ffmpeg_version,
+        'commit': commit
+    }
+
+
+def run_benchmark(resolutions, frame_rates, presets, bitrates, shorts_modes,
+                  max_concurrency, duration, sink, output_path, profiles=("normal",),
+                  filter_costs=False):
+    """Run the full benchmark matrix and write the results as JSON"""
+    report = {'environment': get_environment(), 'runs': []}
+
+    if filter_costs:
+        report['filter_costs'] = run_filter_costs(resolutions, frame_rates, presets)
+
+    for (width, height), fps in itertools.product(resolutions, frame_rates):
+        source = generate_synthetic_source(width, height, fps)
+        for preset, bitrate, is_shorts, profile in itertools.product(presets, bitrates, shorts_modes, profiles):
+            config = {
+                'is_shorts': is_shorts,
+                'quality_preset': preset,
+                'bitrate': bitrate,
+                'audio_bitrate': '128k',
+                'encoding_profile': profile
+            }
+            for concurrency in range(1, max_concurrency + 1):
+                print(f"{width}x{height}@{fps} {preset} {bitrate} {profile} shorts={is_shorts} x{concurrency}")
+                run = run_case(source, config, concurrency, duration, sink)
+                run['source'] = {'width': width, 'height': height, 'fps': fps}
+                report['runs'].append(run)
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+    with open(output_path, "w") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"Results written to {output_path}")
+    return report
+
+
+def parse_resolution(value):
+    """Parse a WIDTHxHEIGHT string"""
+    width, height = value.lower().split("x")
+    return int(width), int(height)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark StreamHub encoder command lines against a local sink")
+    parser.add_argument("--resolutions", default="1280x720,1920x1080", help="Comma-separated WIDTHxHEIGHT list")
+    parser.add_argument("--fps", default="30,60", help="Comma-separated source frame rates")
+    parser.add_argument("--presets", default="veryfast", help="Comma-separated x264 presets")
+    parser.add_argument("--bitrates", default="2500k", help="Comma-separated video bitrates")
+    parser.add_argument("--shorts", default="off,on", help="Shorts modes to test: off, on or off,on")
+    parser.add_argument("--profiles", default="normal", help="Comma-separated encoding profiles")
+    parser.add_argument("--max-concurrency", type=int, default=2, help="Run 1..N concurrent streams")
+    parser.add_argument("--duration", type=float, default=20, help="Seconds per run")
+    parser.add_argument("--sink", choices=["null", "file", "rtmp", "latency"], default="null",
+                        help="Local output sink; 'latency' also measures end-to-end latency")
+    parser.add_argument("--filter-costs", action="store_true", help="Also measure per-frame cost of each filter graph")
+    parser.add_argument("--output", default=None, help="JSON results path")
+    args = parser.parse_args(argv)
+
+    if not shutil.which("ffmpeg"):
+        print("FFmpeg is not installed or not on PATH.", file=sys.stderr)
+        return 1
+
+    output = args.output or os.path.join(
+        DEFAULT_RESULTS_DIR, f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+    )
+
+    run_benchmark(
+        resolutions=[parse_resolution(r) for r in args.resolutions.split(",")],
+        frame_rates=[int(f) for f in args.fps.split(",")],
+        presets=args.presets.split(","),
+        bitrates=args.bitrates.split(","),
+        shorts_modes=[mode == "on" for mode in args.shorts.split(",")],
+        max_concurrency=args.max_concurrency,
+        duration=args.duration,
+        sink=args.sink,
+        output_path=output,
+        profiles=args.profiles.split(","),
+        filter_costs=args.filter_costs
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
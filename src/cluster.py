@@ -0,0 +1,534 @@
+import argparse
+import json
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from filtergraph import SHORTS_SIZE
+from medialib import MediaLibrary
+from placement import estimate_stream_weight, get_cpu_placer
+from renditions import RENDITION_FORMATS
+
+DEFAULT_COORDINATOR_PORT = 8700
+DEFAULT_WORKER_PORT = 8701
+
+# Workers report every HEARTBEAT_INTERVAL seconds and are presumed dead after HEARTBEAT_TIMEOUT
+HEARTBEAT_INTERVAL = 2.0
+HEARTBEAT_TIMEOUT = 3 * HEARTBEAT_INTERVAL
+
+# How often the coordinator places pending streams and checks for dead workers
+PLACEMENT_INTERVAL = 1.0
+
+# A stream that fails or loses its worker this many times is given up on
+MAX_MOVES = 3
+
+# Workers keep a new stream this long even if a heartbeat reply does not list it yet
+ASSIGNMENT_GRACE = 2 * HEARTBEAT_INTERVAL
+
+
+def find_local_paths(value, prefix="config"):
+    """Return the keys of a definition that hold host-local paths"""
+    found = []
+    if isinstance(value, dict):
+        for key, item in value.items():
+            if key == "path" or key.endswith("_path"):
+                found.append(f"{prefix}.{key}")
+            found += find_local_paths(item, f"{prefix}.{key}")
+    elif isinstance(value, list):
+        for i, item in enumerate(value):
+            found += find_local_paths(item, f"{prefix}[{i}]")
+    return found
+
+
+def make_definition(library, video_path, stream_key, config, stream_id=None):
+    """Build a portable stream definition; local files are replaced by library asset IDs"""
+    config = json.loads(json.dumps(config))
+    for layer in config.get('overlays', []):
+        if layer.get('path'):
+            layer['asset_id'] = library.register(layer.pop('path'))
+
+    asset_id = library.register(video_path)
+    definition = {
+        'stream_id': stream_id or uuid.uuid4().hex[:8],
+        'asset_id': asset_id,
+        'asset': library.describe(asset_id),
+        'stream_key': stream_key,
+        'config': config
+    }
+    validate_definition(definition)
+    return definition
+
+
+def validate_definition(definition):
+    """Reject definitions that are incomplete or carry host-local paths"""
+    if not isinstance(definition, dict):
+        raise ValueError("Stream definition must be a JSON object")
+    for key in ('stream_id', 'asset_id', 'stream_key'):
+        if not definition.get(key):
+            raise ValueError(f"Stream definition is missing '{key}'")
+    local_paths = find_local_paths(definition.get('config', {}))
+    if local_paths:
+        raise ValueError(f"Stream definition carries local paths: {', '.join(local_paths)}")
+
+
+def validate_heartbeat(report):
+    """Reject worker reports without an identity and address, or with malformed fields"""
+    if not isinstance(report, dict):
+        raise ValueError("Heartbeat must be a JSON object")
+    for key in ('node_id', 'url'):
+        if not isinstance(report.get(key), str) or not report[key]:
+            raise ValueError(f"Heartbeat is missing '{key}'")
+    for key, kind in (('capacity', dict), ('streams', dict), ('assets', list)):
+        if not isinstance(report.get(key, kind()), kind):
+            raise ValueError(f"Heartbeat field '{key}' must be a {kind.__name__}")
+
+
+def resolve_definition(definition, library):
+    """Return the local video path and config of a definition on this host"""
+    video_path = library.resolve(definition['asset_id'])
+    if video_path is None:
+        raise LookupError(f"Asset {definition['asset_id']} is not in this host's library")
+
+    config = json.loads(json.dumps(definition.get('config', {})))
+    for layer in config.get('overlays', []):
+        if layer.get('asset_id'):
+            layer['path'] = library.resolve(layer.pop('asset_id'))
+    return video_path, config
+
+
+def estimate_definition_weight(definition):
+    """Estimate the CPU weight of a definition from its asset metadata and config"""
+    config = definition.get('config', {})
+    asset = definition.get('asset') or {}
+    source_size = (asset.get('width'), asset.get('height'))
+    size = SHORTS_SIZE if config.get('is_shorts') else source_size
+    preset = config.get('quality_preset', 'veryfast')
+
+    weight = estimate_stream_weight(*size, preset)
+    for rendition in config.get('renditions', []):
+        rendition_size = RENDITION_FORMATS.get(rendition.get('format') or "source") or source_size
+        weight += estimate_stream_weight(*rendition_size, rendition.get('preset', preset))
+    return weight
+
+
+def http_json(method, url, payload=None, timeout=5):
+    """Send a JSON request; returns (status, body), with status None if unreachable"""
+    data = json.dumps(payload).encode() if payload is not None else None
+    request = urllib.request.Request(url, data=data, method=method, headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read() or b"{}")
+    except urllib.error.HTTPError as e:
+        try:
+            return e.code, json.loads(e.read() or b"{}")
+        except ValueError:
+            return e.code, {}
+    except (urllib.error.URLError, OSError, ValueError):
+        return None, {}
+
+
+class _JsonHandler(BaseHTTPRequestHandler):
+    """Routes JSON requests to the ``handle`` method of the server's app"""
+
+    def _dispatch(self, method):
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length)) if length else {}
+        except ValueError:
+            body = None
+
+        if body is None:
+            status, payload = 400, {'error': "invalid JSON"}
+        else:
+            status, payload = self.server.app.handle(method, self.path.rstrip("/"), body)
+
+        encoded = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(app, host, port):
+    """Serve an app's JSON API on a background thread and return the server"""
+    server = ThreadingHTTPServer((host, port), _JsonHandler)
+    server.app = app
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class Coordinator:
+    """Places stream definitions on worker agents by their reported free capacity
+
+    Workers heartbeat their capacity, assets and stream states. Streams whose worker
+    stops heartbeating, or that fail on it, are moved to another worker that has the
+    asset. Each heartbeat reply lists the streams the worker should be running, so a
+    worker that comes back after being presumed dead drops streams that were moved.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.nodes = {}
+        self.streams = {}
+        self.running = False
+
+    def start(self, host="127.0.0.1", port=DEFAULT_COORDINATOR_PORT):
+        """Serve the API and start the placement loop"""
+        self.server = serve(self, host, port)
+        self.running = True
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop the API and the placement loop"""
+        self.running = False
+        self.server.shutdown()
+
+    def handle(self, method, path, body):
+        """Route an API request"""
+        if method == "POST" and path == "/heartbeat":
+            return self._heartbeat(body)
+        if method == "POST" and path == "/streams":
+            return self._submit(body)
+        if method == "DELETE" and path.startswith("/streams/"):
+            return self._remove(path.split("/")[-1])
+        if method == "GET" and path == "/status":
+            return 200, self.get_status()
+        return 404, {'error': "not found"}
+
+    def _submit(self, definition):
+        """Queue a stream definition for placement"""
+        try:
+            validate_definition(definition)
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        with self.lock:
+            self.streams[definition['stream_id']] = {
+                'definition': definition,
+                'weight': estimate_definition_weight(definition),
+                'node_id': None,
+                'assigned_at': None,
+                'state': "scheduled",
+                'moves': 0,
+                'detail': None
+            }
+        self._place_pending()
+        return 202, {'stream_id': definition['stream_id']}
+
+    def _remove(self, stream_id):
+        """Stop a stream wherever it runs"""
+        with self.lock:
+            stream = self.streams.pop(stream_id, None)
+            node = self.nodes.get(stream['node_id']) if stream and stream['node_id'] else None
+        if stream is None:
+            return 404, {'error': "unknown stream"}
+        if node:
+            http_json("DELETE", f"{node['url']}/streams/{stream_id}")
+        return 200, {'stream_id': stream_id, 'state': "stopped"}
+
+    def _heartbeat(self, report):
+        """Record a worker's report and reply with the streams it should run"""
+        try:
+            validate_heartbeat(report)
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        node_id = report['node_id']
+        with self.lock:
+            self.nodes[node_id] = {
+                'url': report['url'],
+                'capacity': report.get('capacity', {}),
+                'assets': set(report.get('assets', [])),
+                'streams': report.get('streams', {}),
+                'last_seen': time.monotonic()
+            }
+            reported = report.get('streams', {})
+            now = time.monotonic()
+            for stream in self.streams.values():
+                if stream['node_id'] != node_id:
+                    continue
+                state = reported.get(stream['definition']['stream_id'])
+                if state is None:
+                    # The worker restarted or dropped the stream after accepting it
+                    if now - stream['assigned_at'] > ASSIGNMENT_GRACE:
+                        self._unassign(stream, "missing from worker report")
+                elif state == "failed":
+                    self._unassign(stream, "failed on worker")
+                else:
+                    stream['state'] = state
+            assigned = [sid for sid, s in self.streams.items() if s['node_id'] == node_id]
+        return 200, {'streams': assigned}
+
+    def _unassign(self, stream, reason):
+        """Send a stream back for placement elsewhere (caller holds the lock)"""
+        stream['node_id'] = None
+        stream['moves'] += 1
+        if stream['moves'] > MAX_MOVES:
+            stream['state'] = "failed"
+            stream['detail'] = f"{reason}; gave up after {MAX_MOVES} moves"
+        else:
+            stream['state'] = "reconnecting"
+            stream['detail'] = reason
+
+    def _run(self):
+        """Expire silent workers and place pending streams"""
+        while self.running:
+            now = time.monotonic()
+            with self.lock:
+                for node_id, node in list(self.nodes.items()):
+                    if now - node['last_seen'] > HEARTBEAT_TIMEOUT:
+                        del self.nodes[node_id]
+                        for stream in self.streams.values():
+                            if stream['node_id'] == node_id:
+                                self._unassign(stream, f"worker {node_id} lost")
+            self._place_pending()
+            time.sleep(PLACEMENT_INTERVAL)
+
+    def _free_capacity(self, node_id):
+        """Free capacity of a node minus streams assigned but not yet in its report (caller holds the lock)"""
+        node = self.nodes[node_id]
+        pending = sum(
+            s['weight'] for sid, s in self.streams.items()
+            if s['node_id'] == node_id and sid not in node['streams']
+        )
+        return node['capacity'].get('free', 0) - pending
+
+    def _place_pending(self):
+        """Assign unplaced streams to the worker with the most free capacity that has the asset"""
+        with self.lock:
+            pending = [
+                (sid, s) for sid, s in self.streams.items()
+                if s['node_id'] is None and s['state'] != "failed"
+            ]
+
+        for stream_id, stream in pending:
+            with self.lock:
+                candidates = sorted(
+                    (
+                        (self._free_capacity(node_id), node_id, node['url'])
+                        for node_id, node in self.nodes.items()
+                        if stream['definition']['asset_id'] in node['assets']
+                    ),
+                    reverse=True
+                )
+            for free, node_id, url in candidates:
+                if free < stream['weight']:
+                    break
+                # Assign first so a heartbeat reply racing the start already lists the stream
+                with self.lock:
+                    stream['node_id'] = node_id
+                    stream['assigned_at'] = time.monotonic()
+                    stream['state'] = "starting"
+                status, _ = http_json("POST", f"{url}/streams", stream['definition'])
+                if status == 200:
+                    break
+                with self.lock:
+                    stream['node_id'] = None
+                    stream['state'] = "scheduled"
+
+    def get_status(self):
+        """Return workers and streams as plain data"""
+        now = time.monotonic()
+        with self.lock:
+            return {
+                'nodes': {
+                    node_id: {
+                        'url': node['url'],
+                        'capacity': node['capacity'],
+                        'streams': node['streams'],
+                        'seconds_since_heartbeat': round(now - node['last_seen'], 1)
+                    }
+                    for node_id, node in self.nodes.items()
+                },
+                'streams': {
+                    stream_id: {
+                        'node_id': s['node_id'],
+                        'state': s['state'],
+                        'moves': s['moves'],
+                        'detail': s['detail'],
+                        'weight': round(s['weight'], 3)
+                    }
+                    for stream_id, s in self.streams.items()
+                }
+            }
+
+
+class WorkerAgent:
+    """Runs the streams a coordinator places on this host"""
+
+    def __init__(self, node_id, coordinator_url, library_root=".", host="127.0.0.1", port=DEFAULT_WORKER_PORT):
+        self.node_id = node_id
+        self.coordinator_url = coordinator_url.rstrip("/")
+        self.library = MediaLibrary(library_root)
+        self.host = host
+        self.port = port
+        self.lock = threading.Lock()
+        self.managers = {}
+        self.started_at = {}
+        self.running = False
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def start(self):
+        """Scan the library, serve the API and start heartbeating"""
+        self.library.scan()
+        self.server = serve(self, self.host, self.port)
+        self.running = True
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def stop(self):
+        """Stop every stream and the API"""
+        self.running = False
+        with self.lock:
+            managers = list(self.managers.values())
+            self.managers.clear()
+        for manager in managers:
+            manager.stop_streaming()
+        self.server.shutdown()
+
+    def handle(self, method, path, body):
+        """Route an API request"""
+        if method == "POST" and path == "/streams":
+            return self._start_stream(body)
+        if method == "DELETE" and path.startswith("/streams/"):
+            self._stop_stream(path.split("/")[-1])
+            return 200, {}
+        if method == "GET" and path == "/status":
+            return 200, self._report()
+        return 404, {'error': "not found"}
+
+    def _start_stream(self, definition):
+        """Start a stream from a portable definition"""
+        from streaming import StreamingManager
+
+        try:
+            validate_definition(definition)
+            video_path, config = resolve_definition(definition, self.library)
+        except ValueError as e:
+            return 400, {'error': str(e)}
+        except LookupError as e:
+            return 409, {'error': str(e)}
+
+        stream_id = definition['stream_id']
+        with self.lock:
+            existing = self.managers.get(stream_id)
+            # A stream placed here again after failing gets a fresh manager
+            if existing and existing.lifecycle.snapshot.state not in ("failed", "stopped"):
+                return 200, {'stream_id': stream_id}
+            manager = self.managers[stream_id] = StreamingManager()
+            self.started_at[stream_id] = time.monotonic()
+
+        if not manager.start_streaming(video_path, definition['stream_key'], config):
+            with self.lock:
+                self.managers.pop(stream_id, None)
+            return 500, {'error': "stream failed to start"}
+        return 200, {'stream_id': stream_id}
+
+    def _stop_stream(self, stream_id):
+        """Stop a stream if it runs here"""
+        with self.lock:
+            manager = self.managers.pop(stream_id, None)
+            self.started_at.pop(stream_id, None)
+        if manager and manager.get_status().is_streaming:
+            manager.stop_streaming()
+
+    def _report(self):
+        """Capacity, assets and stream states for the coordinator"""
+        with self.lock:
+            streams = {sid: m.lifecycle.snapshot.state for sid, m in self.managers.items()}
+        return {
+            'node_id': self.node_id,
+            'url': self.url,
+            'capacity': get_cpu_placer().get_capacity(),
+            'assets': [asset['asset_id'] for asset in self.library.list_assets()],
+            'streams': streams
+        }
+
+    def _run(self):
+        """Heartbeat and stop streams the coordinator no longer assigns to this worker"""
+        while self.running:
+            status, reply = http_json("POST", f"{self.coordinator_url}/heartbeat", self._report())
+            if status == 200:
+                assigned = set(reply.get('streams', []))
+                now = time.monotonic()
+                with self.lock:
+                    unassigned = [
+                        sid for sid in self.managers
+                        if sid not in assigned and now - self.started_at.get(sid, now) > ASSIGNMENT_GRACE
+                    ]
+                for stream_id in unassigned:
+                    self._stop_stream(stream_id)
+            time.sleep(HEARTBEAT_INTERVAL)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run StreamHub streams across several worker processes")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    coordinator = commands.add_parser("coordinator", help="Place streams on workers")
+    coordinator.add_argument("--port", type=int, default=DEFAULT_COORDINATOR_PORT)
+
+    worker = commands.add_parser("worker", help="Run streams placed by a coordinator")
+    worker.add_argument("--node-id", required=True)
+    worker.add_argument("--port", type=int, default=DEFAULT_WORKER_PORT)
+    worker.add_argument("--coordinator", default=f"http://127.0.0.1:{DEFAULT_COORDINATOR_PORT}")
+    worker.add_argument("--library", default=".", help="Media library root on this host")
+
+    submit = commands.add_parser("submit", help="Submit a stream to a coordinator")
+    submit.add_argument("--coordinator", default=f"http://127.0.0.1:{DEFAULT_COORDINATOR_PORT}")
+    submit.add_argument("--library", default=".", help="Media library the video belongs to")
+    submit.add_argument("--video", required=True)
+    submit.add_argument("--stream-key", required=True)
+    submit.add_argument("--config", default="{}", help="Stream config as JSON")
+
+    status = commands.add_parser("status", help="Show workers and streams")
+    status.add_argument("--coordinator", default=f"http://127.0.0.1:{DEFAULT_COORDINATOR_PORT}")
+
+    args = parser.parse_args(argv)
+
+    if args.command in ("coordinator", "worker"):
+        if args.command == "coordinator":
+            Coordinator().start(port=args.port)
+            print(f"Coordinator listening on port {args.port}")
+        else:
+            WorkerAgent(args.node_id, args.coordinator, args.library, port=args.port).start()
+            print(f"Worker {args.node_id} listening on port {args.port}")
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            return 0
+
+    if args.command == "submit":
+        definition = make_definition(
+            MediaLibrary(args.library), args.video, args.stream_key, json.loads(args.config)
+        )
+        code, body = http_json("POST", f"{args.coordinator}/streams", definition)
+    else:
+        code, body = http_json("GET", f"{args.coordinator}/status")
+
+    print(json.dumps(body, indent=2))
+    return 0 if code and code < 400 else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
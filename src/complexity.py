@@ -0,0 +1,169 @@
+import json
+import os
+import re
+import subprocess
+
+from filtergraph import SHORTS_SIZE
+from utils import get_content_hash, get_video_info
+
+# Analysis results per content hash
+CACHE_DIR = os.path.join(".cache", "complexity")
+
+# Number of evenly spaced segments sampled and the seconds decoded from each
+SAMPLE_SEGMENTS = 4
+SEGMENT_SECONDS = 3
+
+# Segments are analysed at low resolution and frame rate to keep the pass cheap
+ANALYSIS_FILTER = (
+    "scale=480:-2:flags=fast_bilinear,fps=10,signalstats,entropy,metadata=mode=print"
+)
+
+YDIF_PATTERN = re.compile(r"lavfi\.signalstats\.YDIF=([\d.]+)")
+ENTROPY_PATTERN = re.compile(r"lavfi\.entropy\.normalized_entropy\.normal\.Y=([\d.]+)")
+
+# Mean luma difference between sampled frames that counts as full motion
+FULL_MOTION_YDIF = 25.0
+
+# Normalized luma entropy of a flat slide and of dense texture
+FLAT_ENTROPY = 0.4
+DENSE_ENTROPY = 0.95
+
+# Bits per pixel per frame for the least and most complex content
+MIN_BITS_PER_PIXEL = 0.02
+MAX_BITS_PER_PIXEL = 0.11
+
+# Bitrates a recommendation is rounded up to, in kbps
+BITRATE_STEPS = [500, 750, 1000, 1500, 2000, 2500, 3000, 3500, 4000, 4500, 5000, 6000]
+
+# Output resolutions a recommendation is made for
+RECOMMENDATION_SIZES = {
+    "1080p": (1920, 1080),
+    "720p": (1280, 720),
+    "480p": (854, 480),
+    "shorts": SHORTS_SIZE
+}
+
+
+def sample_offsets(duration, segments=SAMPLE_SEGMENTS, length=SEGMENT_SECONDS):
+    """Start times of evenly spaced sample segments"""
+    if not duration or duration <= length:
+        return [0]
+    segments = min(segments, max(1, int(duration // length)))
+    step = (duration - length) / segments
+    return [step * (i + 0.5) for i in range(segments)]
+
+
+def analyze_segment(video_path, offset, length=SEGMENT_SECONDS):
+    """Return per-frame (YDIF, entropy) statistics of one sampled segment"""
+    cmd = [
+        "ffmpeg", "-hide_banner", "-ss", f"{offset:.3f}", "-t", str(length), "-i", video_path,
+        "-an", "-vf", ANALYSIS_FILTER, "-f", "null", "-"
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, errors="replace")
+    ydif = [float(v) for v in YDIF_PATTERN.findall(result.stdout)]
+    entropy = [float(v) for v in ENTROPY_PATTERN.findall(result.stdout)]
+    # The first frame of a segment has no predecessor, so its YDIF is meaningless
+    return ydif[1:], entropy
+
+
+def score_content(ydif, entropy):
+    """Turn frame statistics into motion, spatial and overall complexity scores in 0..1"""
+    motion = min(1.0, sum(ydif) / len(ydif) / FULL_MOTION_YDIF) if ydif else 0.0
+    if entropy:
+        mean_entropy = sum(entropy) / len(entropy)
+        spatial = min(1.0, max(0.0, (mean_entropy - FLAT_ENTROPY) / (DENSE_ENTROPY - FLAT_ENTROPY)))
+    else:
+        spatial = 0.0
+    return {
+        'motion': round(motion, 3),
+        'spatial': round(spatial, 3),
+        'complexity': round(0.6 * motion + 0.4 * spatial, 3)
+    }
+
+
+def recommend_preset(complexity):
+    """Pick the cheapest x264 preset that holds up for the content
+
+    Static content compresses well even with the fastest presets; high motion needs the
+    better motion search of slower presets to stay clean at a modest bitrate.
+    """
+    if complexity < 0.25:
+        return "superfast"
+    if complexity < 0.6:
+        return "veryfast"
+    return "faster"
+
+
+def recommend_bitrate_kbps(width, height, fps, complexity):
+    """Lowest bitrate step that gives the content enough bits per pixel"""
+    bits_per_pixel = MIN_BITS_PER_PIXEL + (MAX_BITS_PER_PIXEL - MIN_BITS_PER_PIXEL) * complexity
+    needed = width * height * (fps or 30) * bits_per_pixel / 1000
+    for step in BITRATE_STEPS:
+        if step >= needed:
+            return step
+    return BITRATE_STEPS[-1]
+
+
+def recommend_encoding(scores, fps=None):
+    """Recommend a bitrate/preset pair for each output resolution"""
+    fps = min(fps or 30, 60)
+    preset = recommend_preset(scores['complexity'])
+    return {
+        name: {
+            'bitrate': f"{recommend_bitrate_kbps(width, height, fps, scores['complexity'])}k",
+            'preset': preset
+        }
+        for name, (width, height) in RECOMMENDATION_SIZES.items()
+    }
+
+
+def analyze_content(video_path, use_cache=True):
+    """Score a video's motion and spatial complexity and recommend encoder settings
+
+    Only a few short segments are decoded, at low resolution and frame rate. Results are
+    cached by content hash, so renamed or re-uploaded copies of a file are not analysed
+    again.
+    """
+    content_hash = get_content_hash(video_path)
+    cache_path = os.path.join(CACHE_DIR, f"{content_hash}.json")
+    if use_cache and os.path.exists(cache_path):
+        with open(cache_path) as f:
+            return json.load(f)
+
+    info = get_video_info(video_path) or {}
+    ydif, entropy = [], []
+    offsets = sample_offsets(info.get('duration'))
+    for offset in offsets:
+        segment_ydif, segment_entropy = analyze_segment(video_path, offset)
+        ydif += segment_ydif
+        entropy += segment_entropy
+
+    if not ydif and not entropy:
+        return None
+
+    scores = score_content(ydif, entropy)
+    result = {
+        'content_hash': content_hash,
+        'scores': scores,
+        'sampled_seconds': len(offsets) * SEGMENT_SECONDS,
+        'width': info.get('width'),
+        'height': info.get('height'),
+        'fps': info.get('fps'),
+        'recommendations': recommend_encoding(scores, info.get('fps'))
+    }
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(cache_path, "w") as f:
+        json.dump(result, f, indent=2)
+    return result
+
+
+def get_recommendation_key(width, height, is_shorts=False):
+    """Return the recommendation that matches an output geometry"""
+    if is_shorts:
+        return "shorts"
+    if (height or 0) >= 1000:
+        return "1080p"
+    if (height or 0) >= 700:
+        return "720p"
+    return "480p"
@@ -9,34 +9,76 @@ from PIL import Image
 import io
 import base64
 
+from filtergraph import FIT_MODES, DEFAULT_FIT_MODE
+from renditions import RENDITION_FORMATS
+from analysis import load_sessions, analyze_sessions, summarize_sessions
+from admission import ADMISSION_POLICIES, DEFAULT_POLICY, get_admission_controller
+from complexity import analyze_content, get_recommendation_key, BITRATE_STEPS
+from logstore import list_streams, search_logs
+from looping import get_loop_preparer, load_loop_asset
+from mediaio import get_tmpfs_stager
+from loudness import get_loudness_analyzer, get_normalization_filter, load_loudness
+from pacing import PACING_MODES, DEFAULT_PACING
+from dvr import DVR_DIR, DVR_MAX_AGE_HOURS, DVR_MAX_BYTES, DEFAULT_SEGMENT_SECONDS, get_archive_stats
+from events import ACTIVE_STATES
+from preview import PREVIEW_CLIP_SECONDS, get_latest_clip
+from profiler import get_render_profiler
+from reconciler import STREAMS_DIR, get_reconciler, write_definition
+from overlays import OVERLAY_DIR, OVERLAY_POSITIONS, DEFAULT_CLOCK_FORMAT
+from styles import minify_html
+
+# Static chrome markup, minified once at import
+HEADER_HTML = minify_html("""
+<div class="header">
+    <div class="logo-container">
+        <div class="logo-icon">🎬</div>
+        <div class="logo-text">StreamHub<span class="highlight">Pro</span></div>
+    </div>
+    <div class="theme-toggle" onclick="toggleTheme()">
+        <span id="theme-icon">🌙</span>
+    </div>
+</div>
+""")
+
+SIDEBAR_HEADER_HTML = minify_html("""
+<div class="sidebar-header">
+    <div class="sidebar-title">Navigation</div>
+</div>
+""")
+
+APP_INFO_HTML = minify_html("""
+<div class="app-info">
+    <div class="info-title">About StreamHub Pro</div>
+    <div class="info-text">
+        A professional YouTube streaming solution designed for content creators.
+    </div>
+    <div class="app-version">Version 1.0.0</div>
+</div>
+""")
+
+FOOTER_HTML = minify_html("""
+<div class="footer">
+    <div class="footer-content">
+        <div class="footer-text">
+            StreamHub Pro © 2025 | Created with ❤️
+        </div>
+        <div class="footer-links">
+            <a href="#" class="footer-link">Documentation</a>
+            <a href="#" class="footer-link">Support</a>
+            <a href="#" class="footer-link">Updates</a>
+        </div>
+    </div>
+</div>
+""")
+
 def render_header():
     """Render application header with logo and title"""
-    st.markdown(
-        """
-        <div class="header">
-            <div class="logo-container">
-                <div class="logo-icon">🎬</div>
-                <div class="logo-text">StreamHub<span class="highlight">Pro</span></div>
-            </div>
-            <div class="theme-toggle" onclick="toggleTheme()">
-                <span id="theme-icon">🌙</span>
-            </div>
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
+    st.markdown(HEADER_HTML, unsafe_allow_html=True)
 
 def render_sidebar():
     """Render sidebar with navigation and user options"""
     with st.sidebar:
-        st.markdown(
-            """
-            <div class="sidebar-header">
-                <div class="sidebar-title">Navigation</div>
-            </div>
-            """, 
-            unsafe_allow_html=True
-        )
+        st.markdown(SIDEBAR_HEADER_HTML, unsafe_allow_html=True)
         
         # Navigation buttons with active state
         nav_items = ["Stream", "Analytics"]
@@ -52,76 +94,136 @@ def render_sidebar():
                 type="primary" if st.session_state.selected_tab == item else "secondary"
             ):
                 st.session_state.selected_tab = item
-                st.experimental_rerun()
+                st.rerun()
         
         st.markdown("<div class='sidebar-divider'></div>", unsafe_allow_html=True)
         
-        # Stream status indicator
-        status = "🟢 Active" if st.session_state.get('streaming', False) else "⚪ Inactive"
-        st.markdown(
-            f"""
-            <div class="status-indicator">
-                <div class="status-label">Stream Status:</div>
-                <div class="status-value {'status-active' if st.session_state.get('streaming', False) else ''}">
-                    {status}
-                </div>
-            </div>
-            """,
-            unsafe_allow_html=True
+        # Stream status and duration, refreshed on their own without a full rerun
+        live_fragment(render_sidebar_status)()
+        
+        refresh_options = {1: "Every second", 2: "Every 2 seconds", 5: "Every 5 seconds", 10: "Every 10 seconds"}
+        st.session_state.status_refresh = st.selectbox(
+            "Status Refresh",
+            options=list(refresh_options.keys()),
+            index=list(refresh_options.keys()).index(st.session_state.get('status_refresh', 2)),
+            format_func=lambda x: refresh_options[x],
+            help="How often live status and metrics update; timers tick in the browser"
         )
         
-        # Stream duration if active
-        if st.session_state.get('streaming', False) and 'stream_manager' in st.session_state:
-            duration = st.session_state.stream_manager.get_stream_duration()
-            hours, remainder = divmod(duration, 3600)
-            minutes, seconds = divmod(remainder, 60)
-            duration_str = f"{hours:02}:{minutes:02}:{seconds:02}"
-            
-            st.markdown(
-                f"""
-                <div class="duration-indicator">
-                    <div class="duration-label">Duration:</div>
-                    <div class="duration-value">{duration_str}</div>
-                </div>
-                """,
-                unsafe_allow_html=True
-            )
+        st.markdown("<div class='sidebar-divider'></div>", unsafe_allow_html=True)
+        
+        render_capacity_planner()
+        
+        st.markdown("<div class='sidebar-divider'></div>", unsafe_allow_html=True)
+        
+        render_definitions()
+        
+        st.markdown("<div class='sidebar-divider'></div>", unsafe_allow_html=True)
+        
+        render_profiler_panel()
         
         st.markdown("<div class='sidebar-divider'></div>", unsafe_allow_html=True)
         
         # App info section
-        st.markdown(
-            """
-            <div class="app-info">
-                <div class="info-title">About StreamHub Pro</div>
-                <div class="info-text">
-                    A professional YouTube streaming solution designed for content creators.
-                </div>
-                <div class="app-version">Version 1.0.0</div>
-            </div>
-            """,
-            unsafe_allow_html=True
+        st.markdown(APP_INFO_HTML, unsafe_allow_html=True)
+
+def render_capacity_planner():
+    """Render encode capacity, the headroom setting and predicted versus actual stream cost"""
+    controller = get_admission_controller()
+    controller.headroom = st.slider(
+        "CPU Headroom",
+        min_value=0.0,
+        max_value=0.5,
+        value=controller.headroom,
+        step=0.05,
+        format="%.2f",
+        help="Share of CPU cores never committed to streams"
+    )
+    
+    status = controller.get_status()
+    st.caption(
+        f"Capacity: {status['committed_cores']:.1f} of {status['capacity_cores']:.1f} cores committed"
+        + (f", {status['queued']} waiting" if status['queued'] else "")
+    )
+    
+    history = controller.model.get_history()
+    if history:
+        with st.expander("Predicted vs Actual Cost"):
+            df = pd.DataFrame(history)
+            df['time'] = pd.to_datetime(df['timestamp'], unit='s')
+            st.dataframe(
+                df[['time', 'name', 'preset', 'predicted_cores', 'actual_cores']].iloc[::-1],
+                hide_index=True,
+                use_container_width=True
+            )
+
+def render_definitions():
+    """Render the switch for running streams from definition files, and their status"""
+    reconciler = get_reconciler()
+    enabled = st.toggle(
+        "Stream Definitions",
+        value=reconciler.running,
+        help=f"Start, stop and restart streams to match the definition files in {STREAMS_DIR}/"
+    )
+    if enabled and not reconciler.running:
+        reconciler.start()
+    elif not enabled and reconciler.running:
+        reconciler.stop()
+    
+    status = reconciler.get_status()
+    if reconciler.running:
+        running = sum(1 for s in status.values() if s['state'] in ACTIVE_STATES)
+        st.caption(f"{running} of {len(status)} defined streams running")
+    if status:
+        with st.expander("Defined Streams"):
+            df = pd.DataFrame.from_dict(status, orient='index')
+            st.dataframe(df[['state', 'failures', 'retry_in', 'error']], use_container_width=True)
+
+def render_profiler_panel():
+    """Render rerun timings per render function and the one-rerun cProfile capture"""
+    profiler = get_render_profiler()
+    with st.expander("🛠️ Render Profiler"):
+        st.toggle(
+            "Time Render Functions",
+            value=profiler.enabled,
+            key="render_profiler_enabled",
+            # Applied before the rerun the toggle triggers, so that rerun is already timed
+            on_change=lambda: setattr(profiler, 'enabled', st.session_state.render_profiler_enabled),
+            help="Times every render function, the CSS injection and the dependency check on each rerun, for all sessions"
         )
+        
+        stats = profiler.get_section_stats()
+        if stats:
+            st.dataframe(pd.DataFrame(stats), hide_index=True, use_container_width=True)
+            slowest = pd.DataFrame(profiler.get_slowest_reruns())
+            slowest['timestamp'] = pd.to_datetime(slowest['timestamp'], unit='s')
+            st.markdown("**Slowest Reruns**")
+            st.dataframe(slowest, hide_index=True, use_container_width=True)
+            if st.button("Clear Timings", use_container_width=True):
+                profiler.clear()
+        elif profiler.enabled:
+            st.caption("Timings appear after the next rerun")
+        
+        if st.button("Profile Next Rerun", use_container_width=True, help="Run the next rerun of this session under cProfile"):
+            st.session_state.profile_next_rerun = True
+            st.rerun()
+        
+        capture = st.session_state.get('profile_capture')
+        if capture and capture.get('error'):
+            st.warning(f"Profile not captured: {capture['error']}")
+        elif capture:
+            st.download_button(
+                "Download Profile (.prof)",
+                data=capture['stats'],
+                file_name=f"rerun-{int(capture['timestamp'])}.prof",
+                mime="application/octet-stream",
+                use_container_width=True
+            )
+            st.code(capture['summary'], language=None)
 
 def render_footer():
     """Render application footer with credits and links"""
-    st.markdown(
-        """
-        <div class="footer">
-            <div class="footer-content">
-                <div class="footer-text">
-                    StreamHub Pro © 2025 | Created with ❤️
-                </div>
-                <div class="footer-links">
-                    <a href="#" class="footer-link">Documentation</a>
-                    <a href="#" class="footer-link">Support</a>
-                    <a href="#" class="footer-link">Updates</a>
-                </div>
-            </div>
-        </div>
-        """,
-        unsafe_allow_html=True
-    )
+    st.markdown(FOOTER_HTML, unsafe_allow_html=True)
 
 def render_upload_section():
     """Render video upload and selection section"""
@@ -151,6 +253,7 @@ def render_upload_section():
                 
                 if selected_video:
                     st.session_state.video_path = selected_video
+                    get_loudness_analyzer().analyze(selected_video)
                     
                     # Display video info 
                     col1, col2 = st.columns([1, 1])
@@ -181,11 +284,51 @@ def render_upload_section():
                     f.write(uploaded_file.getbuffer())
                 
                 st.session_state.video_path = file_path
+                get_loudness_analyzer().analyze(file_path)
                 st.success(f"Video uploaded successfully: {uploaded_file.name}")
                 
                 # Show preview
                 st.video(file_path, start_time=0)
 
+def render_loudness(video_path):
+    """Render the measured loudness of a file and the gain it will get"""
+    measurement = load_loudness(video_path)
+    if measurement:
+        st.caption(
+            f"{measurement['integrated_lufs']:.1f} LUFS, {measurement['true_peak_dbtp']:.1f} dBTP peak, "
+            f"{measurement['lra_lu']:.1f} LU range → {get_normalization_filter(video_path) or 'no change'}"
+        )
+    elif get_loudness_analyzer().get_state(video_path) == "failed":
+        st.caption("Loudness could not be measured (no audio?); audio is streamed unchanged")
+    else:
+        st.caption("Measuring loudness in the background...")
+
+def build_stream_config():
+    """Gather the stream config from the settings widgets"""
+    return {
+        'is_shorts': st.session_state.is_shorts,
+        'quality_preset': st.session_state.quality_preset,
+        'bitrate': st.session_state.bitrate,
+        'audio_bitrate': st.session_state.audio_bitrate,
+        'stream_class': st.session_state.stream_class,
+        'latency_mode': st.session_state.latency_mode,
+        'encoding_profile': st.session_state.encoding_profile,
+        'max_fps': st.session_state.max_fps,
+        'fit_mode': st.session_state.get('fit_mode', DEFAULT_FIT_MODE),
+        'renditions': st.session_state.renditions,
+        'prewarm': st.session_state.get('prewarm', False),
+        'prewarm_lead': st.session_state.get('prewarm_lead', 15),
+        'hot_swap': st.session_state.get('hot_swap', False),
+        'overlays': st.session_state.overlays,
+        'stage_tmpfs': st.session_state.get('stage_tmpfs', False),
+        'seamless_loop': st.session_state.get('seamless_loop', False),
+        'normalize_audio': st.session_state.get('normalize_audio', False),
+        'dvr': st.session_state.get('dvr', False),
+        'preview': st.session_state.get('preview', False),
+        'pacing': st.session_state.get('pacing', DEFAULT_PACING),
+        'admission_policy': st.session_state.get('admission_policy', DEFAULT_POLICY)
+    }
+
 def render_stream_config():
     """Render stream configuration options"""
     with st.expander("⚙️ Stream Configuration", expanded=True):
@@ -223,6 +366,17 @@ def render_stream_config():
             )
             st.session_state.is_shorts = is_shorts
             
+            if is_shorts:
+                fit_mode = st.radio(
+                    "Shorts Framing",
+                    options=list(FIT_MODES.keys()),
+                    index=list(FIT_MODES.keys()).index(st.session_state.get('fit_mode', DEFAULT_FIT_MODE)),
+                    format_func=lambda x: FIT_MODES[x],
+                    horizontal=True,
+                    help="How landscape footage is fitted into the vertical frame"
+                )
+                st.session_state.fit_mode = fit_mode
+            
             quality_options = {
                 "ultrafast": "Lowest Quality / Fastest",
                 "superfast": "Lower Quality / Fast",
@@ -241,10 +395,150 @@ def render_stream_config():
             
             bitrate = st.select_slider(
                 "Video Bitrate",
-                options=["1000k", "1500k", "2000k", "2500k", "3000k", "3500k", "4000k"],
+                options=[f"{step}k" for step in BITRATE_STEPS],
                 value=st.session_state.get('bitrate', '2500k')
             )
             st.session_state.bitrate = bitrate
+            
+            # Sample the source and suggest the cheapest bitrate/preset that holds up
+            if st.session_state.get('video_path') and st.button("🔍 Analyze Content", use_container_width=True):
+                with st.spinner("Sampling video segments..."):
+                    st.session_state.content_analysis = (
+                        st.session_state.video_path, analyze_content(st.session_state.video_path)
+                    )
+            
+            analyzed_path, analysis = st.session_state.get('content_analysis', (None, None))
+            if analysis and analyzed_path == st.session_state.get('video_path'):
+                key = get_recommendation_key(analysis['width'], analysis['height'], is_shorts)
+                recommendation = analysis['recommendations'][key]
+                scores = analysis['scores']
+                st.caption(
+                    f"Motion {scores['motion']:.2f}, detail {scores['spatial']:.2f}: "
+                    f"{recommendation['bitrate']} with {recommendation['preset']} suggested for {key}"
+                )
+                if st.button("Apply Recommendation", use_container_width=True):
+                    st.session_state.bitrate = recommendation['bitrate']
+                    st.session_state.quality_preset = recommendation['preset']
+                    st.rerun()
+            
+            profile_options = {
+                "normal": "Normal (2s Keyframes)",
+                "low_latency": "Low Latency (1s Keyframes, Zero-Latency CBR)"
+            }
+            
+            encoding_profile = st.selectbox(
+                "Encoding Profile",
+                options=list(profile_options.keys()),
+                index=list(profile_options.keys()).index(st.session_state.get('encoding_profile', 'normal')),
+                format_func=lambda x: profile_options[x],
+                help="Low latency trades some quality for a shorter delay to viewers"
+            )
+            st.session_state.encoding_profile = encoding_profile
+            
+            fps_options = {None: "Source", 60: "60 fps", 30: "30 fps", 24: "24 fps"}
+            
+            max_fps = st.selectbox(
+                "Max Frame Rate",
+                options=list(fps_options.keys()),
+                index=list(fps_options.keys()).index(st.session_state.get('max_fps')),
+                format_func=lambda x: fps_options[x],
+                help="Cap the output frame rate; sources below the cap are unchanged"
+            )
+            st.session_state.max_fps = max_fps
+            
+            pacing = st.selectbox(
+                "Input Pacing",
+                options=list(PACING_MODES.keys()),
+                index=list(PACING_MODES.keys()).index(st.session_state.get('pacing', DEFAULT_PACING)),
+                format_func=lambda x: PACING_MODES[x],
+                help="Read rate pacing catches up gradually after a stall instead of bursting (needs a recent FFmpeg)"
+            )
+            st.session_state.pacing = pacing
+            
+            latency_mode = st.toggle(
+                "Latency Test Mode (Local Ingest)",
+                value=st.session_state.get('latency_mode', False),
+                help="Stream to a local ingest stand-in and measure click-to-first-packet and pipeline delay"
+            )
+            st.session_state.latency_mode = latency_mode
+            
+            hot_swap = st.toggle(
+                "Live Source Switching",
+                value=st.session_state.get('hot_swap', False),
+                help="Keep the YouTube connection open while switching to another video mid-stream"
+            )
+            st.session_state.hot_swap = hot_swap
+            
+            # Input I/O: keep looping sources in memory so storage stalls don't reach the encoder
+            stage_tmpfs = st.toggle(
+                "Stage Input in Memory",
+                value=st.session_state.get('stage_tmpfs', False),
+                help="Copy the video to tmpfs (shared, within a memory budget) in the background; "
+                     "streams started before the copy is ready read from disk"
+            )
+            st.session_state.stage_tmpfs = stage_tmpfs
+            
+            if stage_tmpfs and st.session_state.get('video_path'):
+                stager = get_tmpfs_stager()
+                stage_state = stager.get_state(st.session_state.video_path)
+                if stage_state is None:
+                    stager.stage_in_background(st.session_state.video_path)
+                    stage_state = "copying"
+                if stage_state == "staged":
+                    st.caption("Input staged in memory")
+                elif stage_state == "failed":
+                    st.caption("Input does not fit the memory budget; it will be read from disk")
+                else:
+                    st.caption("Copying input to memory...")
+            
+            # Loop a prepared copy so every wrap is keyframe-aligned with continuous timestamps
+            seamless_loop = st.toggle(
+                "Seamless Loop",
+                value=st.session_state.get('seamless_loop', False),
+                disabled=hot_swap,
+                help="Prepare (once per file) a copy whose loop point lands on a keyframe with matching audio and video length"
+            )
+            st.session_state.seamless_loop = seamless_loop
+            
+            if seamless_loop and st.session_state.get('video_path'):
+                preparer = get_loop_preparer()
+                preparer.prepare(st.session_state.video_path)
+                loop_state = preparer.get_state(st.session_state.video_path)
+                if loop_state == "ready":
+                    loop_asset = load_loop_asset(st.session_state.video_path)
+                    st.caption(
+                        f"Loop ready: {loop_asset['duration']:.2f}s, {loop_asset['trimmed_seconds']:.2f}s trimmed "
+                        "so audio and video end together"
+                    )
+                elif loop_state == "failed":
+                    st.caption("Loop preparation failed; the original file will loop")
+                else:
+                    st.caption("Preparing seamless loop in the background...")
+            
+            # Static gain from a loudness measurement taken once per file
+            normalize_audio = st.toggle(
+                "Normalize Loudness",
+                value=st.session_state.get('normalize_audio', False),
+                disabled=hot_swap,
+                help="Bring the audio to -14 LUFS with one fixed gain, limited so true peaks stay below -1 dBTP"
+            )
+            st.session_state.normalize_audio = normalize_audio
+            
+            if normalize_audio and st.session_state.get('video_path'):
+                render_loudness(st.session_state.video_path)
+            
+            # Tee the encoded stream into local segments; retention is shared by every recording
+            st.session_state.dvr = st.toggle(
+                "Record Locally (DVR)",
+                value=st.session_state.get('dvr', False),
+                help=f"Keep what is sent as {DEFAULT_SEGMENT_SECONDS}s segments in {DVR_DIR}/, "
+                     f"at most {DVR_MAX_AGE_HOURS} hours and {DVR_MAX_BYTES / 1024 ** 3:.0f} GB"
+            )
+            st.session_state.preview = st.toggle(
+                "Outgoing Preview",
+                value=st.session_state.get('preview', False),
+                help="Encode a small low-bitrate copy of the outgoing picture for the dashboard"
+            )
         
         with col2:
             # Schedule settings
@@ -275,6 +569,22 @@ def render_stream_config():
                 # Check if scheduled time is in the past
                 if scheduled_datetime < datetime.now():
                     st.warning("Scheduled time must be in the future")
+                
+                prewarm = st.toggle(
+                    "Pre-warm Encoder",
+                    value=st.session_state.get('prewarm', False),
+                    help="Start the input and encoder ahead of time so publishing begins exactly on schedule"
+                )
+                st.session_state.prewarm = prewarm
+                
+                if prewarm:
+                    prewarm_lead = st.slider(
+                        "Pre-warm Lead Time (seconds)",
+                        min_value=5,
+                        max_value=120,
+                        value=st.session_state.get('prewarm_lead', 15)
+                    )
+                    st.session_state.prewarm_lead = prewarm_lead
             
             # Audio settings
             st.markdown("##### Audio Settings")
@@ -285,10 +595,112 @@ def render_stream_config():
                 value=st.session_state.get('audio_bitrate', '128k')
             )
             st.session_state.audio_bitrate = audio_bitrate
+            
+            # CPU scheduling class for the encoder process
+            st.markdown("##### Resource Priority")
+            
+            class_options = {
+                "priority": "Priority (Full CPU Share)",
+                "standard": "Standard (Recommended)",
+                "background": "Background (Yields to Others)"
+            }
+            
+            stream_class = st.selectbox(
+                "Stream Class",
+                options=list(class_options.keys()),
+                index=list(class_options.keys()).index(st.session_state.get('stream_class', 'standard')),
+                format_func=lambda x: class_options[x],
+                help="Controls CPU and disk priority when several streams share this host"
+            )
+            st.session_state.stream_class = stream_class
+            
+            admission_policy = st.selectbox(
+                "When the Host Is Full",
+                options=list(ADMISSION_POLICIES.keys()),
+                index=list(ADMISSION_POLICIES.keys()).index(st.session_state.get('admission_policy', DEFAULT_POLICY)),
+                format_func=lambda x: ADMISSION_POLICIES[x],
+                help="What happens when the predicted encode cost does not fit the free CPU capacity"
+            )
+            st.session_state.admission_policy = admission_policy
+        
+        # Extra renditions encoded from the same decode
+        st.markdown("##### Additional Renditions")
+        st.caption("Each row is encoded from the same decoded source and sent to its own stream key")
+        
+        renditions_df = st.data_editor(
+            pd.DataFrame(
+                st.session_state.get('renditions', []),
+                columns=["name", "format", "bitrate", "stream_key"]
+            ),
+            num_rows="dynamic",
+            use_container_width=True,
+            column_config={
+                "name": st.column_config.TextColumn("Name"),
+                "format": st.column_config.SelectboxColumn(
+                    "Format", options=list(RENDITION_FORMATS.keys()), default="720p"
+                ),
+                "bitrate": st.column_config.SelectboxColumn(
+                    "Bitrate", options=["1000k", "1500k", "2000k", "2500k", "3000k", "3500k", "4000k"],
+                    default="2500k"
+                ),
+                "stream_key": st.column_config.TextColumn("Stream Key")
+            },
+            key="renditions_editor"
+        )
+        # Drop empty cells and rows without a destination
+        st.session_state.renditions = [
+            {k: v for k, v in r.items() if pd.notna(v) and v != ""}
+            for r in renditions_df.to_dict("records")
+            if pd.notna(r.get("stream_key")) and r.get("stream_key")
+        ]
+        
+        # Logo, title and clock layers, rendered once and blended by the encoder
+        st.markdown("##### Overlays")
+        
+        overlays = []
+        col1, col2, col3 = st.columns(3)
+        position_options = list(OVERLAY_POSITIONS.keys())
+        
+        with col1:
+            logo_file = st.file_uploader("Logo", type=['png'], help="PNG with transparency works best")
+            if logo_file:
+                os.makedirs(OVERLAY_DIR, exist_ok=True)
+                logo_path = os.path.join(OVERLAY_DIR, f"logo_{logo_file.name}")
+                with open(logo_path, "wb") as f:
+                    f.write(logo_file.getbuffer())
+                st.session_state.overlay_logo = logo_path
+            if st.session_state.get('overlay_logo'):
+                logo_position = st.selectbox("Logo Position", position_options, index=1)
+                overlays.append({
+                    'type': "logo", 'path': st.session_state.overlay_logo, 'position': logo_position
+                })
+        
+        with col2:
+            title = st.text_input("Title", value=st.session_state.get('overlay_title', ""))
+            st.session_state.overlay_title = title
+            if title:
+                title_position = st.selectbox("Title Position", position_options, index=2)
+                overlays.append({'type': "title", 'text': title, 'position': title_position})
+        
+        with col3:
+            show_clock = st.toggle("Clock", value=st.session_state.get('overlay_clock', False))
+            st.session_state.overlay_clock = show_clock
+            if show_clock:
+                clock_position = st.selectbox("Clock Position", position_options, index=3)
+                overlays.append({
+                    'type': "clock", 'format': DEFAULT_CLOCK_FORMAT, 'position': clock_position
+                })
+        
+        st.session_state.overlays = overlays
         
         # Control buttons
         st.markdown("<div class='control-buttons'>", unsafe_allow_html=True)
         
+        # The engine's lifecycle snapshot is the only source of truth for whether we are live
+        manager = st.session_state.stream_manager
+        streaming = manager.get_status().is_streaming
+        queued = manager.get_status().state == "queued"
+        
         col1, col2 = st.columns(2)
         
         with col1:
@@ -296,53 +708,256 @@ def render_stream_config():
                 "▶️ Start Streaming", 
                 type="primary",
                 use_container_width=True,
-                disabled=st.session_state.get('streaming', False)
+                disabled=streaming or queued
             ):
                 if not hasattr(st.session_state, 'video_path') or not st.session_state.video_path:
                     st.error("Please select or upload a video first")
-                elif not stream_key:
+                elif not stream_key and not st.session_state.latency_mode:
                     st.error("Please enter your YouTube stream key")
                 else:
                     # Gather configuration
-                    config = {
-                        'is_shorts': st.session_state.is_shorts,
-                        'quality_preset': st.session_state.quality_preset,
-                        'bitrate': st.session_state.bitrate,
-                        'audio_bitrate': st.session_state.audio_bitrate
-                    }
+                    config = build_stream_config()
                     
                     if st.session_state.get('use_schedule', False) and scheduled_datetime > datetime.now():
                         # Schedule stream
-                        success = st.session_state.stream_manager.schedule_stream(scheduled_datetime)
+                        success = st.session_state.stream_manager.schedule_stream(
+                            scheduled_datetime,
+                            st.session_state.video_path,
+                            stream_key or "latency-test",
+                            config
+                        )
                         if success:
                             st.success(f"Stream scheduled for {scheduled_datetime.strftime('%Y-%m-%d %H:%M:%S')}")
                     else:
                         # Start stream immediately
                         success = st.session_state.stream_manager.start_streaming(
                             st.session_state.video_path, 
-                            stream_key,
+                            stream_key or "latency-test",
                             config
                         )
                         if success:
-                            st.session_state.streaming = True
                             st.success("Streaming started!")
-                            st.experimental_rerun()
+                            st.rerun()
+                        elif manager.get_status().state == "failed":
+                            st.error(f"Stream not started: {manager.get_status().detail}")
         
         with col2:
             if st.button(
                 "⏹️ Stop Streaming", 
                 type="secondary",
                 use_container_width=True,
-                disabled=not st.session_state.get('streaming', False)
+                disabled=not (streaming or queued)
             ):
                 success = st.session_state.stream_manager.stop_streaming()
                 if success:
-                    st.session_state.streaming = False
                     st.warning("Streaming stopped")
-                    st.experimental_rerun()
+                    st.rerun()
+        
+        # Hand the current settings to the definitions reconciler
+        st.markdown("##### 💾 Save as Stream Definition")
+        definition_name = st.text_input(
+            "Definition Name",
+            help=f"Saved as {STREAMS_DIR}/<name>.json; with Stream Definitions on, the stream starts from it"
+        )
+        if st.button("Save Definition", disabled=not definition_name):
+            if not st.session_state.get('video_path') or not stream_key:
+                st.error("A definition needs a video and a stream key")
+            else:
+                path = write_definition(definition_name, st.session_state.video_path, stream_key, build_stream_config())
+                st.success(f"Saved {path}")
+        
+        # Offer a live switch when the selected video differs from the one on air
+        if (
+            streaming
+            and manager.switchable_input
+            and st.session_state.get('video_path')
+            and st.session_state.video_path != manager.video_path
+        ):
+            if st.button("🔀 Switch Live Source", use_container_width=True):
+                if manager.swap_source(st.session_state.video_path):
+                    st.success("Switching source; the slate covers the gap until the new video is ready")
         
         st.markdown("</div>", unsafe_allow_html=True)
 
+# Sidebar label for each lifecycle state
+STATE_LABELS = {
+    "idle": "⚪ Inactive",
+    "scheduled": "🕒 Scheduled",
+    "queued": "⏳ Waiting for Capacity",
+    "starting": "🟡 Starting",
+    "live": "🟢 Active",
+    "degraded": "🟠 Degraded",
+    "reconnecting": "🟡 Reconnecting",
+    "stopped": "⚪ Stopped",
+    "failed": "🔴 Failed"
+}
+
+def live_fragment(func):
+    """Wrap a status renderer in a fragment that reruns on its own at the configured interval"""
+    return st.fragment(run_every=st.session_state.get('status_refresh', 2))(func)
+
+def format_duration(seconds):
+    """Format seconds as HH:MM:SS"""
+    hours, remainder = divmod(max(0, int(seconds)), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours:02}:{minutes:02}:{seconds:02}"
+
+def render_live_timer(label, target, countdown=False, height=90):
+    """Render an HH:MM:SS timer that ticks in the browser towards or from an epoch timestamp
+
+    The markup only depends on the target, so refreshes leave the running timer alone.
+    """
+    color = "#4cc9f0" if st.session_state.get('theme', "dark") == "dark" else "#4361ee"
+    components.html(
+        f"""
+        <div style="font-family: sans-serif; text-align: center; color: {color};">
+            <div style="font-size: 0.85rem; opacity: 0.8;">{label}</div>
+            <div id="timer" style="font-size: 2rem; font-weight: 700; font-family: monospace;">--:--:--</div>
+        </div>
+        <script>
+            const target = {int(target * 1000)};
+            const pad = (n) => String(n).padStart(2, "0");
+            function tick() {{
+                const ms = {"target - Date.now()" if countdown else "Date.now() - target"};
+                const s = Math.max(0, Math.floor(ms / 1000));
+                document.getElementById("timer").textContent =
+                    pad(Math.floor(s / 3600)) + ":" + pad(Math.floor(s % 3600 / 60)) + ":" + pad(s % 60);
+            }}
+            tick();
+            setInterval(tick, 1000);
+        </script>
+        """,
+        height=height
+    )
+
+def render_sidebar_status():
+    """Render the sidebar stream status and duration from a status snapshot"""
+    status = st.session_state.stream_manager.get_status()
+    label = STATE_LABELS.get(status.state, "⚪ Inactive")
+    st.markdown(
+        f"""
+        <div class="status-indicator">
+            <div class="status-label">Stream Status:</div>
+            <div class="status-value {'status-active' if status.is_streaming else ''}">
+                {label}
+            </div>
+        </div>
+        """,
+        unsafe_allow_html=True
+    )
+    
+    if status.is_streaming and status.start_time:
+        st.markdown(
+            f"""
+            <div class="duration-indicator">
+                <div class="duration-label">Duration:</div>
+                <div class="duration-value">{format_duration((datetime.now() - status.start_time).total_seconds())}</div>
+            </div>
+            """,
+            unsafe_allow_html=True
+        )
+
+def render_live_status():
+    """Render stream status, timers and encoder metrics from a status snapshot"""
+    status = st.session_state.stream_manager.get_status()
+    
+    if status.state == "degraded":
+        st.warning(f"Stream degraded: {status.detail}")
+    
+    if status.is_streaming:
+        st.progress(min(status.encoder.get('speed', 0), 1.0), f"Stream Active: {status.video_name}")
+        
+        # The timer ticks in the browser, so it stays current between refreshes
+        if status.start_time:
+            render_live_timer("Stream Duration", status.start_time.timestamp())
+        
+        # Encoder speed and resource usage of the ffmpeg process
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Speed", f"{status.encoder.get('speed', 0):.2f}x")
+        col2.metric("CPU", f"{status.resources.get('cpu_percent', 0):.0f}%")
+        col3.metric("Memory", f"{status.resources.get('rss_bytes', 0)/1024/1024:.0f} MB")
+        
+        io_total = status.input_io['disk_read_bytes'] + status.input_io['cache_read_bytes']
+        if io_total:
+            st.caption(
+                f"Input reads: {status.input_io['disk_read_bytes']/1024/1024:.0f} MB from disk, "
+                f"{status.input_io['cache_read_bytes']/1024/1024:.0f} MB from cache "
+                f"({status.input_io['cache_read_bytes'] / io_total:.0%} cache hits)"
+            )
+        
+        if status.overlays and status.overlays['avg_render_ms'] is not None:
+            st.caption(
+                f"Overlays: {status.overlays['blended_pixels_per_frame']:,} px blended per frame, "
+                f"{status.overlays['renders']} renders at {status.overlays['avg_render_ms']:.1f} ms avg"
+            )
+        
+        if status.pacing:
+            render_pacing(status.pacing)
+        
+        if status.loop_seams:
+            seams = status.loop_seams
+            ratio = f"{seams['max_bitrate_ratio']:.1f}x" if seams['max_bitrate_ratio'] is not None else "n/a"
+            if seams['mean_bitrate_ratio'] is not None:
+                ratio += f" (mean {seams['mean_bitrate_ratio']:.1f}x)"
+            st.caption(
+                f"Loop seams: {seams['seams']} so far, worst bitrate spike {ratio}, "
+                f"{seams['dropped']} frames dropped, {seams['warnings']} timestamp warnings"
+            )
+    elif status.scheduled_time and status.scheduled_time > datetime.now():
+        render_live_timer("Stream starts in", status.scheduled_time.timestamp(), countdown=True)
+    elif status.state == "failed":
+        st.error(f"Stream failed: {status.detail or 'unknown error'}")
+    else:
+        st.info("Stream is not active. Click 'Start Streaming' to begin.")
+
+def render_output_preview():
+    """Render the latest preview clip of the outgoing stream and the local archive size"""
+    manager = st.session_state.stream_manager
+    if not manager.get_status().is_streaming:
+        return
+    
+    if manager.preview_dir:
+        # Shown inside the status expander, which cannot hold another expander
+        st.markdown("##### 📡 Outgoing Preview")
+        clip = get_latest_clip(manager.preview_dir)
+        if clip:
+            with open(clip, "rb") as f:
+                st.video(f.read(), format="video/mp4")
+            st.caption(f"A {PREVIEW_CLIP_SECONDS}s clip of what was just sent")
+            # Clicking reruns the page, which picks up the newest clip
+            st.button("🔄 Newest Clip", key="preview_refresh")
+        else:
+            st.caption("Waiting for the first preview clip...")
+    
+    if manager.dvr_dir:
+        archive = get_archive_stats()
+        if archive['segments']:
+            st.caption(
+                f"Recording to {manager.dvr_dir}; archive holds {archive['segments']} segments, "
+                f"{archive['bytes'] / 1024 ** 3:.2f} GB since {archive['oldest']:%Y-%m-%d %H:%M}"
+            )
+
+def render_pacing(pacing):
+    """Render media time versus wall clock drift and the drift and jitter histograms"""
+    rate = pacing['drift_ms_per_minute']
+    jitter = pacing['jitter_p95_ms']
+    st.caption(
+        f"Pacing: drift {pacing['drift_ms']:+.0f} ms"
+        + (f" ({rate:+.0f} ms/min)" if rate is not None else "")
+        + (f", jitter p95 {jitter:.0f} ms" if jitter is not None else "")
+    )
+    # Drawn inside the status expander, which cannot hold another expander
+    with st.popover("Pacing Histograms"):
+        col1, col2 = st.columns(2)
+        for col, key, title in (
+            (col1, 'drift_histogram', "Drift (ms)"),
+            (col2, 'jitter_histogram', "Jitter per Interval (ms)")
+        ):
+            histogram = pacing[key]
+            fig = go.Figure(go.Bar(x=list(histogram.keys()), y=list(histogram.values()), marker_color='#4361ee'))
+            fig.update_layout(title=title, template='plotly_white', height=250, margin=dict(t=40, b=0))
+            col.plotly_chart(fig, use_container_width=True)
+
 def render_stream_logs():
     """Render streaming logs with real-time updates"""
     with st.expander("📊 Stream Status & Logs", expanded=True):
@@ -355,50 +970,16 @@ def render_stream_logs():
             unsafe_allow_html=True
         )
         
-        # Stream status visualization
-        if st.session_state.get('streaming', False):
-            # Create a progress bar that updates
-            progress_val = (time.time() % 10) / 10  # Cycles every 10 seconds
-            st.progress(progress_val, "Stream Active")
-            
-            # Display stream duration
-            if 'stream_manager' in st.session_state:
-                duration = st.session_state.stream_manager.get_stream_duration()
-                hours, remainder = divmod(duration, 3600)
-                minutes, seconds = divmod(remainder, 60)
-                duration_str = f"{hours:02}:{minutes:02}:{seconds:02}"
-                
-                st.markdown(
-                    f"""
-                    <div class="duration-display">
-                        <div class="duration-label">Stream Duration</div>
-                        <div class="duration-timer">{duration_str}</div>
-                    </div>
-                    """,
-                    unsafe_allow_html=True
-                )
-        else:
-            if st.session_state.stream_manager.scheduled_time:
-                # Display countdown to scheduled stream
-                now = datetime.now()
-                time_diff = (st.session_state.stream_manager.scheduled_time - now).total_seconds()
-                
-                if time_diff > 0:
-                    hours, remainder = divmod(int(time_diff), 3600)
-                    minutes, seconds = divmod(remainder, 60)
-                    countdown = f"{hours:02}:{minutes:02}:{seconds:02}"
-                    
-                    st.markdown(
-                        f"""
-                        <div class="countdown-display">
-                            <div class="countdown-label">Stream starts in</div>
-                            <div class="countdown-timer">{countdown}</div>
-                        </div>
-                        """,
-                        unsafe_allow_html=True
-                    )
-            else:
-                st.info("Stream is not active. Click 'Start Streaming' to begin.")
+        # Live status and metrics, refreshed on their own without a full rerun
+        live_fragment(render_live_status)()
+        
+        # What is actually being sent, outside the fragment so playback is not reset
+        render_output_preview()
+        
+        # Latency breakdown for the current or last latency test
+        latency = st.session_state.stream_manager.get_latency_report()
+        if latency:
+            render_latency_breakdown(latency)
         
         # Log display area with auto-scroll
         st.markdown("<div class='log-container'>", unsafe_allow_html=True)
@@ -429,7 +1010,54 @@ def render_stream_logs():
         # Add clear logs button
         if st.button("Clear Logs", key="clear_logs"):
             st.session_state.logs = []
-            st.experimental_rerun()
+            st.rerun()
+
+def render_log_archive():
+    """Render search over the persistent per-stream log archive"""
+    with st.expander("🗄️ Log Archive", expanded=False):
+        streams = list_streams()
+        if not streams:
+            st.info("No archived stream logs yet.")
+            return
+        
+        col1, col2 = st.columns(2)
+        with col1:
+            stream_id = st.selectbox("Stream", streams, help="Most recent stream first")
+            keyword = st.text_input("Keyword", help="Words are matched by prefix, e.g. 'conn' finds 'connection'")
+        with col2:
+            level = st.selectbox("Level", ["all", "error", "warning", "info", "debug"])
+            hours = st.slider("Last N Hours", min_value=1, max_value=168, value=24)
+        
+        records = search_logs(
+            stream_id,
+            start=time.time() - hours * 3600,
+            keyword=keyword or None,
+            level=None if level == "all" else level
+        )
+        if records:
+            df = pd.DataFrame(records)
+            df['time'] = pd.to_datetime(df['ts'], unit='s')
+            st.dataframe(df[['time', 'seq', 'level', 'message']], use_container_width=True, hide_index=True)
+        else:
+            st.text("No matching log records.")
+
+def render_latency_breakdown(report):
+    """Render the end-to-end latency breakdown of a latency test stream"""
+    st.markdown("##### Latency Breakdown")
+    
+    stages = [
+        ("Click → Spawn", 'click_to_spawn'),
+        ("Spawn → Transcode", 'spawn_to_transcode'),
+        ("Transcode → First Packet", 'transcode_to_first_packet'),
+        ("Click → First Packet", 'click_to_first_packet'),
+        ("Pipeline Delay p50", 'steady_state_p50'),
+        ("Pipeline Delay p95", 'steady_state_p95')
+    ]
+    
+    cols = st.columns(3)
+    for i, (label, key) in enumerate(stages):
+        value = report.get(key)
+        cols[i % 3].metric(label, f"{value * 1000:.0f} ms" if value is not None else "-")
 
 def render_analytics_dashboard():
     """Render analytics dashboard with visualizations"""
@@ -447,7 +1075,7 @@ def render_analytics_dashboard():
     data = st.session_state.analytics_data
     
     # Create tabs for different analytics sections
-    tab1, tab2, tab3 = st.tabs(["Overview", "Audience", "Performance"])
+    tab1, tab2, tab3, tab4 = st.tabs(["Overview", "Audience", "Performance", "Session History"])
     
     with tab1:
         # Key metrics row
@@ -668,6 +1296,71 @@ def render_analytics_dashboard():
         )
         
         st.plotly_chart(fig_quality, use_container_width=True)
+    
+    with tab4:
+        render_session_history()
+
+# Sessions analysed at once in the history view; the rest stay on disk
+MAX_ANALYZED_SESSIONS = 20
+
+def render_session_history():
+    """Render exported sessions, loading series only for the ones selected"""
+    col1, col2 = st.columns(2)
+    with col1:
+        start_date = st.date_input("From", value=datetime.now().date() - timedelta(days=7), key="history_from")
+    with col2:
+        end_date = st.date_input("To", value=datetime.now().date(), key="history_to")
+    
+    # Listing reads only each session's small metadata file
+    sessions = load_sessions(start_date, end_date)
+    if sessions.empty:
+        st.info("No exported sessions in this range yet")
+        return
+    
+    labels = {
+        row.stream_id: f"{row.started_at:%Y-%m-%d %H:%M} · {row.get('video_name', '')} ({row.stream_id})"
+        for _, row in sessions.iterrows()
+    }
+    selected = st.multiselect(
+        "Sessions",
+        options=list(labels.keys()),
+        default=list(labels.keys())[:min(5, MAX_ANALYZED_SESSIONS)],
+        format_func=lambda x: labels[x],
+        max_selections=MAX_ANALYZED_SESSIONS,
+        help=f"Up to {MAX_ANALYZED_SESSIONS} sessions are loaded and analysed at once"
+    )
+    if not selected:
+        return
+    
+    stats, encoder = analyze_sessions(sessions[sessions['stream_id'].isin(selected)])
+    summary = summarize_sessions(stats, encoder)
+    
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Stream Hours", f"{summary['stream_hours']:.1f}")
+    col2.metric(
+        "Speed p50 / p95 / p99",
+        " / ".join(f"{summary[k]:.2f}x" if summary[k] is not None else "–" for k in ("speed_p50", "speed_p95", "speed_p99"))
+    )
+    col3.metric("Drop Rate", f"{summary['drop_rate']:.2%}" if summary.get('drop_rate') is not None else "–")
+    col4.metric(
+        "Cores per Stream-Hour",
+        f"{summary['core_hours_per_stream_hour']:.2f}" if summary.get('core_hours_per_stream_hour') is not None else "–"
+    )
+    
+    st.dataframe(stats, use_container_width=True)
+    
+    if 'speed' in encoder and not encoder['speed'].dropna().empty:
+        fig = go.Figure()
+        for stream_id, series in encoder.dropna(subset=['speed']).groupby('stream_id'):
+            elapsed = series['timestamp'] - series['timestamp'].min()
+            fig.add_trace(go.Scatter(x=elapsed / 60, y=series['speed'], mode='lines', name=stream_id))
+        fig.update_layout(
+            xaxis_title='Minutes into Session',
+            yaxis_title='Encoder Speed (x)',
+            template='plotly_white',
+            height=300
+        )
+        st.plotly_chart(fig, use_container_width=True)
 
 def render_metric_card(title, value, change, icon):
     """Render a metric card with icon and value"""
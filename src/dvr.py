@@ -0,0 +1,155 @@
+import os
+import threading
+import time
+from datetime import datetime
+
+# Root of the local archive; each session records into its own directory
+DVR_DIR = "recordings"
+
+# Length of one archive segment; segments are cut on keyframes, so they run up to a GOP longer
+DEFAULT_SEGMENT_SECONDS = 60
+
+# Retention across every recording: segments older than the age limit, and the oldest
+# segments beyond the size limit, are deleted
+DVR_MAX_AGE_HOURS = 24
+DVR_MAX_BYTES = 20 * 1024 ** 3
+
+# How often retention is enforced while a recording runs
+PRUNE_INTERVAL = 30.0
+
+SEGMENT_PATTERN = "%Y%m%d-%H%M%S.ts"
+
+
+def get_session_dir(stream_id, started_at=None, directory=DVR_DIR):
+    """Archive directory of one session"""
+    return os.path.join(directory, f"{started_at or datetime.now():%Y%m%d-%H%M%S}-{stream_id}")
+
+
+def build_dvr_slave(session_dir, segment_seconds=DEFAULT_SEGMENT_SECONDS):
+    """Tee muxer slave that writes the encoded packets as rolling MPEG-TS segments
+
+    MPEG-TS is written strictly front to back with no index to patch at the end, so
+    each segment is one sequential write and stays playable if the process dies.
+    ``onfail=ignore`` keeps the live output running if the disk fills or fails.
+    """
+    os.makedirs(session_dir, exist_ok=True)
+    options = [
+        "f=segment", f"segment_time={segment_seconds}", "segment_format=mpegts",
+        "reset_timestamps=1", "strftime=1", "onfail=ignore"
+    ]
+    return f"[{':'.join(options)}]{os.path.join(session_dir, SEGMENT_PATTERN)}"
+
+
+def list_segments(directory=DVR_DIR):
+    """Every archived segment as (mtime, size, path), oldest first"""
+    segments = []
+    if not os.path.isdir(directory):
+        return segments
+    for session in os.scandir(directory):
+        if not session.is_dir():
+            continue
+        for entry in os.scandir(session.path):
+            if entry.name.endswith(".ts"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                segments.append((stat.st_mtime, stat.st_size, entry.path))
+    segments.sort()
+    return segments
+
+
+def prune_recordings(directory=DVR_DIR, max_age_hours=DVR_MAX_AGE_HOURS, max_bytes=DVR_MAX_BYTES, active_dirs=()):
+    """Delete segments past the age limit, then the oldest until the archive fits the size limit
+
+    The newest segment of an active session is still being written and is never deleted.
+    Returns the number of segments deleted.
+    """
+    segments = list_segments(directory)
+    writing = set()
+    for session_dir in active_dirs:
+        session_segments = [s for s in segments if os.path.dirname(s[2]) == session_dir]
+        if session_segments:
+            writing.add(session_segments[-1][2])
+
+    cutoff = time.time() - max_age_hours * 3600
+    total = sum(size for _, size, _ in segments)
+    deleted = 0
+    for mtime, size, path in segments:
+        if mtime >= cutoff and total <= max_bytes:
+            break
+        if path in writing:
+            continue
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= size
+        deleted += 1
+
+    # Drop session directories that retention emptied
+    for session in os.scandir(directory) if os.path.isdir(directory) else ():
+        if session.is_dir() and session.path not in active_dirs and not os.listdir(session.path):
+            os.rmdir(session.path)
+    return deleted
+
+
+def get_archive_stats(directory=DVR_DIR):
+    """Segment count, bytes on disk and the time span the archive covers"""
+    segments = list_segments(directory)
+    return {
+        'segments': len(segments),
+        'bytes': sum(size for _, size, _ in segments),
+        'oldest': datetime.fromtimestamp(segments[0][0]) if segments else None,
+        'newest': datetime.fromtimestamp(segments[-1][0]) if segments else None
+    }
+
+
+class DvrPruner:
+    """Enforces archive retention on a background thread while any session records"""
+
+    def __init__(self, directory=DVR_DIR):
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.active_dirs = set()
+        self.thread = None
+        self.stop_event = threading.Event()
+
+    def register(self, session_dir):
+        """Start enforcing retention while ``session_dir`` records"""
+        with self.lock:
+            self.active_dirs.add(os.path.normpath(session_dir))
+            if self.thread is None:
+                self.stop_event.clear()
+                self.thread = threading.Thread(target=self._run, daemon=True)
+                self.thread.start()
+
+    def release(self, session_dir):
+        """Stop tracking a finished session; the thread ends with the last one"""
+        with self.lock:
+            self.active_dirs.discard(os.path.normpath(session_dir))
+            if not self.active_dirs and self.thread is not None:
+                self.stop_event.set()
+                self.thread = None
+
+    def _run(self):
+        while not self.stop_event.wait(PRUNE_INTERVAL):
+            with self.lock:
+                active_dirs = set(self.active_dirs)
+            try:
+                prune_recordings(self.directory, active_dirs=active_dirs)
+            except OSError:
+                pass
+
+
+_pruner = None
+_pruner_lock = threading.Lock()
+
+
+def get_dvr_pruner():
+    """Return the process-wide archive retention thread"""
+    global _pruner
+    with _pruner_lock:
+        if _pruner is None:
+            _pruner = DvrPruner()
+        return _pruner
@@ -0,0 +1,116 @@
+import threading
+import time
+from collections import namedtuple
+
+# Lifecycle states a stream moves through
+LIFECYCLE_STATES = (
+    "idle", "scheduled", "queued", "starting", "live", "degraded", "reconnecting", "stopped", "failed"
+)
+
+# States in which an encoder is running or being brought up
+ACTIVE_STATES = ("starting", "live", "degraded", "reconnecting")
+
+# Immutable view of one stream; a new version replaces it on every change
+LifecycleSnapshot = namedtuple(
+    'LifecycleSnapshot',
+    ['version', 'state', 'stream_id', 'video_name', 'start_time', 'scheduled_time', 'updated_at', 'detail']
+)
+
+# Published on the bus whenever a stream's snapshot changes
+StreamEvent = namedtuple('StreamEvent', ['state', 'previous_state', 'snapshot'])
+
+INITIAL_SNAPSHOT = LifecycleSnapshot(
+    version=0, state="idle", stream_id=None, video_name=None,
+    start_time=None, scheduled_time=None, updated_at=None, detail=None
+)
+
+
+def is_active(snapshot):
+    """Whether a snapshot describes a running stream"""
+    return snapshot.state in ACTIVE_STATES
+
+
+class EventBus:
+    """In-process publish/subscribe bus for stream lifecycle events
+
+    Subscribers are called synchronously on the publishing thread, so callbacks must be
+    quick; a failing callback never breaks the publisher.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = {}
+        self.next_token = 0
+
+    def subscribe(self, callback, states=None):
+        """Call ``callback(event)`` for every event, or only for the given states; returns a token"""
+        with self.lock:
+            self.next_token += 1
+            self.subscribers[self.next_token] = (callback, set(states) if states else None)
+            return self.next_token
+
+    def unsubscribe(self, token):
+        """Stop delivering events to a subscriber"""
+        with self.lock:
+            self.subscribers.pop(token, None)
+
+    def publish(self, event):
+        """Deliver an event to every matching subscriber"""
+        with self.lock:
+            subscribers = list(self.subscribers.values())
+        for callback, states in subscribers:
+            if states is None or event.state in states:
+                try:
+                    callback(event)
+                except Exception:
+                    pass
+
+
+class LifecycleTracker:
+    """Holds the current snapshot of one stream and publishes a new version on every change
+
+    Reading ``snapshot`` is a single attribute access, and a snapshot is never modified
+    after it is published, so readers need no lock.
+    """
+
+    def __init__(self, bus):
+        self.bus = bus
+        self.snapshot = INITIAL_SNAPSHOT
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+
+    def transition(self, state, **changes):
+        """Move to ``state``, applying snapshot field changes, and publish the event"""
+        if state not in LIFECYCLE_STATES:
+            raise ValueError(f"Unknown lifecycle state: {state}")
+        with self.lock:
+            previous = self.snapshot
+            if previous.state == state and all(getattr(previous, k) == v for k, v in changes.items()):
+                return previous
+            changes.setdefault('detail', None)
+            self.snapshot = previous._replace(
+                version=previous.version + 1, state=state, updated_at=time.time(), **changes
+            )
+            snapshot = self.snapshot
+            self.changed.notify_all()
+        self.bus.publish(StreamEvent(state, previous.state, snapshot))
+        return snapshot
+
+    def wait_for_change(self, version, timeout=None):
+        """Block until the snapshot is newer than ``version``; returns the current snapshot"""
+        with self.lock:
+            self.changed.wait_for(lambda: self.snapshot.version > version, timeout)
+            return self.snapshot
+
+
+_event_bus = None
+_event_bus_lock = threading.Lock()
+
+
+def get_event_bus():
+    """Return the process-wide event bus"""
+    global _event_bus
+    with _event_bus_lock:
+        if _event_bus is None:
+            _event_bus = EventBus()
+        return _event_bus
@@ -0,0 +1,83 @@
+# Output geometry of YouTube Shorts
+SHORTS_SIZE = (720, 1280)
+
+# How a source is fitted into a target of a different aspect ratio
+FIT_MODES = {
+    "crop": "Fill (Crop Edges)",
+    "pad": "Fit (Letterbox)"
+}
+
+DEFAULT_FIT_MODE = "crop"
+
+# Scaler quality per x264 preset: fast presets get cheap scalers
+SCALER_FLAGS = {
+    "ultrafast": "fast_bilinear",
+    "superfast": "fast_bilinear",
+    "veryfast": "bilinear",
+    "faster": "bilinear",
+    "fast": "bicubic",
+    "medium": "bicubic"
+}
+
+
+def _even(value):
+    """Round down to an even number, as required by 4:2:0 chroma subsampling"""
+    return max(2, int(value) // 2 * 2)
+
+
+def build_video_filter(source_width, source_height, target_width, target_height,
+                       fit_mode=DEFAULT_FIT_MODE, preset="veryfast"):
+    """Build the cheapest filter graph that maps the source onto the target geometry
+
+    Cropping runs before scaling so the scaler only touches pixels that are kept, padding
+    runs after scaling so it works on the smaller frame, and stages that would not change
+    the frame are left out. Returns None when no filtering is needed.
+    """
+    if not target_width or not target_height:
+        return None
+
+    flags = SCALER_FLAGS.get(preset, "bicubic")
+
+    # Unknown source geometry: let the scaler work out the aspect ratio at runtime
+    if not source_width or not source_height:
+        if fit_mode == "pad":
+            return (
+                f"scale={target_width}:{target_height}:force_original_aspect_ratio=decrease:flags={flags},"
+                f"pad={target_width}:{target_height}:(ow-iw)/2:(oh-ih)/2"
+            )
+        return (
+            f"scale={target_width}:{target_height}:force_original_aspect_ratio=increase:flags={flags},"
+            f"crop={target_width}:{target_height}"
+        )
+
+    if (source_width, source_height) == (target_width, target_height):
+        return None
+
+    stages = []
+    source_aspect = source_width / source_height
+    target_aspect = target_width / target_height
+
+    if fit_mode == "pad":
+        # Scale to fit inside the target, then pad the remaining border
+        if source_aspect > target_aspect:
+            scaled_width, scaled_height = target_width, _even(target_width / source_aspect)
+        else:
+            scaled_width, scaled_height = _even(target_height * source_aspect), target_height
+
+        if (scaled_width, scaled_height) != (source_width, source_height):
+            stages.append(f"scale={scaled_width}:{scaled_height}:flags={flags}")
+        if (scaled_width, scaled_height) != (target_width, target_height):
+            stages.append(f"pad={target_width}:{target_height}:(ow-iw)/2:(oh-ih)/2")
+    else:
+        # Crop the source to the target aspect ratio first, then scale what is left
+        if source_aspect > target_aspect:
+            crop_width, crop_height = _even(source_height * target_aspect), source_height
+        else:
+            crop_width, crop_height = source_width, _even(source_width / target_aspect)
+
+        if (crop_width, crop_height) != (source_width, source_height):
+            stages.append(f"crop={crop_width}:{crop_height}")
+        if (crop_width, crop_height) != (target_width, target_height):
+            stages.append(f"scale={target_width}:{target_height}:flags={flags}")
+
+    return ",".join(stages) or None
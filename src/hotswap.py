@@ -0,0 +1,370 @@
+import time
+import queue
+import threading
+import subprocess
+
+TS_PACKET_SIZE = 188
+TS_SYNC_BYTE = 0x47
+
+# ffmpeg's MPEG-TS muxer puts the first mapped stream (video) on PID 0x100
+VIDEO_PID = 0x100
+
+# PTS/DTS/PCR base are 33-bit counters of a 90 kHz clock
+TS_CLOCK = 90000
+TIMESTAMP_WRAP = 1 << 33
+
+# Encoder input arguments when it is fed by switchable input stages
+HOTSWAP_INPUT_ARGS = ["-f", "mpegts", "-i", "pipe:0"]
+
+# Resolution of the standby slate; the encoder scales it to the output size
+SLATE_SIZE = (640, 360)
+
+READ_SIZE = TS_PACKET_SIZE * 64
+QUEUE_CHUNKS = 256
+
+
+def build_file_stage_command(video_path, source_info):
+    """Build an input stage that plays a file in real time as H.264/AAC MPEG-TS
+
+    H.264 video and AAC audio are remuxed without re-encoding; anything else is converted
+    to a light intermediate so every stage carries the same codecs. Sources without audio
+    get silence so the encoder never waits on a missing audio stream.
+    """
+    cmd = ["ffmpeg", "-v", "error", "-re", "-stream_loop", "-1", "-i", video_path]
+    has_audio = bool(source_info.get('audio_codec'))
+    if not has_audio:
+        cmd += ["-f", "lavfi", "-i", "anullsrc=r=48000:cl=stereo"]
+
+    cmd += ["-map", "0:v:0", "-map", "0:a:0" if has_audio else "1:a:0"]
+
+    if source_info.get('video_codec') == "h264":
+        cmd += ["-c:v", "copy"]
+    else:
+        cmd += ["-c:v", "libx264", "-preset", "ultrafast", "-crf", "18"]
+
+    if has_audio and source_info.get('audio_codec') == "aac":
+        cmd += ["-c:a", "copy"]
+    else:
+        cmd += ["-c:a", "aac", "-b:a", "192k"]
+
+    if not has_audio:
+        cmd += ["-shortest"]
+
+    return cmd + ["-flush_packets", "1", "-f", "mpegts", "pipe:1"]
+
+
+def build_slate_command(fps):
+    """Build the standby slate stage: black all-intra video and silence"""
+    width, height = SLATE_SIZE
+    return [
+        "ffmpeg", "-v", "error",
+        "-re", "-f", "lavfi", "-i", f"color=c=black:s={width}x{height}:r={fps}",
+        "-re", "-f", "lavfi", "-i", "anullsrc=r=48000:cl=stereo",
+        "-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency", "-g", "1",
+        "-c:a", "aac", "-b:a", "64k",
+        "-flush_packets", "1", "-f", "mpegts", "pipe:1"
+    ]
+
+
+def _read_timestamp(buf, offset):
+    """Decode a 33-bit PES timestamp"""
+    return (
+        ((buf[offset] >> 1) & 0x07) << 30 |
+        buf[offset + 1] << 22 |
+        (buf[offset + 2] >> 1) << 15 |
+        buf[offset + 3] << 7 |
+        buf[offset + 4] >> 1
+    )
+
+
+def _write_timestamp(buf, offset, value):
+    """Encode a 33-bit PES timestamp, keeping the 4-bit prefix and marker bits"""
+    buf[offset] = (buf[offset] & 0xF0) | (((value >> 30) & 0x07) << 1) | 1
+    buf[offset + 1] = (value >> 22) & 0xFF
+    buf[offset + 2] = (((value >> 15) & 0x7F) << 1) | 1
+    buf[offset + 3] = (value >> 7) & 0xFF
+    buf[offset + 4] = ((value & 0x7F) << 1) | 1
+
+
+def _shift_pcr(buf, offset, delta):
+    """Shift the 33-bit base of a PCR field in place"""
+    base = buf[offset] << 25 | buf[offset + 1] << 17 | buf[offset + 2] << 9 | buf[offset + 3] << 1 | buf[offset + 4] >> 7
+    base = (base + delta) % TIMESTAMP_WRAP
+    buf[offset] = (base >> 25) & 0xFF
+    buf[offset + 1] = (base >> 17) & 0xFF
+    buf[offset + 2] = (base >> 9) & 0xFF
+    buf[offset + 3] = (base >> 1) & 0xFF
+    buf[offset + 4] = ((base & 0x01) << 7) | (buf[offset + 4] & 0x7F)
+
+
+def _signed_ticks(value):
+    """Interpret a wrapped 33-bit difference as a signed number of ticks"""
+    value %= TIMESTAMP_WRAP
+    return value - TIMESTAMP_WRAP if value >= TIMESTAMP_WRAP // 2 else value
+
+
+class InputStage:
+    """One ffmpeg process producing real-time MPEG-TS, read in whole packets"""
+
+    def __init__(self, cmd, label):
+        self.cmd = cmd
+        self.label = label
+        self.process = None
+        self.packets = queue.Queue(maxsize=QUEUE_CHUNKS)
+        self.thread = None
+        self.delta = None
+        self.discard_when_full = False
+
+    def start(self):
+        self.process = subprocess.Popen(self.cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.thread = threading.Thread(target=self._read, daemon=True)
+        self.thread.start()
+        return self
+
+    def _read(self):
+        """Queue chunks aligned to TS packets; a standby stage drops its oldest data"""
+        remainder = b""
+        while True:
+            data = self.process.stdout.read1(READ_SIZE)
+            if not data:
+                break
+            data = remainder + data
+            usable = len(data) - len(data) % TS_PACKET_SIZE
+            remainder = data[usable:]
+            if not usable:
+                continue
+
+            self._put(data[:usable])
+        self._put(None)
+
+    def _put(self, chunk):
+        """Queue a chunk, dropping the oldest one instead of blocking while on standby"""
+        while True:
+            try:
+                self.packets.put(chunk, timeout=0.1)
+                return
+            except queue.Full:
+                if self.discard_when_full:
+                    try:
+                        self.packets.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def is_alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def stop(self):
+        if self.is_alive():
+            self.process.kill()
+            self.process.wait()
+
+
+class SwitchableInput:
+    """Feeds a persistent encoder from input stages that can be swapped while live
+
+    The relay splices stages on video keyframes and rewrites PTS, DTS and PCR so the
+    encoder sees continuous timestamps across a swap. A standby slate stage runs the whole
+    time and covers the gap while a new source starts up.
+    """
+
+    def __init__(self, fps, log=None, on_stage=None):
+        self.fps = fps or 30
+        self.frame_ticks = int(round(TS_CLOCK / self.fps))
+        self.log = log or (lambda message: None)
+        self.on_stage = on_stage or (lambda label, pid: None)
+        self.lock = threading.Lock()
+        self.active = None
+        self.pending = None
+        self.slate = None
+        self.sink = None
+        self.running = False
+        self.waiting_for_keyframe = True
+        self.last_video_dts = None
+        self.swap_started = None
+        self.swaps = []
+        self.thread = None
+
+    def start(self, sink, video_path, source_info):
+        """Start the slate and the first source, and relay into the encoder's stdin"""
+        self.sink = sink
+        self.running = True
+
+        self.slate = InputStage(build_slate_command(self.fps), "slate")
+        self.slate.discard_when_full = True
+        self.slate.start()
+        self.on_stage("slate", self.slate.process.pid)
+
+        self._activate(InputStage(build_file_stage_command(video_path, source_info), "input").start())
+
+        self.thread = threading.Thread(target=self._relay, daemon=True)
+        self.thread.start()
+
+    def swap(self, video_path, source_info):
+        """Switch to a new source; the slate plays until the new stage is ready"""
+        with self.lock:
+            old = self.active
+            # A stage from an earlier swap that never produced data is superseded too
+            superseded, self.pending = self.pending, None
+            self.swap_started = time.monotonic()
+            self._activate(self.slate)
+
+        for stage in (old, superseded):
+            if stage is not None and stage is not self.slate:
+                stage.stop()
+
+        new_stage = InputStage(build_file_stage_command(video_path, source_info), "input").start()
+        with self.lock:
+            # A concurrent swap may have queued its stage meanwhile; the newest one wins
+            superseded, self.pending = self.pending, new_stage
+        if superseded is not None:
+            superseded.stop()
+
+    def stop(self):
+        """Stop the relay and every stage"""
+        self.running = False
+        with self.lock:
+            stages = [self.active, self.pending, self.slate]
+        for stage in stages:
+            if stage is not None:
+                stage.stop()
+
+    def _activate(self, stage):
+        """Make a stage the one being relayed (caller holds the lock or is starting up)"""
+        stage.delta = None
+        stage.discard_when_full = False
+        if self.slate is not None and stage is not self.slate:
+            # Keep the standby slate draining so it never bursts when it is needed
+            self.slate.discard_when_full = True
+        if stage is self.slate:
+            # Drop stale slate frames so only fresh ones are relayed
+            while not stage.packets.empty():
+                try:
+                    stage.packets.get_nowait()
+                except queue.Empty:
+                    break
+        self.active = stage
+        self.waiting_for_keyframe = True
+        if stage is not self.slate:
+            self.on_stage(stage.label, stage.process.pid)
+
+    def _relay(self):
+        """Copy packets from the active stage to the encoder, rewriting timestamps"""
+        try:
+            while self.running:
+                with self.lock:
+                    # Promote the new source once it has produced data
+                    if self.pending is not None and not self.pending.packets.empty():
+                        self._activate(self.pending)
+                        self.pending = None
+                    stage = self.active
+
+                try:
+                    chunk = stage.packets.get(timeout=0.2)
+                except queue.Empty:
+                    continue
+
+                if chunk is None:
+                    # The source stage died; fall back to the slate until a swap
+                    if stage is not self.slate:
+                        self.log("Input stage exited; showing slate")
+                        with self.lock:
+                            self._activate(self.slate)
+                    continue
+
+                output = self._process_chunk(stage, bytearray(chunk))
+                if output:
+                    self.sink.write(output)
+                    self.sink.flush()
+        except (BrokenPipeError, ValueError, OSError):
+            # The encoder exited; the manager tears the stages down
+            pass
+
+    def _process_chunk(self, stage, chunk):
+        """Drop packets until a keyframe after a switch, then shift timestamps"""
+        output = bytearray()
+        for offset in range(0, len(chunk), TS_PACKET_SIZE):
+            packet = chunk[offset:offset + TS_PACKET_SIZE]
+            if packet[0] != TS_SYNC_BYTE:
+                continue
+
+            pid = ((packet[1] & 0x1F) << 8) | packet[2]
+            unit_start = bool(packet[1] & 0x40)
+            adaptation = (packet[3] >> 4) & 0x03
+            payload_offset = 4
+            has_pcr = False
+
+            if adaptation in (2, 3):
+                field_length = packet[4]
+                payload_offset = 5 + field_length
+                has_pcr = field_length > 0 and bool(packet[5] & 0x10)
+
+            # PAT and PMT pass through so the encoder's demuxer keeps its program map
+            if pid in (0x0000, 0x1000):
+                output += packet
+                continue
+
+            # Every stage starts on a keyframe (file start, or an all-intra slate)
+            if self.waiting_for_keyframe:
+                if pid != VIDEO_PID or not unit_start:
+                    continue
+                self.waiting_for_keyframe = False
+
+            if unit_start and adaptation in (1, 3):
+                self._rewrite_pes(stage, packet, payload_offset, pid)
+
+            if stage.delta is None:
+                # No timestamp seen yet for this stage; hold back until one is
+                continue
+
+            if has_pcr:
+                _shift_pcr(packet, 6, stage.delta)
+            output += packet
+        return output
+
+    def _rewrite_pes(self, stage, packet, offset, pid):
+        """Shift the PTS/DTS of a PES header, deriving the stage's offset on first use"""
+        if packet[offset:offset + 3] != b"\x00\x00\x01" or offset + 14 > TS_PACKET_SIZE:
+            return
+
+        flags = packet[offset + 7] >> 6
+        if flags not in (2, 3):
+            return
+
+        pts = _read_timestamp(packet, offset + 9)
+        dts = _read_timestamp(packet, offset + 14) if flags == 3 and offset + 19 <= TS_PACKET_SIZE else pts
+
+        if stage.delta is None:
+            if pid != VIDEO_PID:
+                return
+            self._start_stage_timeline(stage, dts)
+
+        _write_timestamp(packet, offset + 9, (pts + stage.delta) % TIMESTAMP_WRAP)
+        if flags == 3:
+            _write_timestamp(packet, offset + 14, (dts + stage.delta) % TIMESTAMP_WRAP)
+
+        if pid == VIDEO_PID:
+            self.last_video_dts = (dts + stage.delta) % TIMESTAMP_WRAP
+
+    def _start_stage_timeline(self, stage, first_dts):
+        """Line a stage's first keyframe up one frame after the last relayed frame"""
+        if self.last_video_dts is None:
+            stage.delta = 0
+            return
+
+        expected = (self.last_video_dts + self.frame_ticks) % TIMESTAMP_WRAP
+        stage.delta = (expected - first_dts) % TIMESTAMP_WRAP
+        jump = _signed_ticks(first_dts - expected) / TS_CLOCK
+
+        if stage is not self.slate and self.swap_started is not None:
+            latency = time.monotonic() - self.swap_started
+            self.swaps.append({
+                'timestamp': time.time(),
+                'swap_latency': latency,
+                'raw_discontinuity': jump,
+                'output_discontinuity': 0.0
+            })
+            self.swap_started = None
+            self.log(
+                f"Source swapped in {latency * 1000:.0f} ms; "
+                f"timestamp jump of {jump:+.3f}s corrected to 0"
+            )
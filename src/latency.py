@@ -0,0 +1,151 @@
+import time
+import socket
+import threading
+import subprocess
+from collections import deque
+
+# Line ffmpeg prints when the transcode loop starts, i.e. when -re pacing begins
+TRANSCODE_START_MARKER = "Press [q] to stop"
+
+MAX_PACKETS = 5000
+
+
+def find_free_port():
+    """Ask the OS for an unused local TCP port"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def percentile(values, fraction):
+    """Return the nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, int(round(fraction * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+class IngestReceiver:
+    """Local RTMP ingest stand-in that timestamps every packet it receives"""
+
+    def __init__(self, port=None, stream_key="latency"):
+        self.port = port or find_free_port()
+        self.stream_key = stream_key
+        self.process = None
+        self.thread = None
+        self.time_bases = {}
+        self.packets = deque(maxlen=MAX_PACKETS)
+        self.first_packet_at = None
+        self.lock = threading.Lock()
+
+    @property
+    def url(self):
+        return f"rtmp://127.0.0.1:{self.port}/live2/{self.stream_key}"
+
+    def start(self):
+        """Start listening; packets are written as framecrc lines and timestamped on arrival"""
+        cmd = [
+            "ffmpeg", "-v", "error", "-listen", "1", "-i", self.url,
+            "-c", "copy", "-flush_packets", "1", "-f", "framecrc", "-"
+        ]
+        self.process = subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            text=True,
+            bufsize=1
+        )
+        self.thread = threading.Thread(target=self._read_packets, daemon=True)
+        self.thread.start()
+        # Give the listener a moment to bind before the encoder connects
+        time.sleep(0.5)
+
+    def stop(self):
+        """Stop the receiver"""
+        if self.process and self.process.poll() is None:
+            self.process.terminate()
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                self.process.kill()
+
+    def _read_packets(self):
+        """Parse framecrc output: '#tb N: num/den' headers then 'index, dts, pts, duration, size, crc'"""
+        for line in self.process.stdout:
+            arrival = time.monotonic()
+            if line.startswith("#tb"):
+                index, _, base = line[3:].partition(":")
+                num, _, den = base.strip().partition("/")
+                self.time_bases[int(index)] = int(num) / int(den)
+                continue
+            if line.startswith("#"):
+                continue
+
+            fields = [field.strip() for field in line.split(",")]
+            if len(fields) < 5:
+                continue
+            try:
+                index = int(fields[0])
+                dts = int(fields[1]) * self.time_bases.get(index, 0.001)
+                size = int(fields[4])
+            except ValueError:
+                continue
+
+            with self.lock:
+                if self.first_packet_at is None:
+                    self.first_packet_at = arrival
+                self.packets.append((arrival, index, dts, size))
+
+    def get_packets(self):
+        """Return a copy of the received packet log"""
+        with self.lock:
+            return list(self.packets)
+
+
+def compute_latency_report(marks, receiver):
+    """Break click-to-first-packet and steady-state pipeline delay down from timing marks
+
+    ``marks`` holds monotonic times for 'click', 'spawn' and 'transcode_start'. With -re,
+    a frame with media timestamp t is released at transcode_start + t, so its delay through
+    the encoder, muxer and ingest connection is arrival - (transcode_start + t).
+
+    This infers each frame's send time from -re pacing rather than reading timestamps
+    burned into the frames, so the source needs no changes; input stalls or pacing drift
+    count as pipeline delay.
+    """
+    report = {}
+    click = marks.get('click')
+    spawn = marks.get('spawn')
+    transcode_start = marks.get('transcode_start')
+    first_packet = receiver.first_packet_at if receiver else None
+
+    # Pre-warmed encoders are spawned before the start, so count from the start instead
+    if click is not None and spawn is not None:
+        spawn = max(spawn, click)
+
+    if click is not None and spawn is not None:
+        report['click_to_spawn'] = spawn - click
+    if spawn is not None and transcode_start is not None:
+        report['spawn_to_transcode'] = transcode_start - spawn
+    if transcode_start is not None and first_packet is not None:
+        report['transcode_to_first_packet'] = first_packet - transcode_start
+    if click is not None and first_packet is not None:
+        report['click_to_first_packet'] = first_packet - click
+
+    if transcode_start is not None and receiver:
+        # Video packets only; audio frames are tiny and would hide encoder delay
+        delays = [
+            arrival - (transcode_start + dts)
+            for arrival, index, dts, size in receiver.get_packets()
+            if index == 0
+        ]
+        # Skip the first 10% of packets while the encoder's lookahead fills
+        steady = delays[len(delays) // 10:] if len(delays) > 10 else delays
+        if steady:
+            report['steady_state_p50'] = percentile(steady, 0.5)
+            report['steady_state_p95'] = percentile(steady, 0.95)
+            report['steady_state_max'] = max(steady)
+            report['packets'] = len(delays)
+
+    return report
@@ -0,0 +1,250 @@
+import gzip
+import json
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+
+# Root of the per-stream log archive
+LOG_DIR = ".logs"
+
+# Rotate the active file at this size or age, whichever comes first
+MAX_SEGMENT_BYTES = 4 * 1024 * 1024
+MAX_SEGMENT_AGE = 3600
+
+# The writer wakes up this often and appends everything queued since
+FLUSH_INTERVAL = 0.5
+
+# Records waiting for the writer; beyond this new records are dropped, never waited on
+MAX_PENDING = 10000
+
+ACTIVE_FILE = "current.jsonl"
+INDEX_FILE = "index.json"
+
+TOKEN_PATTERN = re.compile(r"[a-z][a-z0-9_\-]{2,}")
+
+
+def tokenize(text):
+    """Lowercase words used for keyword search; numbers are left out to keep the index small"""
+    return set(TOKEN_PATTERN.findall(text.lower()))
+
+
+def matches_keywords(tokens, keywords):
+    """Whether every keyword is a prefix of some token"""
+    return all(any(token.startswith(keyword) for token in tokens) for keyword in keywords)
+
+
+class StreamLog:
+    """Structured, rotated log archive for one stream
+
+    ``write`` only puts a record on a queue, so the ffmpeg reader never waits on disk. A
+    background writer appends queued records as JSON lines in batches, rotates the
+    active file by size and age, gzips rotated segments and adds them to an index of
+    time range, sequence range, levels and keywords so searches only decompress the
+    segments that can match.
+    """
+
+    def __init__(self, stream_id, directory=LOG_DIR, max_bytes=MAX_SEGMENT_BYTES, max_age=MAX_SEGMENT_AGE):
+        self.stream_id = stream_id
+        self.directory = os.path.join(directory, stream_id)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.queue = queue.Queue(maxsize=MAX_PENDING)
+        self.sequence = 0
+        self.sequence_lock = threading.Lock()
+        self.dropped = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.file = None
+        self.segment = None
+
+    def start(self):
+        """Open the archive, seal any segment left by a crash and start the writer"""
+        os.makedirs(self.directory, exist_ok=True)
+        active = os.path.join(self.directory, ACTIVE_FILE)
+        if os.path.exists(active):
+            self.segment = self._scan_segment(active)
+            self._rotate()
+        # Continue the sequence of an existing archive so segment names stay unique
+        self.sequence = max([entry['last_seq'] for entry in load_index(self.directory)], default=0)
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        return self
+
+    def write(self, message, level="info"):
+        """Queue a record without blocking"""
+        with self.sequence_lock:
+            self.sequence += 1
+            sequence = self.sequence
+        record = {
+            'ts': time.time(),
+            'seq': sequence,
+            'level': level,
+            'stream_id': self.stream_id,
+            'message': message
+        }
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self):
+        """Write everything still queued and seal the active segment"""
+        self.stop_event.set()
+        if self.thread:
+            self.thread.join()
+        self._rotate()
+
+    def _run(self):
+        """Append queued records in batches until closed"""
+        while not self.stop_event.wait(FLUSH_INTERVAL):
+            self._flush()
+        self._flush()
+
+    def _flush(self):
+        """Append every queued record and rotate if the segment is full"""
+        batch = []
+        while True:
+            try:
+                batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        if not batch:
+            return
+
+        if self.file is None:
+            self.file = open(os.path.join(self.directory, ACTIVE_FILE), "a", encoding="utf-8")
+        self.file.write("".join(json.dumps(record) + "\n" for record in batch))
+        self.file.flush()
+
+        for record in batch:
+            self._track(record)
+
+        if self.dropped:
+            self.segment['dropped'] = self.dropped
+
+        if (self.file.tell() >= self.max_bytes
+                or time.time() - self.segment['first_ts'] >= self.max_age):
+            self._rotate()
+
+    def _track(self, record):
+        """Extend the active segment's index entry with a record"""
+        if self.segment is None:
+            self.segment = {
+                'first_ts': record['ts'], 'first_seq': record['seq'],
+                'records': 0, 'levels': set(), 'tokens': set()
+            }
+        self.segment['last_ts'] = record['ts']
+        self.segment['last_seq'] = record['seq']
+        self.segment['records'] += 1
+        self.segment['levels'].add(record['level'])
+        self.segment['tokens'] |= tokenize(record['message'])
+
+    def _scan_segment(self, path):
+        """Build the index entry of an unsealed segment from its records"""
+        self.segment = None
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    self._track(json.loads(line))
+                except ValueError:
+                    continue
+        return self.segment
+
+    def _rotate(self):
+        """Compress the active file into a sealed segment and add it to the index"""
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+        active = os.path.join(self.directory, ACTIVE_FILE)
+        if self.segment is None or not os.path.exists(active):
+            return
+
+        name = f"segment-{self.segment['first_seq']:010d}.jsonl.gz"
+        with open(active, "rb") as source, gzip.open(os.path.join(self.directory, name), "wb") as target:
+            shutil.copyfileobj(source, target)
+        os.remove(active)
+
+        entry = dict(
+            self.segment, file=name,
+            levels=sorted(self.segment['levels']), tokens=sorted(self.segment['tokens'])
+        )
+        index = load_index(self.directory)
+        index.append(entry)
+        temporary = os.path.join(self.directory, INDEX_FILE + ".tmp")
+        with open(temporary, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(temporary, os.path.join(self.directory, INDEX_FILE))
+        self.segment = None
+
+
+def load_index(stream_dir):
+    """Return the sealed segment entries of a stream directory"""
+    try:
+        with open(os.path.join(stream_dir, INDEX_FILE), encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return []
+
+
+def list_streams(directory=LOG_DIR):
+    """Return archived stream IDs, most recently written first"""
+    if not os.path.isdir(directory):
+        return []
+    streams = [
+        entry for entry in os.listdir(directory)
+        if os.path.isdir(os.path.join(directory, entry))
+    ]
+    return sorted(streams, key=lambda s: os.path.getmtime(os.path.join(directory, s)), reverse=True)
+
+
+def search_logs(stream_id, start=None, end=None, keyword=None, level=None, limit=500, directory=LOG_DIR):
+    """Find records by time range (epoch seconds), keyword prefixes and level
+
+    The index rules out sealed segments that cannot match, so only candidate segments
+    are decompressed. The active segment is always scanned.
+    """
+    stream_dir = os.path.join(directory, stream_id)
+    keywords = sorted(tokenize(keyword or ""))
+    results = []
+
+    def candidate(entry):
+        if start is not None and entry['last_ts'] < start:
+            return False
+        if end is not None and entry['first_ts'] > end:
+            return False
+        if level is not None and level not in entry['levels']:
+            return False
+        return matches_keywords(entry['tokens'], keywords)
+
+    paths = [
+        (gzip.open, os.path.join(stream_dir, entry['file']))
+        for entry in load_index(stream_dir) if candidate(entry)
+    ]
+    paths.append((open, os.path.join(stream_dir, ACTIVE_FILE)))
+
+    for opener, path in paths:
+        try:
+            with opener(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if start is not None and record['ts'] < start:
+                        continue
+                    if end is not None and record['ts'] > end:
+                        continue
+                    if level is not None and record['level'] != level:
+                        continue
+                    if keywords and not matches_keywords(tokenize(record['message']), keywords):
+                        continue
+                    results.append(record)
+                    if len(results) >= limit:
+                        return results
+        except OSError:
+            continue
+    return results
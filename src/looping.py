@@ -0,0 +1,337 @@
+import json
+import os
+import statistics
+import subprocess
+import threading
+from collections import deque
+from fractions import Fraction
+
+from utils import get_content_hash
+
+# Prepared loop assets and their metadata, per content hash
+LOOP_CACHE_DIR = os.path.join(".cache", "loops")
+
+# Keyframe spacing and quality of the prepared asset; it is decoded again by the live
+# encoder, so it is kept close to lossless
+LOOP_GOP_SECONDS = 2
+LOOP_CRF = 16
+
+# Media seconds after each seam that are attributed to it
+SEAM_WINDOW = 3.0
+
+# Samples before a seam whose instantaneous bitrate forms its baseline
+SEAM_BASELINE_SAMPLES = 10
+
+# Seam records kept for display; older seams only count towards the running totals
+RECENT_SEAMS = 20
+
+# ffmpeg messages that indicate a timestamp discontinuity
+SEAM_WARNING_PATTERNS = (
+    "non monotonically increasing dts", "Non-monotonous DTS", "Queue input is backward in time",
+    "discontinuity", "Past duration"
+)
+
+
+def probe_loop_source(path):
+    """Return the frame rate, sample rate and per-stream durations a loop is planned from"""
+    result = subprocess.run(
+        [
+            "ffprobe", "-v", "error",
+            "-show_entries", "stream=codec_type,r_frame_rate,sample_rate,duration:format=duration",
+            "-of", "json", path
+        ],
+        stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+    )
+    try:
+        probe = json.loads(result.stdout)
+    except ValueError:
+        return None
+
+    format_duration = float(probe.get('format', {}).get('duration') or 0)
+    info = {'frame_rate': None, 'video_duration': None, 'sample_rate': None, 'audio_duration': None}
+    for stream in probe.get('streams', []):
+        duration = float(stream.get('duration') or format_duration or 0)
+        if stream.get('codec_type') == "video" and info['frame_rate'] is None:
+            try:
+                info['frame_rate'] = Fraction(stream['r_frame_rate'])
+            except (KeyError, ValueError, ZeroDivisionError):
+                continue
+            info['video_duration'] = duration
+        elif stream.get('codec_type') == "audio" and info['sample_rate'] is None:
+            info['sample_rate'] = int(stream.get('sample_rate') or 0) or None
+            info['audio_duration'] = duration
+    if not info['frame_rate'] or not info['video_duration']:
+        return None
+    return info
+
+
+def plan_loop(frame_rate, video_duration, sample_rate=None, audio_duration=None):
+    """Frame and sample counts of the longest loop whose video and audio end together
+
+    The frame count is lowered to one at which the audio holds a whole number of
+    samples (48 kHz at 30000/1001 fps has 1601.6 samples per frame), so no sample is
+    split or stretched at the seam.
+    """
+    frame_rate = Fraction(frame_rate)
+    length = min(video_duration, audio_duration) if sample_rate and audio_duration else video_duration
+    frames = int(Fraction(length) * frame_rate)
+    if not sample_rate:
+        return frames, 0
+
+    samples_per_frame = Fraction(sample_rate) / frame_rate
+    frames -= frames % samples_per_frame.denominator
+    return frames, int(frames * samples_per_frame)
+
+
+def get_loop_cache_paths(path):
+    """Prepared asset and metadata paths for a source file"""
+    content_hash = get_content_hash(path)
+    base = os.path.join(LOOP_CACHE_DIR, content_hash)
+    return base + ".mov", base + ".json"
+
+
+def load_loop_asset(path):
+    """Return the metadata of a prepared loop asset for ``path``, or None if there is none"""
+    asset_path, meta_path = get_loop_cache_paths(path)
+    if not os.path.exists(asset_path):
+        return None
+    try:
+        with open(meta_path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def prepare_loop_asset(path):
+    """Re-encode a source into an asset that loops without a timestamp or keyframe discontinuity
+
+    The asset is constant frame rate, starts on an IDR frame with closed GOPs and no
+    B-frames, and its PCM audio holds exactly as many samples as the video lasts. With
+    equal stream durations, ``-stream_loop`` offsets both streams by the same amount at
+    every wrap and timestamps stay continuous. Returns the asset metadata, or None.
+    """
+    cached = load_loop_asset(path)
+    if cached:
+        return cached
+
+    info = probe_loop_source(path)
+    if info is None:
+        return None
+    frame_rate = info['frame_rate']
+    frames, samples = plan_loop(frame_rate, info['video_duration'], info['sample_rate'], info['audio_duration'])
+    if frames <= 0:
+        return None
+
+    gop = max(1, round(frame_rate * LOOP_GOP_SECONDS))
+    graph = [f"[0:v]fps={frame_rate},trim=end_frame={frames},setpts=N/FRAME_RATE/TB[v]"]
+    maps = ["-map", "[v]"]
+    if samples:
+        sample_rate = info['sample_rate']
+        graph.append(
+            f"[0:a]aresample={sample_rate},atrim=end_sample={samples},"
+            f"apad=whole_len={samples},asetpts=N/SR/TB[a]"
+        )
+        maps += ["-map", "[a]", "-c:a", "pcm_s16le", "-ar", str(sample_rate)]
+
+    asset_path, meta_path = get_loop_cache_paths(path)
+    os.makedirs(LOOP_CACHE_DIR, exist_ok=True)
+    temporary = asset_path + ".tmp"
+    cmd = [
+        "ffmpeg", "-y", "-v", "error", "-i", path,
+        "-filter_complex", ";".join(graph)
+    ] + maps + [
+        "-c:v", "libx264", "-preset", "veryfast", "-crf", str(LOOP_CRF), "-pix_fmt", "yuv420p",
+        "-bf", "0", "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0",
+        "-flags", "+cgop", "-f", "mov", temporary
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+    if result.returncode != 0:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        return None
+    os.replace(temporary, asset_path)
+
+    duration = float(frames / frame_rate)
+    meta = {
+        'source': os.path.basename(path),
+        'path': asset_path,
+        'frames': frames,
+        'frame_rate': str(frame_rate),
+        'samples': samples,
+        'sample_rate': info['sample_rate'] if samples else None,
+        'duration': duration,
+        'trimmed_seconds': max(0.0, info['video_duration'] - duration),
+        'gop': gop
+    }
+    with open(meta_path, "w") as f:
+        json.dump(meta, f, indent=2)
+    return meta
+
+
+class LoopPreparer:
+    """Prepares loop assets in the background, one job per source content"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.jobs = {}
+
+    def prepare(self, path):
+        """Start preparing ``path`` unless it is prepared or already being prepared"""
+        key = get_content_hash(path)
+        with self.lock:
+            if self.jobs.get(key) in ("preparing", "ready") or load_loop_asset(path):
+                return
+            self.jobs[key] = "preparing"
+
+        def run():
+            meta = prepare_loop_asset(path)
+            with self.lock:
+                self.jobs[key] = "ready" if meta else "failed"
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def get_state(self, path):
+        """Return "ready", "preparing", "failed" or None for a source"""
+        if load_loop_asset(path):
+            return "ready"
+        with self.lock:
+            return self.jobs.get(get_content_hash(path))
+
+
+_preparer = None
+_preparer_lock = threading.Lock()
+
+
+def get_loop_preparer():
+    """Return the process-wide loop asset preparer"""
+    global _preparer
+    with _preparer_lock:
+        if _preparer is None:
+            _preparer = LoopPreparer()
+        return _preparer
+
+
+class SeamMonitor:
+    """Measures the encoder's behaviour around each point where a looping input wraps
+
+    Output media time is continuous, so the n-th seam is at n loop lengths. For each
+    seam the peak instantaneous bitrate (from output size growth) is compared with the
+    median of the samples before it. The record also holds the slowest encoder speed,
+    frames dropped or duplicated, and timestamp warnings ffmpeg printed near the seam.
+    """
+
+    def __init__(self, loop_duration, metrics, window=SEAM_WINDOW):
+        self.loop_duration = loop_duration
+        self.metrics = metrics
+        self.window = window
+        self.next_seam = loop_duration
+        self.previous = None
+        self.rates = deque(maxlen=SEAM_BASELINE_SAMPLES)
+        self.current = None
+        self.pending_warnings = 0
+        self.seams = deque(maxlen=RECENT_SEAMS)
+        self.totals = {
+            'seams': 0,
+            'max_bitrate_ratio': None,
+            'ratio_sum': 0.0,
+            'ratio_count': 0,
+            'min_speed': None,
+            'dropped': 0,
+            'duplicated': 0,
+            'warnings': 0
+        }
+
+    def add_line(self, line):
+        """Count timestamp warnings from a non-progress ffmpeg output line"""
+        if any(pattern in line for pattern in SEAM_WARNING_PATTERNS):
+            if self.current:
+                self.current['warnings'] += 1
+            else:
+                # The warning may precede the progress line that crosses the seam
+                self.pending_warnings += 1
+
+    def add_sample(self, stats):
+        """Track a parsed progress sample"""
+        media_time = stats.get('media_time')
+        if media_time is None or not self.loop_duration:
+            return
+
+        rate = None
+        previous = self.previous
+        if previous and 'size_kb' in stats and 'size_kb' in previous and media_time > previous['media_time']:
+            rate = (stats['size_kb'] - previous['size_kb']) * 8 / (media_time - previous['media_time'])
+        self.previous = stats
+
+        if self.current is None and media_time >= self.next_seam:
+            self.current = {
+                'index': self.totals['seams'] + 1,
+                'media_time': self.next_seam,
+                'baseline_kbps': statistics.median(self.rates) if self.rates else None,
+                'peak_kbps': rate or 0.0,
+                'min_speed': stats.get('speed'),
+                'warnings': self.pending_warnings,
+                'start_drop': (previous or stats).get('drop', 0),
+                'start_dup': (previous or stats).get('dup', 0)
+            }
+            self.pending_warnings = 0
+            return
+
+        if self.current is None:
+            self.pending_warnings = 0
+            if rate is not None:
+                self.rates.append(rate)
+            return
+
+        seam = self.current
+        if rate is not None:
+            seam['peak_kbps'] = max(seam['peak_kbps'], rate)
+        if stats.get('speed') is not None:
+            seam['min_speed'] = min(seam['min_speed'] or stats['speed'], stats['speed'])
+        if media_time >= seam['media_time'] + self.window:
+            self._close(seam, stats)
+
+    def _close(self, seam, stats):
+        """Finish a seam record, add it to the running totals and publish the recent records"""
+        record = {
+            'index': seam['index'],
+            'media_time': round(seam['media_time'], 3),
+            'baseline_kbps': seam['baseline_kbps'],
+            'peak_kbps': round(seam['peak_kbps'], 1),
+            'bitrate_ratio': round(seam['peak_kbps'] / seam['baseline_kbps'], 2) if seam['baseline_kbps'] else None,
+            'min_speed': seam['min_speed'],
+            'dropped': stats.get('drop', 0) - seam['start_drop'],
+            'duplicated': stats.get('dup', 0) - seam['start_dup'],
+            'warnings': seam['warnings']
+        }
+        self.seams.append(record)
+
+        totals = self.totals
+        totals['seams'] += 1
+        if record['bitrate_ratio'] is not None:
+            totals['max_bitrate_ratio'] = max(totals['max_bitrate_ratio'] or 0.0, record['bitrate_ratio'])
+            totals['ratio_sum'] += record['bitrate_ratio']
+            totals['ratio_count'] += 1
+        if record['min_speed'] is not None:
+            totals['min_speed'] = min(totals['min_speed'] or record['min_speed'], record['min_speed'])
+        for key in ('dropped', 'duplicated', 'warnings'):
+            totals[key] += record[key]
+
+        self.current = None
+        while self.next_seam <= stats['media_time']:
+            self.next_seam += self.loop_duration
+        self.metrics.set_info('loop_seams', {'totals': dict(totals), 'recent': list(self.seams)})
+
+
+def summarize_seams(loop_seams):
+    """Worst-case and mean figures over every seam of a session"""
+    if not loop_seams:
+        return None
+    totals = loop_seams['totals']
+    return {
+        'seams': totals['seams'],
+        'max_bitrate_ratio': totals['max_bitrate_ratio'],
+        'mean_bitrate_ratio': round(totals['ratio_sum'] / totals['ratio_count'], 2) if totals['ratio_count'] else None,
+        'min_speed': totals['min_speed'],
+        'dropped': totals['dropped'],
+        'warnings': totals['warnings']
+    }
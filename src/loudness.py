@@ -0,0 +1,151 @@
+import json
+import os
+import queue
+import re
+import subprocess
+import threading
+
+from utils import get_content_hash
+
+# Measurements per content hash
+LOUDNESS_CACHE_DIR = os.path.join(".cache", "loudness")
+
+# YouTube normalizes playback to about -14 LUFS; true peak stays below -1 dBTP so the
+# AAC encode does not clip
+TARGET_LOUDNESS = -14.0
+TARGET_TRUE_PEAK = -1.0
+TARGET_LRA = 11.0
+
+# Measurements below this integrated loudness are silence or near-silence; no gain is applied
+SILENCE_LOUDNESS = -70.0
+
+LOUDNORM_JSON_PATTERN = re.compile(r"\{[^{}]*\"input_i\"[^{}]*\}", re.S)
+
+
+def measure_loudness(path):
+    """Measure integrated loudness, true peak and loudness range with a loudnorm analysis pass"""
+    cmd = [
+        "ffmpeg", "-hide_banner", "-nostats", "-i", path, "-vn",
+        "-af", f"loudnorm=I={TARGET_LOUDNESS}:TP={TARGET_TRUE_PEAK}:LRA={TARGET_LRA}:print_format=json",
+        "-f", "null", "-"
+    ]
+    result = subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, errors="replace")
+    match = LOUDNORM_JSON_PATTERN.search(result.stderr)
+    if not match:
+        return None
+    try:
+        report = json.loads(match.group(0))
+        return {
+            'integrated_lufs': float(report['input_i']),
+            'true_peak_dbtp': float(report['input_tp']),
+            'lra_lu': float(report['input_lra']),
+            'threshold_lufs': float(report['input_thresh'])
+        }
+    except (KeyError, ValueError):
+        return None
+
+
+def get_cache_path(path):
+    """Cached measurement path for a source file"""
+    return os.path.join(LOUDNESS_CACHE_DIR, f"{get_content_hash(path)}.json")
+
+
+def load_loudness(path):
+    """Return the cached measurement for ``path``, or None if it has not been analysed"""
+    try:
+        with open(get_cache_path(path)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def analyze_loudness(path):
+    """Measure a file once and cache the result by content hash"""
+    cached = load_loudness(path)
+    if cached:
+        return cached
+    measurement = measure_loudness(path)
+    if measurement is None:
+        return None
+
+    os.makedirs(LOUDNESS_CACHE_DIR, exist_ok=True)
+    cache_path = get_cache_path(path)
+    with open(cache_path + ".tmp", "w") as f:
+        json.dump(measurement, f, indent=2)
+    os.replace(cache_path + ".tmp", cache_path)
+    return measurement
+
+
+def get_normalization_gain(measurement, target=TARGET_LOUDNESS, true_peak=TARGET_TRUE_PEAK):
+    """Static gain in dB that brings a file to the target loudness without exceeding the peak limit
+
+    This is what a second loudnorm pass does in linear mode, without its per-frame
+    analysis: the whole file gets one gain, so dynamics are untouched.
+    """
+    if measurement is None or measurement['integrated_lufs'] <= SILENCE_LOUDNESS:
+        return 0.0
+    gain = target - measurement['integrated_lufs']
+    return round(min(gain, true_peak - measurement['true_peak_dbtp']), 2)
+
+
+def get_normalization_filter(path):
+    """Audio filter for a file's cached measurement; None when unmeasured or no change is needed"""
+    gain = get_normalization_gain(load_loudness(path))
+    if abs(gain) < 0.1:
+        return None
+    return f"volume={gain:+.2f}dB"
+
+
+class LoudnessAnalyzer:
+    """Measures files one at a time on a background thread, one job per source content
+
+    A library scan can register many files at once; measuring them in turn keeps the
+    decoding off the cores that live encoders are using.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.jobs = {}
+        self.pending = queue.Queue()
+        self.worker = None
+
+    def analyze(self, path):
+        """Queue ``path`` for measurement unless it is cached, queued or being measured"""
+        key = get_content_hash(path)
+        with self.lock:
+            if self.jobs.get(key) in ("queued", "analyzing", "ready") or load_loudness(path):
+                return
+            self.jobs[key] = "queued"
+            self.pending.put((key, path))
+            if self.worker is None:
+                self.worker = threading.Thread(target=self._run, daemon=True)
+                self.worker.start()
+
+    def _run(self):
+        while True:
+            key, path = self.pending.get()
+            with self.lock:
+                self.jobs[key] = "analyzing"
+            measurement = analyze_loudness(path) if os.path.exists(path) else None
+            with self.lock:
+                self.jobs[key] = "ready" if measurement else "failed"
+
+    def get_state(self, path):
+        """Return "ready", "queued", "analyzing", "failed" or None for a source"""
+        if load_loudness(path):
+            return "ready"
+        with self.lock:
+            return self.jobs.get(get_content_hash(path))
+
+
+_analyzer = None
+_analyzer_lock = threading.Lock()
+
+
+def get_loudness_analyzer():
+    """Return the process-wide loudness analyzer"""
+    global _analyzer
+    with _analyzer_lock:
+        if _analyzer is None:
+            _analyzer = LoudnessAnalyzer()
+        return _analyzer
@@ -0,0 +1,321 @@
+import ctypes
+import ctypes.util
+import os
+import shutil
+import threading
+
+from utils import get_content_hash
+
+# Bytes of the file start read into the page cache before an encoder opens it
+DEFAULT_WARM_BYTES = 256 * 1024 * 1024
+
+# How far ahead of the reader's file position the page cache is kept populated
+DEFAULT_READ_AHEAD = 64 * 1024 * 1024
+READ_AHEAD_INTERVAL = 0.5
+
+# Staging area in memory for hot assets and its default size limit
+TMPFS_DIR = "/dev/shm/live2-media"
+DEFAULT_TMPFS_BUDGET = 2 * 1024 * 1024 * 1024
+
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def advise(path, offset, length, advice_name):
+    """Apply a posix_fadvise hint to a byte range; a no-op where unsupported"""
+    advice = getattr(os, advice_name, None)
+    if advice is None or not hasattr(os, "posix_fadvise"):
+        return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, offset, length, advice)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+
+def warm_page_cache(path, max_bytes=DEFAULT_WARM_BYTES):
+    """Read the start of a file into the page cache and ask the kernel to prefetch the rest
+
+    The first ``max_bytes`` are read synchronously so the encoder's probe and first
+    seconds never wait on storage; the remainder only gets an asynchronous WILLNEED hint.
+    Returns the number of bytes read.
+    """
+    advise(path, 0, 0, "POSIX_FADV_WILLNEED")
+    warmed = 0
+    try:
+        with open(path, "rb", buffering=0) as f:
+            while warmed < max_bytes:
+                chunk = f.read(min(CHUNK_SIZE, max_bytes - warmed))
+                if not chunk:
+                    break
+                warmed += len(chunk)
+    except OSError:
+        pass
+    return warmed
+
+
+_libc = None
+
+
+def _get_libc():
+    """Load libc with mmap/mincore signatures for residency checks"""
+    global _libc
+    if _libc is None:
+        libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+        libc.mmap.restype = ctypes.c_void_p
+        libc.mmap.argtypes = [
+            ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int, ctypes.c_long
+        ]
+        libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_void_p]
+        _libc = libc
+    return _libc
+
+
+def get_cache_residency(path):
+    """Return the fraction of a file's pages in the page cache, or None if unknown"""
+    try:
+        size = os.path.getsize(path)
+        libc = _get_libc()
+    except (OSError, AttributeError, TypeError):
+        return None
+    if size == 0:
+        return 1.0
+
+    page_size = os.sysconf("SC_PAGE_SIZE")
+    pages = (size + page_size - 1) // page_size
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return None
+    try:
+        # PROT_READ = 1, MAP_SHARED = 1
+        address = libc.mmap(None, size, 1, 1, fd, 0)
+        if address in (None, ctypes.c_void_p(-1).value):
+            return None
+        try:
+            vector = (ctypes.c_ubyte * pages)()
+            if libc.mincore(address, size, vector) != 0:
+                return None
+            return sum(byte & 1 for byte in vector) / pages
+        finally:
+            libc.munmap(address, size)
+    finally:
+        os.close(fd)
+
+
+def get_read_position(pid, path):
+    """Return the file offset at which a process is reading ``path``, or None"""
+    target = os.path.realpath(path)
+    try:
+        for fd in os.listdir(f"/proc/{pid}/fd"):
+            try:
+                if os.readlink(f"/proc/{pid}/fd/{fd}") != target:
+                    continue
+                with open(f"/proc/{pid}/fdinfo/{fd}") as f:
+                    for line in f:
+                        if line.startswith("pos:"):
+                            return int(line.split()[1])
+            except OSError:
+                continue
+    except OSError:
+        pass
+    return None
+
+
+class ReadAhead:
+    """Keeps the page cache populated just ahead of a process reading a media file
+
+    The reader's position is taken from /proc/<pid>/fdinfo, so the reading process needs
+    no changes. Before a looping input wraps, the start of the file is prefetched too.
+    """
+
+    def __init__(self, path, window=DEFAULT_READ_AHEAD, interval=READ_AHEAD_INTERVAL):
+        self.path = path
+        self.window = window
+        self.interval = interval
+        self.size = os.path.getsize(path)
+        self.pid = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def attach(self, pid):
+        """Follow a reader process; replaces any previous reader"""
+        self.pid = pid
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """Stop prefetching"""
+        self.stop_event.set()
+
+    def _run(self):
+        """Issue WILLNEED hints for the window ahead of the reader"""
+        last_position = None
+        while not self.stop_event.wait(self.interval):
+            position = get_read_position(self.pid, self.path) if self.pid else None
+            if position is None or position == last_position:
+                continue
+            last_position = position
+
+            advise(self.path, position, self.window, "POSIX_FADV_WILLNEED")
+            remaining = self.size - position
+            if remaining < self.window:
+                advise(self.path, 0, self.window - remaining, "POSIX_FADV_WILLNEED")
+
+
+class TmpfsStager:
+    """Copies hot assets to tmpfs within a memory budget, shared by every stream
+
+    Staged copies are keyed by content hash and reference counted, so streams looping
+    the same asset share one copy. Copies no stream uses are evicted, least recently
+    released first, to make room for new ones.
+    """
+
+    def __init__(self, budget_bytes=DEFAULT_TMPFS_BUDGET, directory=TMPFS_DIR):
+        self.budget_bytes = budget_bytes
+        self.directory = directory
+        self.lock = threading.Lock()
+        self.staged = {}
+        self.copying = {}
+        self.failed = set()
+        self.idle = []
+
+    def used_bytes(self):
+        """Bytes held on tmpfs, counting copies still being written at their full size"""
+        return (
+            sum(entry['size'] for entry in self.staged.values()) +
+            sum(copy['size'] for copy in self.copying.values())
+        )
+
+    def stage(self, path):
+        """Return a tmpfs copy of ``path``, or ``path`` itself when it does not fit
+
+        The copy is written to a temporary file without holding the lock, so staging a
+        large file never blocks other streams; its size is reserved against the budget
+        until it is published. Streams staging the same content meanwhile wait for it.
+        """
+        if not os.path.isdir(os.path.dirname(self.directory)):
+            return path
+        size = os.path.getsize(path)
+        key = get_content_hash(path) + os.path.splitext(path)[1]
+
+        with self.lock:
+            if key in self.staged:
+                return self._use(key)
+            copy = self.copying.get(key)
+            owner = copy is None
+            if owner:
+                if not self._make_room(size):
+                    return path
+                copy = self.copying[key] = {'size': size, 'done': threading.Event()}
+
+        if not owner:
+            copy['done'].wait()
+            with self.lock:
+                return self._use(key) if key in self.staged else path
+
+        os.makedirs(self.directory, exist_ok=True)
+        staged_path = os.path.join(self.directory, key)
+        try:
+            shutil.copyfile(path, staged_path + ".tmp")
+            os.replace(staged_path + ".tmp", staged_path)
+        except OSError:
+            try:
+                os.remove(staged_path + ".tmp")
+            except OSError:
+                pass
+            staged_path = None
+
+        with self.lock:
+            del self.copying[key]
+            copy['done'].set()
+            if staged_path is None:
+                return path
+            self.staged[key] = {'path': staged_path, 'size': size, 'users': 0}
+            return self._use(key)
+
+    def _use(self, key):
+        """Count one more stream using a staged copy and return its path (caller holds the lock)"""
+        if key in self.idle:
+            self.idle.remove(key)
+        entry = self.staged[key]
+        entry['users'] += 1
+        return entry['path']
+
+    def get_staged(self, path):
+        """Return the staged copy of ``path`` for one more user, or None if it is not staged yet"""
+        key = get_content_hash(path) + os.path.splitext(path)[1]
+        with self.lock:
+            return self._use(key) if key in self.staged else None
+
+    def get_state(self, path):
+        """Return "staged", "copying", "failed" or None for a source"""
+        key = get_content_hash(path) + os.path.splitext(path)[1]
+        with self.lock:
+            if key in self.staged:
+                return "staged"
+            if key in self.copying:
+                return "copying"
+            return "failed" if key in self.failed else None
+
+    def stage_in_background(self, path):
+        """Copy ``path`` to tmpfs on a background thread; the copy stays cached until a session uses it"""
+        def run():
+            staged_path = self.stage(path)
+            if staged_path != path:
+                self.release(staged_path)
+            else:
+                # Too big for the budget or the copy failed; don't retry on every request
+                with self.lock:
+                    self.failed.add(get_content_hash(path) + os.path.splitext(path)[1])
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def release(self, staged_path):
+        """Mark a staged copy unused by one stream; it stays cached until space is needed"""
+        with self.lock:
+            for key, entry in self.staged.items():
+                if entry['path'] == staged_path:
+                    entry['users'] = max(0, entry['users'] - 1)
+                    if entry['users'] == 0:
+                        self.idle.append(key)
+                    return
+
+    def _make_room(self, size):
+        """Evict idle copies until ``size`` fits in the budget and free tmpfs space"""
+        try:
+            stats = os.statvfs(os.path.dirname(self.directory))
+            free = stats.f_bavail * stats.f_frsize
+        except OSError:
+            return False
+        # Copies in flight have not written all of their bytes yet
+        free -= sum(copy['size'] for copy in self.copying.values())
+        while self.used_bytes() + size > self.budget_bytes or size > free:
+            if not self.idle:
+                return False
+            entry = self.staged.pop(self.idle.pop(0))
+            try:
+                os.remove(entry['path'])
+            except OSError:
+                pass
+            free += entry['size']
+        return True
+
+
+_stager = None
+_stager_lock = threading.Lock()
+
+
+def get_tmpfs_stager():
+    """Return the process-wide tmpfs stager"""
+    global _stager
+    with _stager_lock:
+        if _stager is None:
+            _stager = TmpfsStager()
+        return _stager
@@ -0,0 +1,108 @@
+import json
+import os
+import threading
+
+from loudness import get_loudness_analyzer
+from utils import get_content_hash, get_video_info
+
+# Extensions picked up when a library directory is scanned
+MEDIA_EXTENSIONS = ('.mp4', '.flv', '.mov', '.avi', '.mkv', '.png', '.jpg')
+
+INDEX_FILE = "library.json"
+
+# Still images have no audio to measure
+IMAGE_EXTENSIONS = ('.png', '.jpg')
+
+
+class MediaLibrary:
+    """Maps portable asset IDs to files on this host
+
+    An asset ID is the content hash of the file, so the same video copied to several
+    hosts has the same ID everywhere and stream definitions never carry local paths.
+    The index of known files is kept in ``library.json`` in the library root and is
+    only recomputed for files whose size or modification time changed.
+    """
+
+    def __init__(self, root="."):
+        self.root = os.path.abspath(root)
+        self.lock = threading.Lock()
+        self.assets = {}
+        self.files = {}
+        self._load()
+
+    def _load(self):
+        """Load the saved index"""
+        try:
+            with open(os.path.join(self.root, INDEX_FILE)) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        self.files = saved.get('files', {})
+        self.assets = saved.get('assets', {})
+
+    def _save(self):
+        """Write the index atomically (caller holds the lock)"""
+        temporary = os.path.join(self.root, INDEX_FILE + ".tmp")
+        with open(temporary, "w") as f:
+            json.dump({'files': self.files, 'assets': self.assets}, f, indent=2)
+        os.replace(temporary, os.path.join(self.root, INDEX_FILE))
+
+    def register(self, path):
+        """Add a file to the library and return its asset ID"""
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        with self.lock:
+            known = self.files.get(path)
+            if known and known['size'] == stat.st_size and known['mtime'] == stat.st_mtime:
+                return known['asset_id']
+
+        # Hash and probe without the lock; a scan would otherwise block every lookup
+        asset_id = get_content_hash(path)
+        info = get_video_info(path) or {}
+        with self.lock:
+            self.files[path] = {'asset_id': asset_id, 'size': stat.st_size, 'mtime': stat.st_mtime}
+            self.assets[asset_id] = {
+                'asset_id': asset_id,
+                'name': os.path.basename(path),
+                'path': path,
+                'size': stat.st_size,
+                'width': info.get('width'),
+                'height': info.get('height'),
+                'fps': info.get('fps'),
+                'duration': info.get('duration')
+            }
+            self._save()
+        if not path.lower().endswith(IMAGE_EXTENSIONS):
+            get_loudness_analyzer().analyze(path)
+        return asset_id
+
+    def scan(self):
+        """Register every media file under the library root; returns the asset IDs"""
+        asset_ids = []
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                if name.lower().endswith(MEDIA_EXTENSIONS):
+                    asset_ids.append(self.register(os.path.join(directory, name)))
+        return asset_ids
+
+    def resolve(self, asset_id):
+        """Return the local path of an asset, or None if this host does not have it"""
+        with self.lock:
+            asset = self.assets.get(asset_id)
+        if asset and os.path.exists(asset['path']):
+            return asset['path']
+        return None
+
+    def describe(self, asset_id):
+        """Return the portable metadata of an asset (everything but the local path)"""
+        with self.lock:
+            asset = self.assets.get(asset_id)
+        if asset is None:
+            return None
+        return {k: v for k, v in asset.items() if k != 'path'}
+
+    def list_assets(self):
+        """Return the portable metadata of every asset present on this host"""
+        with self.lock:
+            asset_ids = list(self.assets)
+        return [self.describe(a) for a in asset_ids if self.resolve(a)]
@@ -0,0 +1,166 @@
+import json
+import os
+import re
+import time
+import threading
+from collections import deque
+
+# Matches "key=value" pairs in ffmpeg progress lines, e.g. "frame=  120 fps= 30 speed=1.00x"
+PROGRESS_PATTERN = re.compile(r"(\w+)=\s*(\S+)")
+
+# Number of samples kept in memory per series (about one hour at the default intervals);
+# the spool file keeps the whole session for export
+MAX_SAMPLES = 720
+
+
+def parse_progress_line(line):
+    """Parse an ffmpeg progress line into a dict of numeric encoder stats"""
+    stats = {}
+    for key, value in PROGRESS_PATTERN.findall(line):
+        if key in ("frame", "drop", "dup"):
+            try:
+                stats[key] = int(value)
+            except ValueError:
+                pass
+        elif key in ("fps", "q"):
+            try:
+                stats[key] = float(value)
+            except ValueError:
+                pass
+        elif key == "speed" and value.endswith("x"):
+            try:
+                stats["speed"] = float(value[:-1])
+            except ValueError:
+                pass
+        elif key == "bitrate" and value.endswith("kbits/s"):
+            try:
+                stats["bitrate_kbps"] = float(value[:-len("kbits/s")])
+            except ValueError:
+                pass
+        elif key in ("size", "Lsize") and value.endswith(("kB", "KiB")):
+            try:
+                stats["size_kb"] = float(value.rstrip("KkiB"))
+            except ValueError:
+                pass
+        elif key == "time":
+            media_time = parse_timestamp(value)
+            if media_time is not None:
+                stats["media_time"] = media_time
+    return stats
+
+
+def parse_timestamp(value):
+    """Convert an ffmpeg HH:MM:SS.ms timestamp to seconds"""
+    try:
+        hours, minutes, seconds = value.split(":")
+        return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    except ValueError:
+        return None
+
+
+class StreamMetrics:
+    """Thread-safe store of encoder stats and process resource samples for one stream"""
+
+    def __init__(self, max_samples=MAX_SAMPLES):
+        self.lock = threading.Lock()
+        self.encoder = deque(maxlen=max_samples)
+        self.resources = deque(maxlen=max_samples)
+        self.info = {}
+        self.spool = None
+        self.spool_path = None
+
+    def start_spool(self, path):
+        """Also append every sample to a file, so an export covers the whole session"""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with self.lock:
+            self.spool = open(path, "a")
+            self.spool_path = path
+
+    def _spool_sample(self, kind, sample):
+        """Append one sample to the spool file (caller holds the lock)"""
+        if self.spool:
+            self.spool.write(json.dumps(dict(sample, kind=kind), default=str) + "\n")
+
+    def add_encoder_sample(self, stats):
+        """Record parsed ffmpeg progress stats"""
+        if not stats:
+            return
+        sample = dict(stats, timestamp=time.time())
+        with self.lock:
+            self.encoder.append(sample)
+            self._spool_sample('encoder', sample)
+
+    def add_resource_sample(self, sample):
+        """Record a /proc resource sample"""
+        with self.lock:
+            self.resources.append(sample)
+            self._spool_sample('resources', sample)
+
+    def set_info(self, key, value):
+        """Record a per-session attribute such as the encoding profile"""
+        with self.lock:
+            self.info[key] = value
+
+    def latest_encoder(self):
+        """Return the most recent encoder sample, or an empty dict"""
+        with self.lock:
+            return dict(self.encoder[-1]) if self.encoder else {}
+
+    def latest_resources(self):
+        """Return the most recent resource sample per process label"""
+        latest = {}
+        with self.lock:
+            for sample in self.resources:
+                latest[sample['label']] = sample
+        return latest
+
+    def snapshot(self):
+        """Return copies of all stored series"""
+        with self.lock:
+            return {
+                'encoder': list(self.encoder),
+                'resources': list(self.resources),
+                'info': dict(self.info)
+            }
+
+    def session_snapshot(self):
+        """Every sample since the session started, read back from the spool file when there is one"""
+        with self.lock:
+            spool_path = self.spool_path
+            if self.spool:
+                self.spool.flush()
+            info = dict(self.info)
+        if spool_path is None:
+            return self.snapshot()
+
+        series = {'encoder': [], 'resources': []}
+        with open(spool_path) as f:
+            for line in f:
+                try:
+                    sample = json.loads(line)
+                except ValueError:
+                    # A line cut short by a crash mid-write
+                    continue
+                series[sample.pop('kind')].append(sample)
+        return dict(series, info=info)
+
+    def close_spool(self):
+        """Stop spooling and delete the spool file"""
+        with self.lock:
+            if self.spool is None:
+                return
+            self.spool.close()
+            try:
+                os.remove(self.spool_path)
+            except OSError:
+                pass
+            self.spool = None
+            self.spool_path = None
+
+    def clear(self):
+        """Drop all samples before a new session starts"""
+        self.close_spool()
+        with self.lock:
+            self.encoder.clear()
+            self.resources.clear()
+            self.info = {}
@@ -0,0 +1,192 @@
+import os
+import shutil
+import threading
+import time
+
+from PIL import Image, ImageDraw, ImageFont
+
+# Where rendered layers are written for the encoder to read
+OVERLAY_DIR = ".overlays"
+
+# Corner placements as overlay filter x:y expressions; M is the margin in pixels
+OVERLAY_POSITIONS = {
+    "top-left": "{m}:{m}",
+    "top-right": "W-w-{m}:{m}",
+    "bottom-left": "{m}:H-h-{m}",
+    "bottom-right": "W-w-{m}:H-h-{m}"
+}
+
+DEFAULT_CLOCK_FORMAT = "%H:%M:%S"
+
+# Layer sizes as a fraction of the output height
+TEXT_HEIGHT = 0.045
+LOGO_HEIGHT = 0.12
+MARGIN = 0.03
+
+# Fallback output height when the source geometry is unknown
+DEFAULT_FRAME_HEIGHT = 720
+
+FONT_CANDIDATES = ["DejaVuSans-Bold.ttf", "Arial Bold.ttf", "arialbd.ttf"]
+
+
+def load_font(size):
+    """Load a bold TrueType font, falling back to Pillow's built-in bitmap font"""
+    for name in FONT_CANDIDATES:
+        try:
+            return ImageFont.truetype(name, size)
+        except OSError:
+            continue
+    return ImageFont.load_default()
+
+
+def get_layer_content(layer, now=None):
+    """Return what a layer currently shows; the layer is re-rendered only when this changes"""
+    if layer['type'] == "clock":
+        return time.strftime(layer.get('format') or DEFAULT_CLOCK_FORMAT, time.localtime(now))
+    if layer['type'] == "logo":
+        path = layer.get('path')
+        return (path, os.path.getmtime(path)) if path and os.path.exists(path) else None
+    return layer.get('text') or None
+
+
+def render_text(text, frame_height, canvas_size=None):
+    """Render text on a translucent box; a fixed canvas keeps changing text the same size"""
+    font = load_font(max(12, int(frame_height * TEXT_HEIGHT)))
+    padding = max(4, int(frame_height * TEXT_HEIGHT * 0.3))
+
+    left, top, right, bottom = ImageDraw.Draw(Image.new("RGBA", (1, 1))).textbbox((0, 0), text, font=font)
+    if canvas_size is None:
+        # Leave room for wider glyphs in later renders, e.g. "11:11" becoming "00:00"
+        canvas_size = (int((right - left) * 1.15) + 2 * padding, (bottom - top) + 2 * padding)
+
+    image = Image.new("RGBA", canvas_size, (0, 0, 0, 140))
+    x = (canvas_size[0] - (right - left)) // 2 - left
+    y = (canvas_size[1] - (bottom - top)) // 2 - top
+    ImageDraw.Draw(image).text((x, y), text, font=font, fill=(255, 255, 255, 255))
+    return image
+
+
+def render_logo(path, frame_height):
+    """Scale a logo image to the layer height, keeping its alpha channel"""
+    with Image.open(path) as source:
+        logo = source.convert("RGBA")
+    height = max(8, int(frame_height * LOGO_HEIGHT))
+    width = max(8, int(logo.width * height / logo.height))
+    return logo.resize((width, height), Image.LANCZOS)
+
+
+class OverlayRenderer:
+    """Renders overlay layers to cached RGBA images that the encoder composites
+
+    Each layer is a PNG read by the encoder through a looping 1 fps image input, so the
+    encoder only blends a small pre-rendered image per frame instead of drawing text.
+    Layers are re-rendered when their content changes (once per second for a clock) and
+    replaced atomically so the encoder never reads a partial file.
+    """
+
+    def __init__(self, layers, frame_height, directory=OVERLAY_DIR, metrics=None):
+        self.layers = [dict(layer) for layer in layers if get_layer_content(layer) is not None]
+        self.frame_height = frame_height or DEFAULT_FRAME_HEIGHT
+        self.directory = directory
+        self.metrics = metrics
+        self.contents = {}
+        self.sizes = {}
+        self.renders = 0
+        self.render_seconds = 0.0
+        self.last_render_ms = None
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def prepare(self):
+        """Render every layer once before the encoder starts"""
+        os.makedirs(self.directory, exist_ok=True)
+        for index, layer in enumerate(self.layers):
+            layer['file'] = os.path.join(self.directory, f"layer{index}_{layer['type']}.png")
+            self._render(index, layer)
+        self._record_cost()
+
+    def input_args(self):
+        """Encoder input arguments, one looping image input per layer"""
+        args = []
+        for layer in self.layers:
+            args += ["-framerate", "1", "-loop", "1", "-i", layer['file']]
+        return args
+
+    def build_filter(self, base_label, output_label, first_input):
+        """Chain one overlay per layer onto ``base_label``; returns a filter_complex fragment"""
+        margin = max(2, int(self.frame_height * MARGIN))
+        chain = []
+        current = base_label
+        for i, layer in enumerate(self.layers):
+            position = OVERLAY_POSITIONS.get(layer.get('position'), OVERLAY_POSITIONS["top-right"])
+            label = output_label if i == len(self.layers) - 1 else f"{output_label}_ov{i}"
+            chain.append(
+                f"[{current}][{first_input + i}:v]overlay={position.format(m=margin)}"
+                f":format=auto:eof_action=repeat[{label}]"
+            )
+            current = label
+        return ";".join(chain)
+
+    def start(self):
+        """Start refreshing layers whose content changes over time"""
+        if not any(layer['type'] == "clock" for layer in self.layers):
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop refreshing layers"""
+        self.stop_event.set()
+
+    def cleanup(self):
+        """Stop refreshing and remove the rendered layer files"""
+        self.stop()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _run(self):
+        """Re-render changed layers just after each second boundary"""
+        while not self.stop_event.wait(1.0 - time.time() % 1.0 + 0.01):
+            changed = False
+            for index, layer in enumerate(self.layers):
+                if get_layer_content(layer) != self.contents.get(index):
+                    self._render(index, layer)
+                    changed = True
+            if changed:
+                self._record_cost()
+
+    def _render(self, index, layer):
+        """Render one layer and atomically replace its image file"""
+        started = time.perf_counter()
+        content = get_layer_content(layer)
+        if layer['type'] == "logo":
+            image = render_logo(layer['path'], self.frame_height)
+        else:
+            image = render_text(content, self.frame_height, self.sizes.get(index))
+
+        temporary = layer['file'] + ".tmp"
+        image.save(temporary, format="PNG", compress_level=1)
+        os.replace(temporary, layer['file'])
+
+        self.contents[index] = content
+        self.sizes[index] = image.size
+        elapsed = time.perf_counter() - started
+        self.renders += 1
+        self.render_seconds += elapsed
+        self.last_render_ms = elapsed * 1000
+
+    def get_cost(self):
+        """Rendering cost and the number of pixels the encoder blends per frame"""
+        blended = sum(width * height for width, height in self.sizes.values())
+        return {
+            'layers': [layer['type'] for layer in self.layers],
+            'renders': self.renders,
+            'avg_render_ms': self.render_seconds * 1000 / self.renders if self.renders else None,
+            'last_render_ms': self.last_render_ms,
+            'blended_pixels_per_frame': blended
+        }
+
+    def _record_cost(self):
+        """Publish the overlay cost with the encoder metrics"""
+        if self.metrics is not None:
+            self.metrics.set_info('overlays', self.get_cost())
@@ -0,0 +1,162 @@
+"""Input pacing options and the drift monitor
+
+Pacing is set once, when ffmpeg starts: ffmpeg cannot change -re or -readrate on a
+running process. Drift is measured and reported, and sustained drift marks the stream
+degraded, but it is not fed back into the read rate. The only live correction is
+ffmpeg's own -readrate_catchup, which bounds how fast a stream that fell behind reads
+to catch up.
+"""
+import bisect
+import subprocess
+import threading
+import time
+from collections import deque
+
+# How input reading is paced: ffmpeg's -re, or -readrate with a bounded catch-up speed
+PACING_MODES = {
+    "re": "Real-time (-re)",
+    "readrate": "Read Rate with Gradual Catch-up"
+}
+DEFAULT_PACING = "re"
+
+# Seconds of input read at full speed on start, so the encoder's lookahead fills at once
+READRATE_INITIAL_BURST = 0.5
+
+# Highest input speed while behind the wall clock; -re instead reads as fast as it can,
+# which reaches the ingest as a burst
+READRATE_CATCHUP = 1.05
+
+# Drift beyond which a stream is reported as degraded, and the consecutive progress
+# samples it must stay there; it recovers once drift falls below half the threshold
+DRIFT_THRESHOLD = 1.0
+DRIFT_SAMPLES = 5
+
+# Histogram bucket edges in milliseconds; drift is signed (positive = media ahead of
+# the wall clock), jitter is the absolute deviation of one progress interval
+DRIFT_BUCKETS_MS = (-2000, -1000, -500, -250, -100, -50, 50, 100, 250, 500, 1000, 2000)
+JITTER_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000)
+
+# Recent jitter values kept for percentiles
+JITTER_WINDOW = 600
+
+_ffmpeg_options = None
+_ffmpeg_options_lock = threading.Lock()
+
+
+def get_ffmpeg_options():
+    """Names of the options the installed ffmpeg accepts, probed once"""
+    global _ffmpeg_options
+    with _ffmpeg_options_lock:
+        if _ffmpeg_options is None:
+            try:
+                output = subprocess.run(
+                    ["ffmpeg", "-hide_banner", "-h", "long"],
+                    stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True
+                ).stdout
+            except OSError:
+                output = ""
+            _ffmpeg_options = {
+                line.split()[0] for line in output.splitlines() if line.startswith("-")
+            }
+        return _ffmpeg_options
+
+
+def get_pacing_args(mode=DEFAULT_PACING, readrate=1.0):
+    """Input options that pace reading at ``readrate`` times real time
+
+    Falls back to -re when the installed ffmpeg has no -readrate (before 5.0); the
+    initial burst (6.1) and catch-up limit (7.1) are added when available.
+    """
+    options = get_ffmpeg_options()
+    if mode != "readrate" or "-readrate" not in options:
+        return ["-re"]
+
+    args = ["-readrate", f"{readrate:g}"]
+    if "-readrate_initial_burst" in options:
+        args += ["-readrate_initial_burst", f"{READRATE_INITIAL_BURST:g}"]
+    if "-readrate_catchup" in options:
+        args += ["-readrate_catchup", f"{READRATE_CATCHUP:g}"]
+    return args
+
+
+class Histogram:
+    """Counts of values between fixed bucket edges"""
+
+    def __init__(self, edges):
+        self.edges = edges
+        self.counts = [0] * (len(edges) + 1)
+
+    def add(self, value):
+        self.counts[bisect.bisect_right(self.edges, value)] += 1
+
+    def to_dict(self):
+        """Bucket labels mapped to counts, lowest bucket first"""
+        labels = [f"< {self.edges[0]}"]
+        labels += [f"{low} to {high}" for low, high in zip(self.edges, self.edges[1:])]
+        labels.append(f">= {self.edges[-1]}")
+        return dict(zip(labels, self.counts))
+
+
+class PacingMonitor:
+    """Tracks how far output media time runs ahead of or behind the wall clock
+
+    Drift is measured from the first progress sample: media seconds produced minus
+    wall seconds elapsed. Jitter is the same difference over a single progress
+    interval, which shows bursts and stalls that cancel out in the drift.
+    """
+
+    def __init__(self, metrics, threshold=DRIFT_THRESHOLD):
+        self.metrics = metrics
+        self.threshold = threshold
+        self.anchor = None
+        self.last = None
+        self.drift = 0.0
+        self.max_abs_drift = 0.0
+        self.over_threshold = 0
+        self.drift_histogram = Histogram(DRIFT_BUCKETS_MS)
+        self.jitter_histogram = Histogram(JITTER_BUCKETS_MS)
+        self.jitters = deque(maxlen=JITTER_WINDOW)
+
+    def add_sample(self, stats, now=None):
+        """Track a parsed progress sample; returns the current drift in seconds, or None"""
+        media_time = stats.get('media_time')
+        if media_time is None:
+            return None
+        now = time.monotonic() if now is None else now
+        if self.anchor is None:
+            self.anchor = self.last = (now, media_time)
+            return 0.0
+
+        self.drift = (media_time - self.anchor[1]) - (now - self.anchor[0])
+        jitter = abs((media_time - self.last[1]) - (now - self.last[0]))
+        self.last = (now, media_time)
+
+        self.max_abs_drift = max(self.max_abs_drift, abs(self.drift))
+        self.over_threshold = self.over_threshold + 1 if abs(self.drift) > self.threshold else 0
+        self.drift_histogram.add(self.drift * 1000)
+        self.jitter_histogram.add(jitter * 1000)
+        self.jitters.append(jitter)
+        self.metrics.set_info('pacing', self.get_report(now))
+        return self.drift
+
+    def is_drifting(self):
+        """Whether drift has stayed beyond the threshold for enough samples"""
+        return self.over_threshold >= DRIFT_SAMPLES
+
+    def is_settled(self):
+        """Whether drift is back well within the threshold"""
+        return abs(self.drift) < self.threshold / 2
+
+    def get_report(self, now=None):
+        """Drift, drift rate, jitter percentile and both histograms"""
+        now = time.monotonic() if now is None else now
+        elapsed_minutes = (now - self.anchor[0]) / 60 if self.anchor else 0
+        jitters = sorted(self.jitters)
+        return {
+            'drift_ms': round(self.drift * 1000, 1),
+            'max_abs_drift_ms': round(self.max_abs_drift * 1000, 1),
+            'drift_ms_per_minute': round(self.drift * 1000 / elapsed_minutes, 1) if elapsed_minutes else None,
+            'jitter_p95_ms': round(jitters[int(len(jitters) * 0.95)] * 1000, 1) if jitters else None,
+            'drift_histogram': self.drift_histogram.to_dict(),
+            'jitter_histogram': self.jitter_histogram.to_dict()
+        }
@@ -0,0 +1,197 @@
+import os
+import math
+import shutil
+import subprocess
+import threading
+
+# Relative x264 cost of each preset compared to "fast"
+PRESET_COST = {
+    "ultrafast": 0.35,
+    "superfast": 0.5,
+    "veryfast": 0.7,
+    "faster": 0.85,
+    "fast": 1.0,
+    "medium": 1.25
+}
+
+# Scheduling class per stream: (nice increment, ionice class, ionice level)
+# ionice classes: 2 = best-effort, 3 = idle
+STREAM_CLASSES = {
+    "priority": (0, 2, 0),
+    "standard": (5, 2, 4),
+    "background": (10, 3, 7)
+}
+
+# Pixel count of a 1080p frame, used as the unit for resolution weight
+REFERENCE_PIXELS = 1920 * 1080
+
+# x264 stops scaling well beyond this many threads for one live encode
+MAX_THREADS_PER_STREAM = 16
+
+# Cores a weight-1.0 stream (1080p at the "fast" preset) needs to keep real time
+CORES_PER_WEIGHT = 4
+
+
+def get_available_cores():
+    """Return the list of CPU cores this process is allowed to run on"""
+    if hasattr(os, 'sched_getaffinity'):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def estimate_stream_weight(width, height, preset):
+    """Estimate the relative CPU weight of an encode from its output size and preset"""
+    pixels = (width or 1280) * (height or 720)
+    return max(pixels / REFERENCE_PIXELS, 0.1) * PRESET_COST.get(preset, 1.0)
+
+
+class CpuPlacer:
+    """Assigns core sets, thread budgets and priorities to concurrent ffmpeg encodes"""
+
+    def __init__(self, cores=None):
+        self.cores = cores or get_available_cores()
+        self.streams = {}
+        self.lock = threading.Lock()
+
+    def register(self, stream_id, width, height, preset, stream_class="standard", extra_outputs=None):
+        """Register a new stream and return its placement (cores, threads, nice, ionice)
+
+        ``extra_outputs`` lists (width, height, preset) for additional renditions encoded
+        by the same process, which add to the stream's weight.
+        """
+        weight = estimate_stream_weight(width, height, preset)
+        for extra_width, extra_height, extra_preset in extra_outputs or []:
+            weight += estimate_stream_weight(extra_width, extra_height, extra_preset)
+
+        with self.lock:
+            self.streams[stream_id] = {
+                'weight': weight,
+                'class': stream_class if stream_class in STREAM_CLASSES else "standard",
+                'pid': None,
+                'cores': [],
+                'threads': 1
+            }
+            self._rebalance()
+            # Thread count is fixed when ffmpeg starts, so size it once from the initial share
+            entry = self.streams[stream_id]
+            entry['threads'] = self._thread_budget(entry)
+            placement = self._placement(stream_id)
+            running = [(e['pid'], list(e['cores'])) for e in self.streams.values() if e['pid']]
+
+        # Move the running encoders off the cores the new stream was given
+        for pid, cores in running:
+            self._apply_affinity(pid, cores)
+        return placement
+
+    def attach(self, stream_id, pid):
+        """Bind a running process to its placement and apply affinity, CPU and I/O priority
+
+        Everything is applied from this process after the child started: running Python
+        between fork and exec (``preexec_fn``) can deadlock in a threaded process.
+        """
+        with self.lock:
+            entry = self.streams.get(stream_id)
+            if entry is None:
+                return
+            entry['pid'] = pid
+            cores = list(entry['cores'])
+            nice, io_class, io_level = STREAM_CLASSES[entry['class']]
+
+        self._apply_affinity(pid, cores)
+
+        if nice and hasattr(os, 'setpriority'):
+            try:
+                # The child inherited this process's niceness; the increment is on top of it
+                os.setpriority(os.PRIO_PROCESS, pid, os.getpriority(os.PRIO_PROCESS, 0) + nice)
+            except OSError:
+                pass
+
+        if shutil.which("ionice"):
+            subprocess.run(
+                ["ionice", "-c", str(io_class), "-n", str(io_level), "-p", str(pid)],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL
+            )
+
+    def release(self, stream_id):
+        """Remove a stream and hand its cores back to the remaining streams"""
+        with self.lock:
+            if self.streams.pop(stream_id, None) is None:
+                return
+            self._rebalance()
+            running = [(e['pid'], list(e['cores'])) for e in self.streams.values() if e['pid']]
+
+        for pid, cores in running:
+            self._apply_affinity(pid, cores)
+
+    def get_placement(self, stream_id):
+        """Return the current placement for a stream, or None if it is not registered"""
+        with self.lock:
+            if stream_id not in self.streams:
+                return None
+            return self._placement(stream_id)
+
+    def get_capacity(self):
+        """Return total, used and free encode capacity in stream-weight units"""
+        with self.lock:
+            used = sum(e['weight'] for e in self.streams.values())
+            total = len(self.cores) / CORES_PER_WEIGHT
+            return {'total': total, 'used': used, 'free': max(0.0, total - used), 'streams': len(self.streams)}
+
+    def _placement(self, stream_id):
+        """Build the placement dict for a stream (caller holds the lock)"""
+        entry = self.streams[stream_id]
+        nice, io_class, io_level = STREAM_CLASSES[entry['class']]
+        return {
+            'cores': list(entry['cores']),
+            'threads': entry['threads'],
+            'nice': nice,
+            'ionice': (io_class, io_level),
+            'class': entry['class']
+        }
+
+    def _thread_budget(self, entry):
+        """Size the x264 thread count to the stream's core share and weight"""
+        by_weight = math.ceil(entry['weight'] * 6)
+        return max(1, min(len(entry['cores']), by_weight, MAX_THREADS_PER_STREAM))
+
+    def _rebalance(self):
+        """Split the cores between streams proportionally to their weight (caller holds the lock)"""
+        if not self.streams:
+            return
+
+        total_cores = len(self.cores)
+        total_weight = sum(e['weight'] for e in self.streams.values())
+
+        # Heaviest streams first so they get contiguous, non-shared cores
+        ordered = sorted(self.streams.items(), key=lambda item: item[1]['weight'], reverse=True)
+
+        start = 0
+        for stream_id, entry in ordered:
+            share = max(1, int(round(total_cores * entry['weight'] / total_weight)))
+            share = min(share, total_cores)
+            # Wrap around when there are more streams than cores so load is spread evenly
+            entry['cores'] = [self.cores[(start + i) % total_cores] for i in range(share)]
+            start = (start + share) % total_cores
+
+    def _apply_affinity(self, pid, cores):
+        """Pin a running process to a core set, ignoring processes that already exited"""
+        if not cores or not hasattr(os, 'sched_setaffinity'):
+            return
+        try:
+            os.sched_setaffinity(pid, cores)
+        except (ProcessLookupError, PermissionError, OSError):
+            pass
+
+
+_placer = None
+_placer_lock = threading.Lock()
+
+
+def get_cpu_placer():
+    """Return the process-wide CPU placer shared by all streaming sessions"""
+    global _placer
+    with _placer_lock:
+        if _placer is None:
+            _placer = CpuPlacer()
+        return _placer
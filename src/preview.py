@@ -0,0 +1,72 @@
+import os
+
+# Short clips of the outgoing picture, per session
+PREVIEW_DIR = ".preview"
+
+# The preview is a small extra encode of the already decoded, filtered and overlaid
+# primary picture; at this size and rate it costs a few percent of the main encode
+PREVIEW_HEIGHT = 240
+PREVIEW_FPS = 10
+PREVIEW_BITRATE = "200k"
+PREVIEW_AUDIO_BITRATE = "48k"
+
+# Each clip is a complete MP4 the dashboard can play; only the last few are kept
+PREVIEW_CLIP_SECONDS = 4
+PREVIEW_CLIPS = 3
+
+SEGMENT_LIST = "clips.csv"
+
+# Output size used when placing the preview encode on CPU cores
+PREVIEW_SIZE = (426, PREVIEW_HEIGHT)
+
+
+def get_preview_dir(stream_id, directory=PREVIEW_DIR):
+    """Preview clip directory of one session"""
+    return os.path.join(directory, stream_id)
+
+
+def build_preview_filter(source_label, main_label, preview_label):
+    """Split the primary picture and shrink one copy for the preview"""
+    return (
+        f"[{source_label}]split[{main_label}][{preview_label}_full];"
+        f"[{preview_label}_full]fps={PREVIEW_FPS},scale=-2:{PREVIEW_HEIGHT}:flags=fast_bilinear,"
+        f"format=yuv420p[{preview_label}]"
+    )
+
+
+def build_preview_output(preview_label, preview_dir, audio_filter=None):
+    """Output options for the preview: low-bitrate H.264 clips written as a rolling set of MP4s"""
+    os.makedirs(preview_dir, exist_ok=True)
+    gop = PREVIEW_FPS * PREVIEW_CLIP_SECONDS
+    args = [
+        "-map", f"[{preview_label}]", "-map", "0:a?",
+        "-c:v", "libx264", "-preset", "ultrafast", "-tune", "zerolatency",
+        "-b:v", PREVIEW_BITRATE, "-maxrate", PREVIEW_BITRATE, "-bufsize", PREVIEW_BITRATE,
+        "-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0", "-threads", "1"
+    ]
+    if audio_filter:
+        args += ["-af", audio_filter]
+    args += [
+        "-c:a", "aac", "-b:a", PREVIEW_AUDIO_BITRATE, "-ac", "1",
+        "-f", "segment", "-segment_time", str(PREVIEW_CLIP_SECONDS),
+        "-segment_format", "mp4", "-segment_format_options", "movflags=+faststart",
+        # One more slot than listed clips, so the clip being written is never listed
+        "-segment_wrap", str(PREVIEW_CLIPS + 1), "-reset_timestamps", "1",
+        "-segment_list", os.path.join(preview_dir, SEGMENT_LIST), "-segment_list_type", "csv",
+        "-segment_list_size", str(PREVIEW_CLIPS),
+        os.path.join(preview_dir, "clip%d.mp4")
+    ]
+    return args
+
+
+def get_latest_clip(preview_dir):
+    """Path of the newest finished preview clip, or None"""
+    try:
+        with open(os.path.join(preview_dir, SEGMENT_LIST)) as f:
+            lines = [line for line in f.read().splitlines() if line.strip()]
+    except OSError:
+        return None
+    if not lines:
+        return None
+    path = os.path.join(preview_dir, lines[-1].split(",")[0])
+    return path if os.path.exists(path) else None
@@ -0,0 +1,96 @@
+import subprocess
+import threading
+
+# Seconds before a scheduled start at which the input stage is spun up
+DEFAULT_PREWARM_LEAD = 15
+
+# Demuxed packets buffered in memory before the scheduled start
+DEFAULT_PREBUFFER_BYTES = 8 * 1024 * 1024
+
+CHUNK_SIZE = 64 * 1024
+
+# Encoder input arguments when it is fed by a pre-warmed input stage, after the pacing options
+RELAY_INPUT_ARGS = ["-f", "nut", "-i", "pipe:0"]
+
+
+class PrewarmedInput:
+    """Input stage started ahead of a scheduled stream
+
+    A separate ffmpeg process opens, probes and loops the source file and remuxes it
+    (without re-encoding) to NUT on stdout. The first ``prebuffer_bytes`` are held in
+    memory; at the scheduled moment they are flushed into the encoder's stdin and the
+    rest of the stream is relayed as it is produced. The encoder blocks while probing an
+    empty pipe, so its pacing clock only starts once publishing begins.
+    """
+
+    def __init__(self, video_path, prebuffer_bytes=DEFAULT_PREBUFFER_BYTES):
+        self.video_path = video_path
+        self.prebuffer_bytes = prebuffer_bytes
+        self.process = None
+        self.buffer = []
+        self.buffered = 0
+        self.ready = threading.Event()
+        self.publishing = threading.Event()
+        self.fill_thread = None
+        self.relay_thread = None
+
+    def start(self):
+        """Spawn the input stage and start pre-buffering"""
+        cmd = [
+            "ffmpeg", "-v", "error", "-stream_loop", "-1", "-i", self.video_path,
+            "-c", "copy", "-f", "nut", "pipe:1"
+        ]
+        self.process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        self.fill_thread = threading.Thread(target=self._fill, daemon=True)
+        self.fill_thread.start()
+
+    def _fill(self):
+        """Read until the pre-buffer is full, then let pipe backpressure stall the stage"""
+        while self.buffered < self.prebuffer_bytes and not self.publishing.is_set():
+            chunk = self.process.stdout.read1(CHUNK_SIZE)
+            if not chunk:
+                break
+            self.buffer.append(chunk)
+            self.buffered += len(chunk)
+        self.ready.set()
+
+    def wait_ready(self, timeout=None):
+        """Wait until the pre-buffer is full; returns False on timeout"""
+        return self.ready.wait(timeout)
+
+    def relay_to(self, sink):
+        """Flush the pre-buffer into the encoder and keep relaying in the background"""
+        self.publishing.set()
+        self.relay_thread = threading.Thread(target=self._relay, args=(sink,), daemon=True)
+        self.relay_thread.start()
+
+    def _relay(self, sink):
+        """Copy pre-buffered and live packets from the input stage to the encoder"""
+        self.fill_thread.join()
+        try:
+            for chunk in self.buffer:
+                sink.write(chunk)
+            self.buffer = []
+            sink.flush()
+
+            while True:
+                chunk = self.process.stdout.read1(CHUNK_SIZE)
+                if not chunk:
+                    break
+                sink.write(chunk)
+                sink.flush()
+        except (BrokenPipeError, ValueError, OSError):
+            # The encoder exited; the input stage is stopped by the caller
+            pass
+        finally:
+            try:
+                sink.close()
+            except (BrokenPipeError, OSError):
+                pass
+
+    def stop(self):
+        """Stop the input stage"""
+        self.publishing.set()
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+            self.process.wait()
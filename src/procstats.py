@@ -0,0 +1,125 @@
+import os
+import time
+import threading
+
+# Clock ticks per second and page size, used to convert /proc counters
+CLOCK_TICKS = os.sysconf("SC_CLK_TCK") if hasattr(os, 'sysconf') else 100
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, 'sysconf') else 4096
+
+DEFAULT_SAMPLE_INTERVAL = 5.0
+
+
+def read_proc_stats(pid):
+    """Read CPU, memory, I/O and context switch counters for a process from /proc"""
+    base = f"/proc/{pid}"
+    try:
+        with open(f"{base}/stat") as f:
+            stat = f.read()
+    except OSError:
+        return None
+
+    # The command name may contain spaces, so split after the closing parenthesis
+    fields = stat[stat.rfind(")") + 2:].split()
+    stats = {
+        'pid': pid,
+        'cpu_seconds': (int(fields[11]) + int(fields[12])) / CLOCK_TICKS,
+        'rss_bytes': int(fields[21]) * PAGE_SIZE,
+        'num_threads': int(fields[17])
+    }
+
+    try:
+        with open(f"{base}/status") as f:
+            for line in f:
+                if line.startswith("voluntary_ctxt_switches:"):
+                    stats['voluntary_ctxt_switches'] = int(line.split()[1])
+                elif line.startswith("nonvoluntary_ctxt_switches:"):
+                    stats['involuntary_ctxt_switches'] = int(line.split()[1])
+    except OSError:
+        pass
+
+    # /proc/<pid>/io needs ptrace access, which we have for our own children
+    try:
+        with open(f"{base}/io") as f:
+            for line in f:
+                key, _, value = line.partition(":")
+                if key in ("read_bytes", "write_bytes", "rchar", "wchar"):
+                    stats[key] = int(value)
+    except OSError:
+        pass
+
+    return stats
+
+
+class ProcessSampler:
+    """Background thread that samples /proc stats for every process a stream owns"""
+
+    def __init__(self, metrics, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.metrics = metrics
+        self.interval = max(float(interval), 0.5)
+        self.pids = {}
+        self.previous = {}
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def add(self, label, pid):
+        """Start sampling a process under the given label"""
+        with self.lock:
+            self.pids[label] = pid
+            self.previous.pop(label, None)
+
+    def remove(self, label):
+        """Stop sampling a process"""
+        with self.lock:
+            self.pids.pop(label, None)
+            self.previous.pop(label, None)
+
+    def start(self):
+        """Start the sampling thread"""
+        if self.thread and self.thread.is_alive():
+            return
+        self.stop_event.clear()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stop the sampling thread after taking a final sample"""
+        self.sample_once()
+        self.stop_event.set()
+
+    def sample_once(self):
+        """Take one sample of every tracked process"""
+        with self.lock:
+            tracked = list(self.pids.items())
+
+        now = time.time()
+        for label, pid in tracked:
+            stats = read_proc_stats(pid)
+            if stats is None:
+                continue
+
+            stats['label'] = label
+            stats['timestamp'] = now
+
+            # rchar counts every byte read, read_bytes only those fetched from storage;
+            # the difference was served from the page cache (or a pipe)
+            if 'rchar' in stats and 'read_bytes' in stats:
+                stats['cache_read_bytes'] = max(0, stats['rchar'] - stats['read_bytes'])
+
+            # Derive CPU utilisation from the delta since the previous sample; skip
+            # processes that were removed or replaced while /proc was being read
+            with self.lock:
+                if self.pids.get(label) != pid:
+                    continue
+                previous = self.previous.get(label)
+                self.previous[label] = stats
+            if previous and now > previous['timestamp']:
+                elapsed = now - previous['timestamp']
+                stats['cpu_percent'] = 100 * (stats['cpu_seconds'] - previous['cpu_seconds']) / elapsed
+
+            self.metrics.add_resource_sample(stats)
+
+    def _run(self):
+        """Sample until stopped"""
+        while not self.stop_event.wait(self.interval):
+            self.sample_once()
@@ -0,0 +1,201 @@
+import cProfile
+import functools
+import io
+import marshal
+import os
+import pstats
+import threading
+import time
+from collections import deque
+
+# Reruns kept for percentiles and the slowest-rerun list
+ROLLING_WINDOW = 200
+SLOWEST_RERUNS = 10
+
+# Functions timed besides every render_* function
+EXTRA_SECTIONS = ('apply_custom_styles', 'check_dependencies')
+
+# Rows of the cProfile summary shown next to the download
+PROFILE_SUMMARY_ROWS = 25
+
+# Start with timing on, e.g. to measure the first reruns after a deploy
+PROFILE_ENV = "STREAMHUB_PROFILE"
+
+
+def percentile(values, q):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * q))]
+
+
+class RenderProfiler:
+    """Times render functions per rerun, and captures a cProfile of a single rerun
+
+    When enabled, each timed function in the given namespaces is replaced by a wrapper
+    that adds its wall time to the current rerun; nested render calls go through the
+    module globals too, so their times are inclusive. When disabled the original
+    functions are put back, and a rerun costs two attribute checks.
+    """
+
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.wrappers = {}
+        self.instrumented = {}
+        self.reruns = deque(maxlen=ROLLING_WINDOW)
+        self.fragments = {}
+
+    def apply(self, *namespaces):
+        """Wrap or restore the timed functions in module namespaces to match ``enabled``"""
+        if self.enabled:
+            for namespace in namespaces:
+                for name, value in list(namespace.items()):
+                    if callable(value) and (name.startswith("render_") or name in EXTRA_SECTIONS):
+                        if not getattr(value, '__profiled__', False):
+                            namespace[name] = self._wrap(name, value)
+                # Keyed by module name: the app script gets a fresh namespace every rerun
+                self.instrumented[namespace.get('__name__')] = namespace
+        elif self.instrumented:
+            for namespace in self.instrumented.values():
+                for name, value in list(namespace.items()):
+                    if getattr(value, '__profiled__', False):
+                        namespace[name] = value.__wrapped__
+            self.instrumented = {}
+
+    def _wrap(self, name, func):
+        """Timing wrapper for a function, created once per function"""
+        if func not in self.wrappers:
+            @functools.wraps(func)
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    self._record(name, (time.perf_counter() - start) * 1000)
+
+            timed.__profiled__ = True
+            self.wrappers[func] = timed
+        return self.wrappers[func]
+
+    def _record(self, name, ms):
+        """Add a timing to the rerun running on this thread"""
+        rerun = getattr(self.local, 'rerun', None)
+        if rerun is not None:
+            rerun['sections'][name] = rerun['sections'].get(name, 0.0) + ms
+        else:
+            # Fragments rerun on their own, outside a full rerun
+            with self.lock:
+                self.fragments.setdefault(name, deque(maxlen=ROLLING_WINDOW)).append(ms)
+
+    def begin_rerun(self, capture=False):
+        """Start timing a rerun on this thread, optionally under cProfile"""
+        if not (self.enabled or capture):
+            self.local.rerun = None
+            return
+        rerun = {'timestamp': time.time(), 'start': time.perf_counter(), 'sections': {}, 'profile': None}
+        if capture:
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+                rerun['profile'] = profile
+            except ValueError:
+                # Another session's capture holds the interpreter's profiler
+                rerun['profile_error'] = "another capture is running; try again"
+        self.local.rerun = rerun
+
+    def end_rerun(self):
+        """Finish this thread's rerun; returns a cProfile capture if one was taken, else None"""
+        rerun = getattr(self.local, 'rerun', None)
+        self.local.rerun = None
+        if rerun is None:
+            return None
+
+        capture = None
+        if rerun['profile']:
+            rerun['profile'].disable()
+            capture = self._build_capture(rerun['profile'])
+        elif 'profile_error' in rerun:
+            capture = {'error': rerun['profile_error']}
+
+        if self.enabled:
+            with self.lock:
+                self.reruns.append({
+                    'timestamp': rerun['timestamp'],
+                    'total_ms': (time.perf_counter() - rerun['start']) * 1000,
+                    'sections': rerun['sections']
+                })
+        return capture
+
+    def _build_capture(self, profile):
+        """Stats file contents and a text summary of a finished profile"""
+        summary = io.StringIO()
+        stats = pstats.Stats(profile, stream=summary)
+        stats.sort_stats("cumulative").print_stats(PROFILE_SUMMARY_ROWS)
+        return {
+            'timestamp': time.time(),
+            # The same bytes pstats.dump_stats writes, loadable with pstats or snakeviz
+            'stats': marshal.dumps(stats.stats),
+            'summary': summary.getvalue()
+        }
+
+    def get_section_stats(self):
+        """Per-function rerun count, p50, p95 and max in milliseconds, slowest p95 first"""
+        with self.lock:
+            reruns = list(self.reruns)
+            fragments = {name: list(values) for name, values in self.fragments.items()}
+
+        timings = {}
+        for rerun in reruns:
+            timings.setdefault('(whole rerun)', []).append(rerun['total_ms'])
+            for name, ms in rerun['sections'].items():
+                timings.setdefault(name, []).append(ms)
+        for name, values in fragments.items():
+            timings.setdefault(f"{name} (fragment)", []).extend(values)
+
+        stats = [
+            {
+                'section': name,
+                'calls': len(values),
+                'p50_ms': round(percentile(values, 0.5), 2),
+                'p95_ms': round(percentile(values, 0.95), 2),
+                'max_ms': round(max(values), 2)
+            }
+            for name, values in timings.items()
+        ]
+        return sorted(stats, key=lambda s: s['p95_ms'], reverse=True)
+
+    def get_slowest_reruns(self, count=SLOWEST_RERUNS):
+        """The slowest recent reruns with their three costliest sections"""
+        with self.lock:
+            reruns = sorted(self.reruns, key=lambda r: r['total_ms'], reverse=True)[:count]
+        return [
+            {
+                'timestamp': rerun['timestamp'],
+                'total_ms': round(rerun['total_ms'], 1),
+                'top_sections': ", ".join(
+                    f"{name} {ms:.0f}ms"
+                    for name, ms in sorted(rerun['sections'].items(), key=lambda item: item[1], reverse=True)[:3]
+                )
+            }
+            for rerun in reruns
+        ]
+
+    def clear(self):
+        """Forget every timing"""
+        with self.lock:
+            self.reruns.clear()
+            self.fragments.clear()
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_render_profiler():
+    """Return the process-wide render profiler"""
+    global _profiler
+    with _profiler_lock:
+        if _profiler is None:
+            _profiler = RenderProfiler(enabled=os.environ.get(PROFILE_ENV) == "1")
+        return _profiler
@@ -0,0 +1,81 @@
+import math
+
+# Encoding profiles: target keyframe interval in seconds and latency tuning
+ENCODING_PROFILES = {
+    "normal": {
+        'label': "Normal",
+        'keyframe_interval': 2.0,
+        'low_latency': False
+    },
+    "low_latency": {
+        'label': "Low Latency",
+        'keyframe_interval': 1.0,
+        'low_latency': True
+    }
+}
+
+DEFAULT_PROFILE = "normal"
+
+# Frame rate assumed when the source could not be probed
+DEFAULT_FPS = 30
+
+
+def parse_bitrate_kbps(bitrate):
+    """Convert an ffmpeg bitrate string such as '2500k' to kbit/s"""
+    return int(str(bitrate).lower().replace('k', ''))
+
+
+def get_output_fps(source_fps, max_fps=None):
+    """Return the output frame rate after applying an optional cap"""
+    fps = source_fps or DEFAULT_FPS
+    if max_fps and fps > max_fps:
+        return max_fps
+    return fps
+
+
+def get_gop_size(fps, keyframe_interval):
+    """Derive the GOP length in frames from the frame rate and keyframe interval"""
+    return max(1, int(math.ceil(fps * keyframe_interval)))
+
+
+def build_video_encoding_args(profile_name, source_fps, bitrate, keyframe_interval=None, max_fps=None):
+    """Build the x264 rate control and GOP arguments for an encoding profile
+
+    Returns the argument list and a description of the applied profile for the metrics.
+    """
+    profile = ENCODING_PROFILES.get(profile_name, ENCODING_PROFILES[DEFAULT_PROFILE])
+    interval = keyframe_interval or profile['keyframe_interval']
+    fps = get_output_fps(source_fps, max_fps)
+    gop = get_gop_size(fps, interval)
+    kbps = parse_bitrate_kbps(bitrate)
+
+    args = []
+
+    if profile['low_latency']:
+        # Strict CBR with a one-second VBV so the ingest never sees bursts
+        args += [
+            "-tune", "zerolatency",
+            "-b:v", bitrate, "-minrate", bitrate, "-maxrate", bitrate,
+            "-bufsize", f"{kbps}k",
+            "-x264-params", "nal-hrd=cbr:force-cfr=1"
+        ]
+    else:
+        args += [
+            "-b:v", bitrate, "-maxrate", bitrate,
+            "-bufsize", f"{kbps * 2}k"
+        ]
+
+    # Fixed GOP: no scene-cut keyframes so the interval stays exact
+    args += ["-g", str(gop), "-keyint_min", str(gop), "-sc_threshold", "0"]
+
+    if max_fps and source_fps and source_fps > max_fps:
+        args += ["-r", str(max_fps)]
+
+    description = {
+        'profile': profile_name if profile_name in ENCODING_PROFILES else DEFAULT_PROFILE,
+        'keyframe_interval': interval,
+        'output_fps': fps,
+        'gop': gop,
+        'low_latency': profile['low_latency']
+    }
+    return args, description
@@ -0,0 +1,489 @@
+import argparse
+import hashlib
+import heapq
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from watchdog.events import FileSystemEventHandler
+from watchdog.observers import Observer
+
+from events import ACTIVE_STATES, get_event_bus
+from utils import get_video_info
+
+# Directory of stream definitions, one <name>.json per stream
+STREAMS_DIR = "streams"
+DEFINITION_SUFFIX = ".json"
+
+# Editors save in several writes; changes are applied once this long after the last event
+DEBOUNCE_SECONDS = 0.25
+
+# Stream starts and restarts across all definitions: a bucket of START_BURST refilled at
+# START_RATE per second, so a bulk edit does not launch hundreds of encoders at once
+START_RATE = 1.0
+START_BURST = 5
+
+# A stream that fails is restarted after a delay that doubles with each failure, from
+# RESTART_BACKOFF_MIN up to RESTART_BACKOFF_MAX; running STABLE_SECONDS resets it
+RESTART_BACKOFF_MIN = 5.0
+RESTART_BACKOFF_MAX = 300.0
+STABLE_SECONDS = 60.0
+
+# Recent reconciler actions kept for status views
+ACTION_HISTORY = 100
+
+# States in which a stream that should be running is not
+DOWN_STATES = ("failed", "stopped", "idle")
+
+# Definition keys that can change on a running hot-swap stream without a restart
+SWAPPABLE_KEYS = ('sources',)
+
+
+def parse_time(value):
+    """Parse an ISO 8601 time from a definition as naive local time; None stays None
+
+    Times with an offset (``...+02:00``) are converted, since the reconciler compares
+    them with ``datetime.now()``.
+    """
+    if not value:
+        return None
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone().replace(tzinfo=None)
+    return parsed
+
+
+def load_definition(path):
+    """Read a stream definition file into the spec the reconciler applies
+
+    ``source`` (one file) or ``playlist`` (several, rotated with hot swap) are resolved
+    relative to the definition file. ``destinations`` become extra renditions,
+    ``profile`` the encoding profile, and ``schedule`` may hold ISO ``start`` and
+    ``stop`` times. Anything else a stream accepts goes in ``config``.
+    """
+    with open(path) as f:
+        raw = json.load(f)
+    if not isinstance(raw, dict):
+        raise ValueError("a definition must be a JSON object")
+
+    sources = raw.get('playlist') or ([raw['source']] if raw.get('source') else [])
+    if not sources:
+        raise ValueError("a definition needs a 'source' or a 'playlist'")
+    if not raw.get('stream_key'):
+        raise ValueError("a definition needs a 'stream_key'")
+    base = os.path.dirname(os.path.abspath(path))
+
+    config = dict(raw.get('config', {}))
+    if raw.get('profile'):
+        config['encoding_profile'] = raw['profile']
+    if raw.get('destinations'):
+        config['renditions'] = list(raw['destinations'])
+    if len(sources) > 1:
+        config['hot_swap'] = True
+
+    schedule = raw.get('schedule') or {}
+    spec = {
+        'sources': [os.path.normpath(os.path.join(base, source)) for source in sources],
+        'stream_key': raw['stream_key'],
+        'config': config,
+        'start_at': parse_time(schedule.get('start')),
+        'stop_at': parse_time(schedule.get('stop'))
+    }
+    spec['digest'] = get_spec_digest(spec)
+    return spec
+
+
+def get_spec_digest(spec, exclude=()):
+    """Digest of a spec, optionally leaving some keys out"""
+    fields = {k: v for k, v in spec.items() if k != 'digest' and k not in exclude}
+    return hashlib.sha1(json.dumps(fields, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def write_definition(name, source, stream_key, config, directory=STREAMS_DIR):
+    """Save a stream as a definition file; the reconciler picks it up like any other edit"""
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, name + DEFINITION_SUFFIX)
+    definition = {'source': os.path.abspath(source), 'stream_key': stream_key, 'config': config}
+    with open(path + ".tmp", "w") as f:
+        json.dump(definition, f, indent=2)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+class StartLimiter:
+    """Token bucket for stream starts"""
+
+    def __init__(self, rate=START_RATE, burst=START_BURST):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def take(self, now):
+        """Take a token; returns 0 on success, else the seconds until one is available"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0
+        return (1 - self.tokens) / self.rate
+
+
+class _DefinitionHandler(FileSystemEventHandler):
+    """Forwards definition file changes to the reconciler"""
+
+    def __init__(self, reconciler):
+        self.reconciler = reconciler
+
+    def on_any_event(self, event):
+        if event.is_directory or event.event_type not in ("created", "modified", "deleted", "moved"):
+            return
+        self.reconciler.notify([event.src_path, getattr(event, 'dest_path', None)])
+
+
+class Reconciler:
+    """Keeps running streams in line with the definition files in a directory
+
+    File changes and stream failures only mark the affected definitions dirty, and
+    each pass reconciles just those, so applying an edit costs the same with ten
+    definitions or a thousand. A stream is started, stopped, restarted with a new
+    config, or (for a hot-swap playlist change) switched live, as its definition
+    requires. Starts are rate limited across all streams, and a failing stream is
+    restarted with exponential backoff. Timed work (retries, playlist rotation,
+    scheduled stops) waits on a heap and wakes only the streams that are due.
+    """
+
+    def __init__(self, directory=STREAMS_DIR, log=None):
+        self.directory = directory
+        self.log = log or (lambda message: None)
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.dirty = set()
+        self.stale = set()
+        self.timers = []
+        self.desired = {}
+        self.errors = {}
+        self.streams = {}
+        self.backoff = {}
+        self.limiter = StartLimiter()
+        self.actions = deque(maxlen=ACTION_HISTORY)
+        self.observer = None
+        self.subscription = None
+        self.running = False
+
+    def start(self):
+        """Load every definition once, then watch the directory for changes"""
+        if self.running:
+            return self
+        os.makedirs(self.directory, exist_ok=True)
+        self.notify(os.path.join(self.directory, name) for name in os.listdir(self.directory))
+
+        self.observer = Observer()
+        self.observer.schedule(_DefinitionHandler(self), self.directory, recursive=False)
+        self.observer.start()
+        self.subscription = get_event_bus().subscribe(self._on_stream_event, ("live", "stopped", "failed"))
+        self.running = True
+        threading.Thread(target=self._run, daemon=True).start()
+        return self
+
+    def stop(self, stop_streams=True):
+        """Stop watching, and stop the streams this reconciler started"""
+        self.running = False
+        self.wakeup.set()
+        if self.observer:
+            self.observer.stop()
+        if self.subscription:
+            get_event_bus().unsubscribe(self.subscription)
+        if stop_streams:
+            for name in list(self.streams):
+                self._stop(name, "reconciler stopped")
+
+    def notify(self, paths):
+        """Mark the definitions behind changed file paths for reloading"""
+        names = set()
+        for path in paths:
+            name = os.path.basename(path or "")
+            if name.endswith(DEFINITION_SUFFIX) and not name.startswith("."):
+                names.add(name[:-len(DEFINITION_SUFFIX)])
+        if names:
+            with self.lock:
+                self.stale |= names
+                self.dirty |= names
+            self.wakeup.set()
+
+    def _on_stream_event(self, event):
+        """Revisit the definition whose stream went live, stopped or failed"""
+        stream_id = event.snapshot.stream_id
+        with self.lock:
+            name = next(
+                (n for n, s in self.streams.items() if s['manager'] and s['manager'].stream_id == stream_id),
+                None
+            )
+            if name is None:
+                return
+            self.dirty.add(name)
+        self.wakeup.set()
+
+    def _schedule(self, name, when):
+        """Revisit a definition at a monotonic time"""
+        with self.lock:
+            heapq.heappush(self.timers, (when, name))
+        self.wakeup.set()
+
+    def _run(self):
+        while self.running:
+            with self.lock:
+                timeout = max(0, self.timers[0][0] - time.monotonic()) if self.timers else None
+            if self.wakeup.wait(timeout):
+                time.sleep(DEBOUNCE_SECONDS)
+            self.wakeup.clear()
+            if self.running:
+                self.apply_changes()
+
+    def apply_changes(self):
+        """Reconcile the definitions that changed or are due; returns how many were visited"""
+        now = time.monotonic()
+        with self.lock:
+            while self.timers and self.timers[0][0] <= now:
+                self.dirty.add(heapq.heappop(self.timers)[1])
+            names, self.dirty = self.dirty, set()
+            stale, self.stale = self.stale & names, self.stale - names
+
+        for name in sorted(names):
+            if name in stale:
+                self._reload(name)
+            try:
+                wake_at = self._reconcile(name, time.monotonic())
+            except Exception as e:
+                self.errors[name] = str(e)
+                self._record(name, f"reconcile failed: {e}")
+                continue
+            if wake_at is not None:
+                self._schedule(name, wake_at)
+        return len(names)
+
+    def _reload(self, name):
+        """Read a definition from disk; a broken file keeps the last good version running"""
+        path = os.path.join(self.directory, name + DEFINITION_SUFFIX)
+        if not os.path.exists(path):
+            self.desired.pop(name, None)
+            self.errors.pop(name, None)
+            return
+        try:
+            self.desired[name] = load_definition(path)
+            self.errors.pop(name, None)
+        except (OSError, ValueError) as e:
+            self.errors[name] = str(e)
+            self._record(name, f"invalid definition, keeping the running version: {e}")
+
+    def _reconcile(self, name, now):
+        """Bring one stream in line with its definition; returns when to look again, or None"""
+        spec = self.desired.get(name)
+        stream = self.streams.get(name)
+
+        if spec is None:
+            if stream:
+                self._stop(name, "definition removed")
+            self.backoff.pop(name, None)
+            return None
+
+        if stream and stream['spec']['digest'] != spec['digest']:
+            if self._can_swap(stream, spec):
+                self._swap(name, stream, spec)
+            else:
+                self._stop(name, "definition changed")
+                self.backoff.pop(name, None)
+                stream = None
+
+        if stream and stream['finished']:
+            return None
+
+        state = stream['manager'].get_status().state if stream else None
+        if stream and state in DOWN_STATES and not stream['down']:
+            self._record_failure(name, stream, now, state)
+        if stream is None or stream['down']:
+            if spec['stop_at'] and spec['stop_at'] <= datetime.now():
+                # The window closed before the first start or while the stream was down
+                self._finish(name, stream, spec, now)
+                self._record(name, "schedule ended before it could start")
+                return None
+            wait = self._start_delay(name, now)
+            if wait:
+                return now + wait
+            stream = self._start(name, spec, now)
+            state = stream['manager'].get_status().state
+            if state in DOWN_STATES:
+                self._record_failure(name, stream, now, state)
+                return self.backoff[name]['retry_at']
+        return self._advance(name, stream, now, state)
+
+    def _can_swap(self, stream, spec):
+        """Whether a definition change can be applied to the running stream live"""
+        return (
+            stream['spec']['config'].get('hot_swap')
+            and stream['manager'] is not None
+            and stream['manager'].get_status().is_streaming
+            and get_spec_digest(stream['spec'], SWAPPABLE_KEYS) == get_spec_digest(spec, SWAPPABLE_KEYS)
+        )
+
+    def _swap(self, name, stream, spec):
+        """Switch a running hot-swap stream to the first source of its new playlist"""
+        stream['manager'].swap_source(spec['sources'][0])
+        stream.update(spec=spec, item=0, item_ends_at=None)
+        self._record(name, f"switched live to {os.path.basename(spec['sources'][0])}")
+
+    def _start_delay(self, name, now):
+        """Seconds until a start is allowed by the failure backoff and the shared rate limit"""
+        backoff = self.backoff.get(name)
+        if backoff and backoff['retry_at'] > now:
+            return backoff['retry_at'] - now
+        return self.limiter.take(now)
+
+    def _record_failure(self, name, stream, now, state):
+        """Back off a stream that stopped without being asked to"""
+        stream['down'] = True
+        backoff = self.backoff.setdefault(name, {'failures': 0, 'retry_at': 0})
+        if now - stream['started_at'] >= STABLE_SECONDS:
+            backoff['failures'] = 0
+        backoff['failures'] += 1
+        delay = min(RESTART_BACKOFF_MAX, RESTART_BACKOFF_MIN * 2 ** (backoff['failures'] - 1))
+        backoff['retry_at'] = now + delay
+        detail = stream['manager'].get_status().detail
+        self._record(name, f"stream {state}{f' ({detail})' if detail else ''}; restarting in {delay:.0f}s")
+
+    def _start(self, name, spec, now):
+        """Start or schedule a stream for a definition"""
+        from streaming import StreamingManager
+
+        manager = StreamingManager()
+        source = spec['sources'][0]
+        if spec['start_at'] and spec['start_at'] > datetime.now():
+            manager.schedule_stream(spec['start_at'], source, spec['stream_key'], spec['config'])
+            self._record(name, f"scheduled for {spec['start_at']:%Y-%m-%d %H:%M:%S}")
+        else:
+            manager.start_streaming(source, spec['stream_key'], spec['config'])
+            self._record(name, f"started {os.path.basename(source)}")
+
+        stream = {
+            'manager': manager, 'spec': spec, 'started_at': now,
+            'item': 0, 'item_ends_at': None, 'finished': False, 'down': False
+        }
+        with self.lock:
+            self.streams[name] = stream
+        return stream
+
+    def _stop(self, name, reason):
+        """Stop a stream this reconciler started"""
+        with self.lock:
+            stream = self.streams.pop(name, None)
+        if stream is None:
+            return
+        manager = stream['manager']
+        if manager is None:
+            return
+        if manager.get_status().state == "scheduled":
+            # The schedule timer sees the cleared time and gives up
+            manager.scheduled_time = None
+        else:
+            manager.stop_streaming()
+        self._record(name, f"stopped: {reason}")
+
+    def _finish(self, name, stream, spec, now):
+        """Keep a stream whose schedule has ended as finished; one that never started has no manager"""
+        if stream is None:
+            stream = {
+                'manager': None, 'spec': spec, 'started_at': now,
+                'item': 0, 'item_ends_at': None, 'finished': True, 'down': False
+            }
+        stream['finished'] = True
+        with self.lock:
+            self.streams[name] = stream
+
+    def _advance(self, name, stream, now, state):
+        """Rotate the playlist and apply the scheduled stop; returns the next due time"""
+        spec = stream['spec']
+        due = []
+
+        if spec['stop_at']:
+            stop_in = (spec['stop_at'] - datetime.now()).total_seconds()
+            if stop_in <= 0:
+                self._stop(name, "schedule ended")
+                self._finish(name, stream, spec, now)
+                return None
+            due.append(now + stop_in)
+
+        if len(spec['sources']) > 1 and state in ACTIVE_STATES:
+            if stream['item_ends_at'] is not None and now >= stream['item_ends_at']:
+                stream['item'] = (stream['item'] + 1) % len(spec['sources'])
+                stream['manager'].swap_source(spec['sources'][stream['item']])
+                stream['item_ends_at'] = None
+                self._record(name, f"playlist item {stream['item'] + 1}: {os.path.basename(spec['sources'][stream['item']])}")
+            if stream['item_ends_at'] is None:
+                duration = (get_video_info(spec['sources'][stream['item']]) or {}).get('duration')
+                if duration:
+                    stream['item_ends_at'] = now + duration
+            if stream['item_ends_at'] is not None:
+                due.append(stream['item_ends_at'])
+
+        return min(due) if due else None
+
+    def _record(self, name, message):
+        """Remember an action for status views and pass it to the log"""
+        self.actions.append({'timestamp': time.time(), 'name': name, 'action': message})
+        self.log(f"{name}: {message}")
+
+    def get_status(self):
+        """Every known definition with its stream state, error and restart backoff"""
+        now = time.monotonic()
+        status = {}
+        for name in sorted(set(self.desired) | set(self.errors) | set(self.streams)):
+            stream = self.streams.get(name)
+            backoff = self.backoff.get(name)
+            status[name] = {
+                'state': "finished" if stream and stream['finished'] else (
+                    stream['manager'].get_status().state if stream else "pending"
+                ),
+                'sources': len(self.desired[name]['sources']) if name in self.desired else 0,
+                'item': stream['item'] + 1 if stream else None,
+                'failures': backoff['failures'] if backoff else 0,
+                'retry_in': round(max(0, backoff['retry_at'] - now), 1) if backoff else None,
+                'error': self.errors.get(name)
+            }
+        return status
+
+
+_reconciler = None
+_reconciler_lock = threading.Lock()
+
+
+def get_reconciler():
+    """Return the process-wide reconciler for the default definitions directory"""
+    global _reconciler
+    with _reconciler_lock:
+        if _reconciler is None:
+            _reconciler = Reconciler()
+        return _reconciler
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the streams defined in a directory of definition files")
+    parser.add_argument("--dir", default=STREAMS_DIR, help="Directory of <name>.json stream definitions")
+    args = parser.parse_args(argv)
+
+    reconciler = Reconciler(args.dir, log=lambda message: print(f"[{datetime.now():%H:%M:%S}] {message}", flush=True))
+    reconciler.start()
+    print(f"Watching {os.path.abspath(args.dir)}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        reconciler.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
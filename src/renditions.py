@@ -0,0 +1,46 @@
+from filtergraph import SHORTS_SIZE, DEFAULT_FIT_MODE, build_video_filter
+
+# Output formats an extra rendition can use; None keeps the source geometry
+RENDITION_FORMATS = {
+    "source": None,
+    "1080p": (1920, 1080),
+    "720p": (1280, 720),
+    "480p": (854, 480),
+    "shorts": SHORTS_SIZE
+}
+
+
+def normalize_rendition(rendition, defaults):
+    """Fill in a rendition dict from the session defaults"""
+    normalized = dict(defaults)
+    normalized.update({k: v for k, v in rendition.items() if v not in (None, "")})
+
+    # A Shorts rendition is just the "shorts" format
+    if normalized.get('is_shorts'):
+        normalized['format'] = "shorts"
+    return normalized
+
+
+def get_rendition_size(rendition, source_info):
+    """Return the (width, height) a rendition is encoded at"""
+    size = RENDITION_FORMATS.get(rendition.get('format') or "source")
+    if size is None:
+        return source_info.get('width', 0), source_info.get('height', 0)
+    return size
+
+
+def get_rendition_filter(rendition, source_info):
+    """Return the filter graph that maps the source onto a rendition, or None"""
+    if RENDITION_FORMATS.get(rendition.get('format') or "source") is None:
+        return None
+    width, height = get_rendition_size(rendition, source_info)
+    return build_video_filter(
+        source_info.get('width'), source_info.get('height'), width, height,
+        rendition.get('fit_mode', DEFAULT_FIT_MODE), rendition.get('preset', "veryfast")
+    )
+
+
+def split_threads(total_threads, weights):
+    """Share an encoder thread budget between renditions by weight"""
+    total_weight = sum(weights) or 1
+    return [max(1, int(round(total_threads * weight / total_weight))) for weight in weights]
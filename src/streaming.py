@@ -1,11 +1,53 @@
+import io
 import os
+import shutil
 import sys
 import subprocess
 import threading
 import time
+import uuid
 import streamlit as st
+from collections import namedtuple
 from datetime import datetime
 
+from admission import get_admission_controller, DEFAULT_POLICY
+from dvr import build_dvr_slave, get_dvr_pruner, DEFAULT_SEGMENT_SECONDS
+from dvr import get_session_dir as get_dvr_session_dir
+from events import LifecycleTracker, get_event_bus, is_active
+from filtergraph import build_video_filter, SHORTS_SIZE, DEFAULT_FIT_MODE
+from hotswap import SwitchableInput, HOTSWAP_INPUT_ARGS
+from latency import IngestReceiver, compute_latency_report, TRANSCODE_START_MARKER
+from logstore import StreamLog
+from looping import SeamMonitor, get_loop_preparer, load_loop_asset, summarize_seams
+from loudness import get_loudness_analyzer, get_normalization_filter, load_loudness
+from mediaio import ReadAhead, get_cache_residency, get_tmpfs_stager, warm_page_cache
+from metrics import StreamMetrics, parse_progress_line
+from pacing import PacingMonitor, get_pacing_args, DEFAULT_PACING, DRIFT_THRESHOLD
+from overlays import OverlayRenderer, OVERLAY_DIR
+from placement import get_cpu_placer, estimate_stream_weight
+from profiles import build_video_encoding_args, DEFAULT_PROFILE
+from preview import build_preview_filter, build_preview_output, get_preview_dir, PREVIEW_SIZE
+from prewarm import PrewarmedInput, RELAY_INPUT_ARGS, DEFAULT_PREWARM_LEAD, DEFAULT_PREBUFFER_BYTES
+from renditions import normalize_rendition, get_rendition_size, get_rendition_filter, split_threads
+from procstats import ProcessSampler, DEFAULT_SAMPLE_INTERVAL
+from telemetry import export_session, get_spool_path
+from utils import get_video_info
+
+# Read-only view of a session for status widgets; every field is a copy
+StreamStatus = namedtuple(
+    'StreamStatus',
+    [
+        'version', 'state', 'detail', 'is_streaming', 'start_time', 'scheduled_time', 'video_name',
+        'encoder', 'resources', 'overlays', 'input_io', 'loop_seams', 'pacing'
+    ]
+)
+
+# Encoder speed below which a live stream is reported as degraded, and the number of
+# consecutive progress samples it must stay there
+DEGRADED_SPEED = 0.95
+DEGRADED_SAMPLES = 5
+RECOVERED_SPEED = 0.98
+
 class StreamingManager:
     """Manages YouTube streaming functionality using FFmpeg"""
     
@@ -21,9 +63,59 @@ class StreamingManager:
         self.quality_preset = "veryfast"
         self.bitrate = "2500k"
         self.audio_bitrate = "128k"
+        self.stream_class = "standard"
+        self.stream_id = None
+        self.source_info = {}
+        self.placement = None
+        self.metrics = StreamMetrics()
+        self.sampler = None
+        self.sample_interval = DEFAULT_SAMPLE_INTERVAL
+        self.latency_mode = False
+        self.ingest_receiver = None
+        self.marks = {}
+        self.encoding_profile = DEFAULT_PROFILE
+        self.keyframe_interval = None
+        self.max_fps = None
+        self.config = {}
+        self.prewarmed_input = None
+        self.fit_mode = DEFAULT_FIT_MODE
+        self.renditions = []
+        self.hot_swap = False
+        self.switchable_input = None
+        self.input_stage_pids = {}
+        self.overlay_renderer = None
+        self.log_store = None
+        self.lifecycle = LifecycleTracker(get_event_bus())
+        self.input_path = None
+        self.staged_path = None
+        self.read_ahead = None
+        self.admission_ticket = None
+        self.queue_cancel = None
+        self.session_events = []
+        self.loop_asset = None
+        self.seam_monitor = None
+        self.pacing = DEFAULT_PACING
+        self.pacing_monitor = None
+        self.audio_filter = None
+        self.dvr_dir = None
+        self.preview_dir = None
     
-    def log_message(self, message):
-        """Add log message with timestamp to session state logs"""
+    def _set_state(self, state, **changes):
+        """Publish a lifecycle transition for this manager's stream"""
+        snapshot = self.lifecycle.transition(state, stream_id=self.stream_id, **changes)
+        self.session_events.append({
+            'timestamp': snapshot.updated_at, 'version': snapshot.version,
+            'state': snapshot.state, 'detail': snapshot.detail
+        })
+        if self.log_store:
+            self.log_store.write(f"State {state}" + (f": {snapshot.detail}" if snapshot.detail else ""), "info")
+        return snapshot
+    
+    def log_message(self, message, level="info"):
+        """Add log message with timestamp to session state logs and the stream's archive"""
+        if self.log_store:
+            self.log_store.write(message, level)
+        
         timestamp = datetime.now().strftime("%H:%M:%S")
         log_entry = f"[{timestamp}] {message}"
         
@@ -35,7 +127,9 @@ class StreamingManager:
     
     def start_streaming(self, video_path, stream_key, config):
         """Start streaming to YouTube"""
-        if self.is_streaming:
+        self.marks = {'click': time.monotonic()}
+        
+        if self.is_streaming or self.lifecycle.snapshot.state == "queued":
             self.log_message("Already streaming. Please stop current stream first.")
             return False
         
@@ -43,109 +137,708 @@ class StreamingManager:
             self.log_message("Error: Video path and stream key must be provided.")
             return False
         
-        self.video_path = video_path
-        self.stream_key = stream_key
-        self.is_shorts = config.get('is_shorts', False)
-        self.quality_preset = config.get('quality_preset', 'veryfast')
-        self.bitrate = config.get('bitrate', '2500k')
-        self.audio_bitrate = config.get('audio_bitrate', '128k')
+        decision = self._admit(video_path, config)
+        if decision.action == "reject":
+            return False
+        if decision.action == "queue":
+            self._queue_stream(video_path, stream_key, dict(config, quality_preset=decision.preset))
+            return True
+        if decision.action == "downgrade":
+            config = dict(config, quality_preset=decision.preset)
+        
+        return self._start_admitted(video_path, stream_key, config)
+    
+    def _admit(self, video_path, config):
+        """Ask admission control for capacity; a rejection fails the stream"""
+        self._release_admission()
+        self.admission_ticket = uuid.uuid4().hex[:8]
+        name = os.path.basename(video_path)
+        decision = get_admission_controller().request(
+            self.admission_ticket, get_video_info(video_path) or {}, config,
+            config.get('admission_policy', DEFAULT_POLICY), name
+        )
+        
+        if decision.action == "reject":
+            self.admission_ticket = None
+            self.log_message(f"Not enough capacity: {decision.reason}", "error")
+            self._set_state("failed", video_name=name, detail=f"rejected: {decision.reason}")
+        elif decision.action == "downgrade":
+            self.log_message(
+                f"Not enough capacity for {decision.reason}; "
+                f"starting with the {decision.preset} preset ({decision.predicted_cores:.1f} cores)",
+                "warning"
+            )
+        elif decision.action == "admit":
+            self.log_message(
+                f"Admitted: {decision.predicted_cores:.1f} of {decision.available_cores:.1f} free cores"
+            )
+        return decision
+    
+    def _queue_stream(self, video_path, stream_key, config):
+        """Wait in the admission queue in the background and start once capacity frees up"""
+        self.queue_cancel = threading.Event()
+        cancel = self.queue_cancel
+        ticket = self.admission_ticket
+        name = os.path.basename(video_path)
+        self.log_message(f"Waiting for capacity: {os.path.basename(video_path)}")
+        self._set_state("queued", video_name=name, scheduled_time=None, detail="waiting for encode capacity")
+        
+        def wait():
+            decision = get_admission_controller().wait_for_capacity(
+                ticket, get_video_info(video_path) or {}, config, cancel, name
+            )
+            if decision is None:
+                self.admission_ticket = None
+                self.log_message("Queued stream was canceled.")
+                self._set_state("stopped", detail="queue canceled")
+                return
+            if decision.action == "reject":
+                self.admission_ticket = None
+                self.log_message(f"Not enough capacity: {decision.reason}", "error")
+                self._set_state("failed", detail=f"rejected: {decision.reason}")
+                return
+            self.log_message(f"Capacity available: starting {name}")
+            self._start_admitted(video_path, stream_key, config)
+        
+        threading.Thread(target=wait, daemon=True).start()
+    
+    def _release_admission(self, resources=None):
+        """Hand this session's reserved capacity back to admission control"""
+        if self.admission_ticket:
+            get_admission_controller().release(self.admission_ticket, resources)
+            self.admission_ticket = None
+    
+    def _start_admitted(self, video_path, stream_key, config):
+        """Prepare and launch a session that admission control let through"""
+        try:
+            self.prepare_session(video_path, stream_key, config)
+        except Exception as e:
+            self._abort_session(e)
+            return False
+        self._begin_session()
+        
+        self.log_message(f"Started streaming: {os.path.basename(video_path)}")
+        return True
+    
+    def _abort_session(self, error):
+        """Undo a session that failed before its encoder thread took over, e.g. a broken overlay"""
+        self._kill_processes()
+        self._end_session(published=False)
+        self.log_message(f"Could not start stream: {error}", "error")
+        self._set_state("failed", scheduled_time=None, detail=f"setup failed: {error}")
+    
+    def _begin_session(self):
+        """Mark the session live and run the encoder in a background thread"""
+        # In latency mode, publish to a local ingest stand-in instead of YouTube
+        if self.latency_mode and not self.ingest_receiver:
+            self.ingest_receiver = IngestReceiver(stream_key=self.stream_id)
+            self.ingest_receiver.start()
         
         # Start streaming in a new thread
         self.is_streaming = True
         self.start_time = datetime.now()
+        self._set_state(
+            "starting", start_time=self.start_time, scheduled_time=None,
+            video_name=os.path.basename(self.video_path)
+        )
         self.thread = threading.Thread(
             target=self._run_ffmpeg_stream, 
             daemon=True
         )
         self.thread.start()
+    
+    def prepare_session(self, video_path, stream_key, config, side_effects=True):
+        """Apply the stream config, probe the source and reserve a CPU placement
+
+        With ``side_effects=False`` only what the encoder command needs is set up: no
+        session log or telemetry spool, and nothing is queued for loudness or loop
+        preparation or read into the page cache. The benchmark prepares sessions this way.
+        """
+        # Fresh metrics for every session
+        self.metrics.clear()
         
-        self.log_message(f"Started streaming: {os.path.basename(video_path)}")
-        return True
+        self.config = dict(config)
+        self.video_path = video_path
+        self.stream_key = stream_key
+        self.is_shorts = config.get('is_shorts', False)
+        self.quality_preset = config.get('quality_preset', 'veryfast')
+        self.bitrate = config.get('bitrate', '2500k')
+        self.audio_bitrate = config.get('audio_bitrate', '128k')
+        self.stream_class = config.get('stream_class', 'standard')
+        self.sample_interval = config.get('sample_interval', DEFAULT_SAMPLE_INTERVAL)
+        self.latency_mode = config.get('latency_mode', False)
+        self.encoding_profile = config.get('encoding_profile', DEFAULT_PROFILE)
+        self.keyframe_interval = config.get('keyframe_interval')
+        self.max_fps = config.get('max_fps')
+        self.fit_mode = config.get('fit_mode', DEFAULT_FIT_MODE)
+        self.renditions = list(config.get('renditions', []))
+        self.hot_swap = config.get('hot_swap', False)
+        self.pacing = config.get('pacing', DEFAULT_PACING)
+        self.source_info = get_video_info(video_path) or {}
+        self._prepare_input(side_effects)
+        self._prepare_audio(side_effects)
+        
+        # Reserve cores and a thread budget sized to every output resolution
+        self.stream_id = uuid.uuid4().hex[:8]
+        if self.log_store:
+            self.log_store.close()
+            self.log_store = None
+        if side_effects:
+            self.log_store = StreamLog(self.stream_id).start()
+            if self.config.get('export_telemetry', True):
+                self.metrics.start_spool(get_spool_path(self.stream_id))
+        
+        # Local archive segments and preview clips come from the same encoder process
+        self.dvr_dir = get_dvr_session_dir(self.stream_id) if config.get('dvr', False) else None
+        self.preview_dir = get_preview_dir(self.stream_id) if config.get('preview', False) else None
+        
+        outputs = self.get_outputs()
+        extra_outputs = [
+            get_rendition_size(r, self.source_info) + (r['preset'],) for r in outputs[1:]
+        ]
+        if self.preview_dir:
+            extra_outputs.append(PREVIEW_SIZE + ("ultrafast",))
+        out_width, out_height = self.get_output_size()
+        self.placement = get_cpu_placer().register(
+            self.stream_id, out_width, out_height,
+            self.quality_preset, self.stream_class, extra_outputs
+        )
+        
+        # Render logo, title and clock layers before the encoder reads them
+        self.overlay_renderer = None
+        if config.get('overlays'):
+            self.overlay_renderer = OverlayRenderer(
+                config['overlays'], out_height,
+                os.path.join(OVERLAY_DIR, self.stream_id), self.metrics
+            )
+            self.overlay_renderer.prepare()
+    
+    def _prepare_input(self, side_effects):
+        """Stage the source on tmpfs if asked, and warm the page cache in the background"""
+        self._release_input()
+        self.input_path = self.video_path
+        self.loop_asset = None
+        if not self.video_path or not os.path.exists(self.video_path):
+            return
+        
+        # Loop a prepared copy whose seam is keyframe-aligned with continuous timestamps
+        if self.config.get('seamless_loop', False) and not self.hot_swap:
+            self.loop_asset = load_loop_asset(self.video_path)
+            if self.loop_asset:
+                self.input_path = self.loop_asset['path']
+                self.log_message(
+                    f"Seamless loop: {self.loop_asset['duration']:.2f}s loop, "
+                    f"{self.loop_asset['trimmed_seconds']:.2f}s trimmed"
+                )
+            elif side_effects:
+                get_loop_preparer().prepare(self.video_path)
+                self.log_message("Seamless loop asset is not ready yet; looping the original file", "warning")
+        
+        # Copying a large file takes a while, so it never holds up a start: a session uses
+        # a copy that is already staged, or streams from disk while one is made for next time
+        if self.config.get('stage_tmpfs', False):
+            staged_path = get_tmpfs_stager().get_staged(self.input_path)
+            if staged_path:
+                self.input_path = self.staged_path = staged_path
+                self.log_message(f"Staged input in memory: {staged_path}")
+            elif side_effects:
+                get_tmpfs_stager().stage_in_background(self.input_path)
+                self.log_message("Input is being staged in memory; reading it from disk this time")
+        self.read_ahead = ReadAhead(self.input_path)
+        if not side_effects:
+            return
+        
+        path = self.input_path
+        staged = self.staged_path is not None
+        warm_enabled = self.config.get('warm_cache', True)
+        
+        def warm():
+            residency = get_cache_residency(path)
+            self.metrics.set_info('input_cache', {
+                'staged': staged,
+                'residency_before_warm': residency,
+                'warmed_bytes': warm_page_cache(path) if warm_enabled else 0
+            })
+        
+        threading.Thread(target=warm, daemon=True).start()
+    
+    def _prepare_audio(self, side_effects):
+        """Pick a static loudness gain from the source's cached measurement"""
+        self.audio_filter = None
+        if not self.config.get('normalize_audio', False) or self.hot_swap:
+            # Swapped sources have their own loudness, so one gain would fit none of them
+            return
+        if not self.video_path or not os.path.exists(self.video_path):
+            return
+        
+        measurement = load_loudness(self.video_path)
+        if measurement is None:
+            if not side_effects:
+                return
+            get_loudness_analyzer().analyze(self.video_path)
+            self.log_message("Loudness has not been measured yet; streaming audio unchanged", "warning")
+            return
+        self.audio_filter = get_normalization_filter(self.video_path)
+        self.metrics.set_info('loudness', dict(measurement, filter=self.audio_filter))
+        if self.audio_filter:
+            self.log_message(
+                f"Loudness normalization: {measurement['integrated_lufs']:.1f} LUFS, "
+                f"applying {self.audio_filter}"
+            )
+    
+    def _release_input(self):
+        """Stop read-ahead and hand a staged copy back to the stager"""
+        if self.read_ahead:
+            self.read_ahead.stop()
+            self.read_ahead = None
+        if self.staged_path:
+            get_tmpfs_stager().release(self.staged_path)
+            self.staged_path = None
     
     def stop_streaming(self):
         """Stop current streaming session"""
+        if self.lifecycle.snapshot.state == "queued" and self.queue_cancel:
+            self.queue_cancel.set()
+            return True
+        
         if not self.is_streaming:
             self.log_message("No active stream to stop.")
             return False
         
         self.is_streaming = False
-        # Kill ffmpeg process
+        self._set_state("stopped")
+        # Kill only this session's ffmpeg processes so other streams keep running
         try:
-            if os.name == 'nt':  # Windows
-                subprocess.run(["taskkill", "/F", "/IM", "ffmpeg.exe"], 
-                              stdout=subprocess.DEVNULL, 
-                              stderr=subprocess.DEVNULL)
-            else:  # Unix/Linux
-                os.system("pkill -9 ffmpeg")
+            self._kill_processes()
             
             self.log_message("Streaming stopped successfully.")
         except Exception as e:
-            self.log_message(f"Error stopping stream: {str(e)}")
+            self.log_message(f"Error stopping stream: {str(e)}", "error")
             return False
         
         return True
     
-    def _run_ffmpeg_stream(self):
-        """Execute FFmpeg command to stream to YouTube"""
-        output_url = f"rtmp://a.rtmp.youtube.com/live2/{self.stream_key}"
-        
-        # Base command
-        cmd = [
-            "ffmpeg", "-re", "-stream_loop", "-1", "-i", self.video_path,
-            "-c:v", "libx264", "-preset", self.quality_preset, 
-            "-b:v", self.bitrate, "-maxrate", self.bitrate,
-            "-bufsize", f"{int(self.bitrate.replace('k', '')) * 2}k",
-            "-g", "60", "-keyint_min", "60",
-            "-c:a", "aac", "-b:a", self.audio_bitrate,
-            "-f", "flv"
-        ]
+    def _kill_processes(self):
+        """Kill the encoder and any pre-warmed input stage owned by this session"""
+        if self.prewarmed_input:
+            self.prewarmed_input.stop()
+            self.prewarmed_input = None
+        if self.switchable_input:
+            self.switchable_input.stop()
+        if self.overlay_renderer:
+            self.overlay_renderer.stop()
+        if self.process and self.process.poll() is None:
+            self.process.kill()
+    
+    def swap_source(self, video_path):
+        """Switch the live stream to another video without dropping the ingest connection"""
+        if not self.is_streaming or not self.switchable_input:
+            self.log_message("Source switching needs an active stream with hot swap enabled.")
+            return False
         
-        # Add scale filter for shorts mode
+        source_info = get_video_info(video_path) or {}
+        self.switchable_input.swap(video_path, source_info)
+        self.video_path = video_path
+        self.source_info = dict(self.source_info, **{
+            k: v for k, v in source_info.items() if k in ('video_codec', 'audio_codec', 'duration')
+        })
+        self.log_message(f"Switching source to {os.path.basename(video_path)}")
+        return True
+    
+    def get_output_size(self):
+        """Return the (width, height) of the encoded output"""
         if self.is_shorts:
-            cmd += ["-vf", "scale=720:1280"]
+            return SHORTS_SIZE
+        return self.source_info.get('width', 0), self.source_info.get('height', 0)
+    
+    def get_outputs(self):
+        """Return the primary output followed by any extra renditions"""
+        primary = {
+            'name': "main",
+            'stream_key': self.stream_key,
+            'format': "shorts" if self.is_shorts else "source",
+            'bitrate': self.bitrate,
+            'preset': self.quality_preset,
+            'fit_mode': self.fit_mode
+        }
+        defaults = dict(primary, format="source", stream_key=None)
+        return [primary] + [normalize_rendition(r, defaults) for r in self.renditions]
+    
+    def build_ffmpeg_command(self, output_url=None, output_format="flv", input_args=None):
+        """Build the FFmpeg command line for the current session
+        
+        With extra renditions the source is decoded once and split into one filter chain
+        and encoder per rendition. When ``output_url`` overrides the primary destination
+        (benchmarks, latency tests) the extra renditions go to the null muxer so a local
+        run never publishes, and nothing is archived or previewed.
+        
+        The DVR archive is a tee of the primary output's packets, so recording costs no
+        encoding. The preview is a small encode of the primary picture after scaling and
+        overlays, split off in the same filter graph.
+        """
+        local_run = output_url is not None
+        if output_url is None:
+            output_url = f"rtmp://a.rtmp.youtube.com/live2/{self.stream_key}"
+        if input_args is None:
+            input_args = get_pacing_args(self.pacing) + ["-stream_loop", "-1", "-i", self.input_path or self.video_path]
+        
+        outputs = self.get_outputs()
+        if self.hot_swap:
+            # Swapped sources may differ in size, so every filter works without the source geometry
+            filters = [
+                build_video_filter(
+                    0, 0, *get_rendition_size(r, self.source_info),
+                    r['fit_mode'] if r['format'] != "source" else "pad", r['preset']
+                )
+                for r in outputs
+            ]
+        else:
+            filters = [get_rendition_filter(r, self.source_info) for r in outputs]
+        self.metrics.set_info('video_filter', filters[0])
+        
+        # Base command, followed by one looping image input per overlay layer
+        cmd = ["ffmpeg"] + input_args
+        overlays = self.overlay_renderer if self.overlay_renderer and self.overlay_renderer.layers else None
+        if overlays:
+            cmd += overlays.input_args()
+        
+        dvr_dir = None if local_run else self.dvr_dir
+        preview_dir = None if local_run else self.preview_dir
+        
+        # Decode once and split the frames between the renditions
+        use_graph = len(outputs) > 1 or overlays is not None or preview_dir is not None
+        if use_graph:
+            if len(outputs) > 1:
+                graph = [f"[0:v]split={len(outputs)}" + "".join(f"[s{i}]" for i in range(len(outputs)))]
+                sources = [f"s{i}" for i in range(len(outputs))]
+            else:
+                graph, sources = [], ["0:v"]
+            for i, video_filter in enumerate(filters):
+                # Overlays are blended onto the primary output after it is scaled
+                label = "base0" if i == 0 and overlays else f"v{i}"
+                graph.append(f"[{sources[i]}]{video_filter or 'null'}[{label}]")
+            if overlays:
+                graph.append(overlays.build_filter("base0", "v0", first_input=1))
+            if preview_dir:
+                graph.append(build_preview_filter("v0", "main0", "preview"))
+            cmd += ["-filter_complex", ";".join(graph)]
+        
+        # Limit encoder threads to the placement's budget, shared by weight
+        if self.placement:
+            weights = [
+                estimate_stream_weight(*get_rendition_size(r, self.source_info), r['preset'])
+                for r in outputs
+            ]
+            threads = split_threads(self.placement['threads'], weights)
+        
+        rendition_info = []
+        for i, rendition in enumerate(outputs):
+            # Rate control and GOP from the encoding profile and the probed frame rate
+            video_args, profile = build_video_encoding_args(
+                self.encoding_profile, self.source_info.get('fps'),
+                rendition['bitrate'], self.keyframe_interval, self.max_fps
+            )
+            rendition_info.append(dict(profile, name=rendition['name'], filter=filters[i]))
+            
+            if use_graph:
+                label = "main0" if i == 0 and preview_dir else f"v{i}"
+                cmd += ["-map", f"[{label}]", "-map", "0:a?"]
+            elif i == 0 and dvr_dir:
+                # The tee muxer needs every stream mapped explicitly
+                cmd += ["-map", "0:v", "-map", "0:a?"]
+            
+            cmd += [
+                "-c:v", "libx264", "-preset", rendition['preset']
+            ] + video_args
+            if self.audio_filter:
+                cmd += ["-af", self.audio_filter]
+            cmd += [
+                "-c:a", "aac", "-b:a", self.audio_bitrate
+            ]
+            
+            if self.placement:
+                cmd += ["-threads", str(threads[i])]
+            
+            # Crop/pad and scale for shorts mode, skipping stages that change nothing
+            if not use_graph and filters[0]:
+                cmd += ["-vf", filters[0]]
+            
+            # Add output URL
+            if i == 0 and dvr_dir:
+                # Formats disagree on where codec headers go, so the encoders emit them globally
+                archive = build_dvr_slave(dvr_dir, self.config.get('dvr_segment_seconds', DEFAULT_SEGMENT_SECONDS))
+                cmd += ["-flags", "+global_header", "-f", "tee", f"[f={output_format}]{output_url}|{archive}"]
+            elif i == 0:
+                cmd += ["-f", output_format, output_url]
+            elif local_run:
+                cmd += ["-f", "null", "-"]
+            else:
+                url = rendition.get('output_url') or f"rtmp://a.rtmp.youtube.com/live2/{rendition['stream_key']}"
+                cmd += ["-f", "flv", url]
         
-        # Add output URL
-        cmd.append(output_url)
+        if preview_dir:
+            cmd += build_preview_output("preview", preview_dir, self.audio_filter)
+        
+        self.metrics.set_info('encoding_profile', rendition_info[0])
+        if len(outputs) > 1:
+            self.metrics.set_info('renditions', rendition_info)
+        return cmd
+    
+    def _spawn_encoder(self, input_args=None):
+        """Spawn the encoder process with its CPU placement applied"""
+        output_url = self.ingest_receiver.url if self.ingest_receiver else None
+        cmd = self.build_ffmpeg_command(output_url, input_args=input_args)
         
         self.log_message(f"Executing FFmpeg command")
+        profile = self.metrics.info.get('encoding_profile', {})
+        self.log_message(
+            f"Encoding profile: {profile.get('profile')}, "
+            f"GOP {profile.get('gop')} frames at {profile.get('output_fps')} fps"
+        )
+        self.log_message(
+            f"CPU placement: cores {self.placement['cores']}, "
+            f"{self.placement['threads']} threads, class {self.placement['class']}"
+        )
+        
+        placer = get_cpu_placer()
+        self.process = subprocess.Popen(
+            cmd, 
+            stdin=subprocess.PIPE if input_args and "pipe:0" in input_args else None,
+            stdout=subprocess.PIPE, 
+            stderr=subprocess.STDOUT
+        )
+        self.marks['spawn'] = time.monotonic()
+        placer.attach(self.stream_id, self.process.pid)
+        
+        # Keep the page cache ahead of the encoder when it reads the file itself
+        if self.read_ahead and not (input_args and "pipe:0" in input_args):
+            self.read_ahead.attach(self.process.pid)
+    
+    def _run_ffmpeg_stream(self):
+        """Execute FFmpeg command to stream to YouTube"""
+        failure = None
         
         try:
-            self.process = subprocess.Popen(
-                cmd, 
-                stdout=subprocess.PIPE, 
-                stderr=subprocess.STDOUT, 
-                text=True,
-                bufsize=1,
-                universal_newlines=True
-            )
+            # A pre-warmed session already has its encoder waiting on stdin
+            if self.process is None or self.process.poll() is not None:
+                if self.prewarmed_input:
+                    self.prewarmed_input.stop()
+                    self.prewarmed_input = None
+                if self.hot_swap:
+                    self._start_switchable_input()
+                else:
+                    self._spawn_encoder()
+            
+            # Sample CPU, memory and I/O of the encoder process
+            self.sampler = ProcessSampler(self.metrics, self.sample_interval)
+            self.sampler.add("encoder", self.process.pid)
+            if self.prewarmed_input:
+                self.sampler.add("input", self.prewarmed_input.process.pid)
+            for label, pid in self.input_stage_pids.items():
+                self.sampler.add(label, pid)
+            self.sampler.start()
+            
+            # Keep the clock layer current while the encoder runs
+            if self.overlay_renderer:
+                self.overlay_renderer.start()
+            
+            # Hold the archive within its retention limits while it grows
+            if self.dvr_dir:
+                get_dvr_pruner().register(self.dvr_dir)
+                self.log_message(f"Recording to {self.dvr_dir}")
+            
+            # Watch bitrate, speed and timestamp warnings where the looping input wraps
+            loop_duration = (self.loop_asset or self.source_info).get('duration')
+            self.seam_monitor = None if self.hot_swap else SeamMonitor(loop_duration, self.metrics)
+            self.pacing_monitor = PacingMonitor(self.metrics, self.config.get('drift_threshold', DRIFT_THRESHOLD))
             
             # Read output line by line
-            for line in self.process.stdout:
+            # Progress lines end in \r, which universal newlines split on
+            slow_samples = 0
+            for line in io.TextIOWrapper(self.process.stdout, errors="replace"):
                 if not self.is_streaming:
                     break
+                if TRANSCODE_START_MARKER in line:
+                    self.marks['transcode_start'] = time.monotonic()
                 if "frame=" in line or "speed=" in line:
+                    self.marks.setdefault('transcode_start', time.monotonic())
+                    stats = parse_progress_line(line)
+                    self.metrics.add_encoder_sample(stats)
+                    if self.seam_monitor:
+                        self.seam_monitor.add_sample(stats)
+                    self.pacing_monitor.add_sample(stats)
+                    if 'first_packet' not in self.marks and stats.get('size_kb', 0) > 0:
+                        self._record_first_packet()
+                    
+                    # Live once frames flow; degraded while the encoder cannot keep real time
+                    # or its output drifts away from the wall clock
+                    speed = stats.get('speed')
+                    state = self.lifecycle.snapshot.state
+                    if state == "starting":
+                        self._set_state("live")
+                    elif speed is not None:
+                        slow_samples = slow_samples + 1 if speed < DEGRADED_SPEED else 0
+                        if state == "live" and slow_samples >= DEGRADED_SAMPLES:
+                            self._set_state("degraded", detail=f"encoder speed {speed:.2f}x")
+                        elif state == "live" and self.pacing_monitor.is_drifting():
+                            self._set_state("degraded", detail=f"pacing drift {self.pacing_monitor.drift:+.2f}s")
+                        elif state == "degraded" and speed >= RECOVERED_SPEED and self.pacing_monitor.is_settled():
+                            self._set_state("live")
                     # For frame statistics, only log every 10 seconds to avoid spam
                     if time.time() % 10 < 1:
-                        self.log_message(line.strip())
-                elif "error" in line.lower() or "warning" in line.lower():
-                    self.log_message(line.strip())
+                        self.log_message(line.strip(), "debug")
+                    elif self.log_store:
+                        self.log_store.write(line.strip(), "debug")
+                    continue
+                if self.seam_monitor:
+                    self.seam_monitor.add_line(line)
+                if "error" in line.lower():
+                    self.log_message(line.strip(), "error")
+                elif "warning" in line.lower():
+                    self.log_message(line.strip(), "warning")
             
             self.process.wait()
             
         except Exception as e:
-            self.log_message(f"Streaming error: {str(e)}")
+            failure = f"Streaming error: {str(e)}"
+            self.log_message(failure, "error")
         finally:
-            if self.is_streaming:
-                self.is_streaming = False
-                self.log_message("Stream ended unexpectedly.")
+            self._end_session(failure)
+    
+    def _end_session(self, failure=None, published=True):
+        """Stop everything a session started and hand back its cores, capacity and files
+
+        ``published`` is False for a pre-warmed session canceled before it went live;
+        there is no latency report or telemetry to keep for it.
+        """
+        if self.sampler:
+            self.sampler.stop()
+            self.sampler = None
+        if self.prewarmed_input:
+            self.prewarmed_input.stop()
+            self.prewarmed_input = None
+        if self.switchable_input:
+            self.switchable_input.stop()
+            self.metrics.set_info('source_swaps', list(self.switchable_input.swaps))
+            self.switchable_input = None
+        if self.overlay_renderer:
+            self.overlay_renderer.cleanup()
+        if self.dvr_dir:
+            get_dvr_pruner().release(self.dvr_dir)
+        if self.preview_dir:
+            shutil.rmtree(self.preview_dir, ignore_errors=True)
+        self._release_input()
+        if self.process and failure is None:
+            failure = f"ffmpeg exited with code {self.process.poll()}"
+        self.process = None
+        # Hand the cores back so the remaining streams are rebalanced
+        get_cpu_placer().release(self.stream_id)
+        # An idle pre-warmed encoder says nothing about what a live stream costs
+        self._release_admission(self.metrics.snapshot()['resources'] if published else None)
+        if self.ingest_receiver:
+            if published:
+                report = self.get_latency_report()
+                self.metrics.set_info('latency', report)
+                self.log_message(f"Latency report: {report}")
+            self.ingest_receiver.stop()
+            self.ingest_receiver = None
+        if self.is_streaming:
+            self.is_streaming = False
+            self.log_message("Stream ended unexpectedly.", "warning")
+            self._set_state("failed", detail=failure)
+        if published and self.config.get('export_telemetry', True):
+            self._export_telemetry()
+        elif not published:
+            self.session_events = []
+        self.metrics.close_spool()
+        # Seal the archive so the whole session is searchable
+        if self.log_store:
+            self.log_store.close()
+            self.log_store = None
+    
+    def _export_telemetry(self):
+        """Write the session's time series and lifecycle events to the telemetry archive"""
+        events, self.session_events = self.session_events, []
+        out_width, out_height = self.get_output_size()
+        session_info = {
+            'video_name': os.path.basename(self.video_path),
+            'final_state': self.lifecycle.snapshot.state,
+            'quality_preset': self.quality_preset,
+            'bitrate': self.bitrate,
+            'encoding_profile': self.encoding_profile,
+            'stream_class': self.stream_class,
+            'is_shorts': self.is_shorts,
+            'output_width': out_width,
+            'output_height': out_height,
+            'source_fps': self.source_info.get('fps'),
+            'renditions': len(self.renditions)
+        }
+        try:
+            session_dir = export_session(
+                self.stream_id, self.start_time or datetime.now(), datetime.now(),
+                self.metrics.session_snapshot(), events, session_info
+            )
+            self.log_message(f"Telemetry exported to {session_dir}")
+        except Exception as e:
+            self.log_message(f"Telemetry export failed: {str(e)}", "warning")
+    
+    def _start_switchable_input(self):
+        """Spawn the persistent encoder and feed it from swappable input stages"""
+        self.input_stage_pids = {}
+        self._spawn_encoder(input_args=HOTSWAP_INPUT_ARGS)
+        self.switchable_input = SwitchableInput(
+            self.source_info.get('fps'),
+            log=self.log_message,
+            on_stage=self._on_input_stage
+        )
+        self.switchable_input.start(self.process.stdin, self.video_path, self.source_info)
+        self.metrics.set_info('source_swaps', self.switchable_input.swaps)
+    
+    def _on_input_stage(self, label, pid):
+        """Track a new input stage process for resource sampling"""
+        self.input_stage_pids[label] = pid
+        # Follow whichever file the current input stage reads
+        if label == "input":
+            if self.read_ahead:
+                self.read_ahead.stop()
+            self.read_ahead = ReadAhead(self.video_path)
+            self.read_ahead.attach(pid)
+        if self.sampler:
+            self.sampler.add(label, pid)
+    
+    def get_latency_report(self):
+        """Return the click-to-first-packet and steady-state latency breakdown"""
+        if not self.ingest_receiver:
+            return self.metrics.info.get('latency', {})
+        return compute_latency_report(self.marks, self.ingest_receiver)
+    
+    def _record_first_packet(self):
+        """Record when the first encoded data left the encoder"""
+        self.marks['first_packet'] = time.monotonic()
+        if 'scheduled' in self.marks:
+            delay = self.marks['first_packet'] - self.marks['scheduled']
+            self.metrics.set_info('scheduled_to_first_packet', delay)
+            self.log_message(f"Scheduled start to first packet: {delay * 1000:.0f} ms")
     
-    def schedule_stream(self, scheduled_time):
+    def schedule_stream(self, scheduled_time, video_path=None, stream_key=None, config=None):
         """Schedule stream to start at a specific time"""
         if self.is_streaming:
             self.log_message("Cannot schedule: Already streaming.")
             return False
         
+        # Remember what to stream; earlier values are kept when not given
+        if video_path:
+            self.video_path = video_path
+        if stream_key:
+            self.stream_key = stream_key
+        if config is not None:
+            self.config = dict(config)
+        
         self.scheduled_time = scheduled_time
+        self._set_state(
+            "scheduled", scheduled_time=scheduled_time, start_time=None,
+            video_name=os.path.basename(self.video_path) if self.video_path else None
+        )
         self.log_message(f"Stream scheduled for {scheduled_time.strftime('%Y-%m-%d %H:%M:%S')}")
         
         # Calculate time difference in seconds
@@ -154,43 +847,143 @@ class StreamingManager:
         
         if time_diff <= 0:
             self.log_message("Scheduled time is in the past.")
+            self._set_state("idle", scheduled_time=None)
             return False
         
         # Start a scheduler thread
         threading.Thread(
             target=self._schedule_timer,
-            args=(time_diff,),
+            args=(scheduled_time,),
             daemon=True
         ).start()
         
         return True
     
-    def _schedule_timer(self, delay_seconds):
+    def _schedule_timer(self, scheduled_time):
         """Wait for the scheduled time and start streaming"""
+        delay_seconds = (scheduled_time - datetime.now()).total_seconds()
         self.log_message(f"Waiting {delay_seconds:.1f} seconds for scheduled stream")
         
-        # Sleep until scheduled time
-        time.sleep(delay_seconds)
+        # Hot-swap sessions feed the encoder from their own input stages, so they start cold
+        prewarm = self.config.get('prewarm', False) and not self.config.get('hot_swap', False)
+        lead = self.config.get('prewarm_lead', DEFAULT_PREWARM_LEAD)
+        
+        # Sleep until the pre-warm point, or the scheduled time without pre-warm
+        time.sleep(max(0, delay_seconds - lead) if prewarm else max(0, delay_seconds))
         
         # Check if streaming was canceled
         if not hasattr(self, 'scheduled_time') or self.scheduled_time is None:
             self.log_message("Scheduled stream was canceled.")
+            self._set_state("stopped", scheduled_time=None, detail="schedule canceled")
+            return
+        
+        if not self.video_path or not self.stream_key:
+            self.scheduled_time = None
+            self.log_message("Cannot start scheduled stream: Missing video or stream key.")
+            self._set_state("failed", scheduled_time=None, detail="missing video or stream key")
+            return
+        
+        if not prewarm:
+            # Reset scheduled time
+            self.scheduled_time = None
+            if self.start_streaming(self.video_path, self.stream_key, self.config):
+                # Cold start: the first packet is hundreds of ms away, so this cannot race it
+                self.marks['scheduled'] = self.marks['click']
+            return
+        
+        # Capacity is reserved before pre-warming; a queued stream starts cold when admitted
+        decision = self._admit(self.video_path, self.config)
+        if decision.action in ("reject", "queue"):
+            self.scheduled_time = None
+            if decision.action == "queue":
+                self._queue_stream(self.video_path, self.stream_key, dict(self.config, quality_preset=decision.preset))
+            return
+        if decision.action == "downgrade":
+            self.config = dict(self.config, quality_preset=decision.preset)
+        
+        try:
+            self._prewarm()
+        except Exception as e:
+            self.scheduled_time = None
+            self._abort_session(e)
+            return
+        
+        # Sleep the remaining lead time, then publish at the exact moment
+        remaining = (scheduled_time - datetime.now()).total_seconds()
+        if remaining > 0:
+            time.sleep(remaining)
+        
+        if self.scheduled_time is None:
+            self.log_message("Scheduled stream was canceled.")
+            self._set_state("stopped", scheduled_time=None, detail="schedule canceled")
+            self._kill_processes()
+            self._end_session(published=False)
             return
         
-        # Reset scheduled time
         self.scheduled_time = None
+        self._publish_prewarmed()
+    
+    def _prewarm(self):
+        """Probe the source, spawn the input stage and encoder, and pre-buffer the input"""
+        self.marks = {}
+        self.prepare_session(self.video_path, self.stream_key, self.config)
         
-        # Start streaming if video path and stream key are set
-        if hasattr(self, 'video_path') and hasattr(self, 'stream_key') and self.video_path and self.stream_key:
-            config = {
-                'is_shorts': self.is_shorts,
-                'quality_preset': self.quality_preset,
-                'bitrate': self.bitrate,
-                'audio_bitrate': self.audio_bitrate
-            }
-            self.start_streaming(self.video_path, self.stream_key, config)
+        if self.latency_mode:
+            self.ingest_receiver = IngestReceiver(stream_key=self.stream_id)
+            self.ingest_receiver.start()
+        
+        self.prewarmed_input = PrewarmedInput(
+            self.input_path,
+            self.config.get('prebuffer_bytes', DEFAULT_PREBUFFER_BYTES)
+        )
+        self.prewarmed_input.start()
+        if self.read_ahead:
+            self.read_ahead.attach(self.prewarmed_input.process.pid)
+        
+        # The encoder blocks probing its empty stdin until publishing starts
+        self._spawn_encoder(input_args=get_pacing_args(self.pacing) + RELAY_INPUT_ARGS)
+        
+        if self.prewarmed_input.wait_ready(timeout=self.config.get('prewarm_lead', DEFAULT_PREWARM_LEAD)):
+            self.log_message(f"Pre-warmed: {self.prewarmed_input.buffered / 1024 / 1024:.1f} MB buffered")
         else:
-            self.log_message("Cannot start scheduled stream: Missing video or stream key.")
+            self.log_message("Pre-warm buffer not full at scheduled time; starting anyway.")
+    
+    def _publish_prewarmed(self):
+        """Release the pre-buffered input into the waiting encoder"""
+        self.marks['scheduled'] = time.monotonic()
+        self.marks['click'] = self.marks['scheduled']
+        self.prewarmed_input.relay_to(self.process.stdin)
+        self._begin_session()
+        self.log_message(f"Started pre-warmed stream: {os.path.basename(self.video_path)}")
+    
+    def get_status(self):
+        """Return a cheap snapshot of the session for status widgets"""
+        snapshot = self.lifecycle.snapshot
+        return StreamStatus(
+            version=snapshot.version,
+            state=snapshot.state,
+            detail=snapshot.detail,
+            is_streaming=is_active(snapshot),
+            start_time=snapshot.start_time,
+            scheduled_time=snapshot.scheduled_time if snapshot.state == "scheduled" else None,
+            video_name=snapshot.video_name,
+            encoder=self.metrics.latest_encoder(),
+            resources=dict(self.metrics.latest_resources().get('encoder', {})),
+            overlays=self.metrics.info.get('overlays'),
+            input_io=self.get_input_io(),
+            loop_seams=summarize_seams(self.metrics.info.get('loop_seams')),
+            pacing=self.metrics.info.get('pacing')
+        )
+    
+    def get_input_io(self):
+        """Bytes the process reading the source file got from disk and from the page cache"""
+        latest = self.metrics.latest_resources()
+        # A separate input stage reads the file when there is one; otherwise the encoder does
+        reader = latest.get('input') or ({} if self.hot_swap else latest.get('encoder', {}))
+        return {
+            'disk_read_bytes': reader.get('read_bytes', 0),
+            'cache_read_bytes': reader.get('cache_read_bytes', 0)
+        }
     
     def get_stream_duration(self):
         """Get current stream duration in seconds"""
@@ -0,0 +1,151 @@
+import io
+import json
+import os
+
+import pandas as pd
+
+# Root of the session archive, partitioned as date=YYYY-MM-DD/stream=<stream id>/
+TELEMETRY_DIR = ".telemetry"
+
+SESSION_FILE = "session.json"
+
+# Samples of running sessions, appended as they arrive and removed once exported
+SPOOL_DIR = os.path.join(TELEMETRY_DIR, "spool")
+
+
+_file_format = None
+
+
+def get_file_format():
+    """Parquet when pandas has a usable Parquet engine, CSV otherwise"""
+    global _file_format
+    if _file_format is None:
+        try:
+            pd.DataFrame({'probe': [0]}).to_parquet(io.BytesIO())
+            _file_format = "parquet"
+        except ImportError:
+            _file_format = "csv"
+    return _file_format
+
+
+def get_session_dir(stream_id, started_at, directory=TELEMETRY_DIR):
+    """Partition directory of one session"""
+    return os.path.join(directory, f"date={started_at:%Y-%m-%d}", f"stream={stream_id}")
+
+
+def get_spool_path(stream_id, directory=SPOOL_DIR):
+    """Sample spool file of a running session"""
+    return os.path.join(directory, f"{stream_id}.jsonl")
+
+
+def write_frame(df, path, file_format):
+    """Write a DataFrame atomically as Parquet or CSV"""
+    temporary = path + ".tmp"
+    if file_format == "parquet":
+        df.to_parquet(temporary, index=False)
+    else:
+        df.to_csv(temporary, index=False)
+    os.replace(temporary, path)
+
+
+def summarize_series(encoder, resources):
+    """Headline figures stored with the session so listings never read the series"""
+    summary = {'encoder_samples': len(encoder), 'resource_samples': len(resources)}
+    if 'speed' in encoder:
+        summary['mean_speed'] = float(encoder['speed'].mean())
+        summary['min_speed'] = float(encoder['speed'].min())
+    if 'frame' in encoder:
+        summary['frames'] = int(encoder['frame'].max())
+    if 'drop' in encoder:
+        summary['dropped_frames'] = int(encoder['drop'].max())
+    if 'cpu_seconds' in resources:
+        spent = resources.groupby('label')['cpu_seconds'].agg(lambda s: s.max() - s.min())
+        summary['cpu_seconds'] = float(spent.sum())
+    return summary
+
+
+def export_session(stream_id, started_at, ended_at, snapshot, events, session_info, directory=TELEMETRY_DIR):
+    """Write a finished session's encoder, resource and lifecycle series; returns the session directory
+
+    Every row carries the stream ID so many sessions can be concatenated for analysis.
+    A small session.json beside the series holds the session's config and headline
+    figures for browsing.
+    """
+    session_dir = get_session_dir(stream_id, started_at, directory)
+    os.makedirs(session_dir, exist_ok=True)
+    file_format = get_file_format()
+
+    frames = {
+        'encoder': pd.DataFrame(snapshot.get('encoder', [])),
+        'resources': pd.DataFrame(snapshot.get('resources', [])),
+        'events': pd.DataFrame(events)
+    }
+    files = {}
+    for kind, df in frames.items():
+        if df.empty:
+            continue
+        df.insert(0, 'stream_id', stream_id)
+        files[kind] = f"{kind}.{file_format}"
+        write_frame(df, os.path.join(session_dir, files[kind]), file_format)
+
+    session = dict(
+        session_info,
+        stream_id=stream_id,
+        date=f"{started_at:%Y-%m-%d}",
+        started_at=started_at.isoformat(),
+        ended_at=ended_at.isoformat(),
+        duration_seconds=(ended_at - started_at).total_seconds(),
+        files=files,
+        summary=summarize_series(frames['encoder'], frames['resources'])
+    )
+    with open(os.path.join(session_dir, SESSION_FILE), "w") as f:
+        json.dump(session, f, indent=2, default=str)
+    return session_dir
+
+
+def list_session_dirs(directory=TELEMETRY_DIR, start_date=None, end_date=None):
+    """Session directories within a date range, newest first, found from partition names alone"""
+    if not os.path.isdir(directory):
+        return []
+    session_dirs = []
+    for partition in sorted(os.listdir(directory), reverse=True):
+        if not partition.startswith("date="):
+            continue
+        day = partition[len("date="):]
+        if (start_date and day < str(start_date)) or (end_date and day > str(end_date)):
+            continue
+        date_dir = os.path.join(directory, partition)
+        for stream_partition in sorted(os.listdir(date_dir)):
+            if stream_partition.startswith("stream="):
+                session_dirs.append(os.path.join(date_dir, stream_partition))
+    return session_dirs
+
+
+def load_session(session_dir):
+    """Return a session's metadata with its directory, or None if it is incomplete"""
+    try:
+        with open(os.path.join(session_dir, SESSION_FILE)) as f:
+            session = json.load(f)
+    except (OSError, ValueError):
+        return None
+    session['path'] = session_dir
+    return session
+
+
+def read_series(session_dir, kind, columns=None):
+    """Read one series of a session, optionally only some columns; empty if not exported"""
+    session = load_session(session_dir)
+    name = session and session.get('files', {}).get(kind)
+    if not name:
+        return pd.DataFrame(columns=columns)
+
+    path = os.path.join(session_dir, name)
+    if name.endswith(".parquet"):
+        try:
+            return pd.read_parquet(path, columns=columns)
+        except (KeyError, ValueError):
+            # Columns a session never recorded; read what it has
+            df = pd.read_parquet(path)
+    else:
+        df = pd.read_csv(path, usecols=(lambda c: c in columns) if columns else None)
+    return df.reindex(columns=columns) if columns else df
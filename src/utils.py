@@ -2,6 +2,8 @@ import sys
 import subprocess
 import os
 import time
+import hashlib
+import functools
 import streamlit as st
 import pkg_resources
 
@@ -104,6 +106,29 @@ def get_video_info(video_path):
                 info["height"] = 0
                 info["resolution"] = "Unknown"
         
+        # Get frame rate from the first stream with a real rate (audio reports 0/0)
+        for line in output.split("\n"):
+            if line.startswith("r_frame_rate="):
+                num, _, den = line.split("=")[1].partition("/")
+                try:
+                    fps = float(num) / float(den or 1)
+                except (ValueError, ZeroDivisionError):
+                    continue
+                if fps > 0:
+                    info["fps"] = round(fps, 3)
+                    break
+        
+        # Get codecs; each stream block lists codec_name before codec_type
+        codec_name = None
+        for line in output.split("\n"):
+            if line.startswith("codec_name="):
+                codec_name = line.split("=", 1)[1]
+            elif line.startswith("codec_type=") and codec_name:
+                codec_type = line.split("=", 1)[1]
+                if codec_type in ("video", "audio"):
+                    info.setdefault(f"{codec_type}_codec", codec_name)
+                codec_name = None
+        
         # Get file size
         size_match = output.find("size=")
         if size_match >= 0:
@@ -129,6 +154,27 @@ def get_video_info(video_path):
     except Exception as e:
         return None
 
+def get_content_hash(path, sample_size=1024 * 1024):
+    """Fingerprint a media file from its size and samples of its start, middle and end
+
+    Reading three samples instead of the whole file keeps this fast on multi-GB assets
+    while still changing whenever the file is re-encoded or replaced. Results are
+    remembered per size and modification time, so repeat calls only stat the file.
+    """
+    stat = os.stat(path)
+    return _hash_samples(os.path.abspath(path), stat.st_size, stat.st_mtime_ns, sample_size)
+
+# Keyed by path, size and mtime, so a replaced file is hashed again
+@functools.lru_cache(maxsize=1024)
+def _hash_samples(path, size, mtime_ns, sample_size):
+    """Hash the size and three samples of a file"""
+    digest = hashlib.sha256(str(size).encode())
+    with open(path, "rb") as f:
+        for offset in (0, max(0, size // 2 - sample_size // 2), max(0, size - sample_size)):
+            f.seek(offset)
+            digest.update(f.read(sample_size))
+    return digest.hexdigest()[:16]
+
 def update_mock_analytics_data():
     """Update mock analytics data for simulated real-time updates"""
     if 'analytics_data' in st.session_state: